@@ -0,0 +1,43 @@
+"""Offline benchmarks for the brz and msgpackschema modules.
+Run `python -m benchmarks --help` from the root of this project. Results are printed (or saved) as JSON so runs can be compared.
+"""
+
+import statistics
+import time
+import tracemalloc
+
+def measure(func, repeat: int = 5, memory: bool = True) -> dict:
+	"""Calls `func` `repeat` times and returns timing stats (in seconds) and the result of the last call.
+	If `memory` is True, it's called once more under tracemalloc to get the peak memory it allocates. That run isn't timed since tracemalloc slows everything down."""
+	times = []
+	result = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = func()
+		times.append(time.perf_counter() - start)
+
+	stats = {
+		'seconds_best': min(times),
+		'seconds_median': statistics.median(times),
+		'repeat': repeat,
+	}
+	if memory:
+		tracemalloc.start()
+		try:
+			func()
+			_, peak = tracemalloc.get_traced_memory()
+		finally:
+			tracemalloc.stop()
+		stats['peak_memory_bytes'] = peak
+	return stats, result
+
+def add_rates(stats: dict, byte_count: int = None, items: dict = None):
+	"""Adds MB/s (and <item>/s for each entry in `items`) to `stats`, using the best time"""
+	seconds = stats['seconds_best']
+	if byte_count is not None:
+		stats['bytes'] = byte_count
+		stats['mb_per_s'] = byte_count / seconds / 1e6 if seconds > 0 else None
+	for name, count in (items or {}).items():
+		stats[name] = count
+		stats[f'{name}_per_s'] = count / seconds if seconds > 0 else None
+	return stats
@@ -0,0 +1,107 @@
+from . import measure, add_rates
+from .synth import synth_archive
+from brz import BRZ, ECompressionMethod
+import argparse
+import json
+import os
+import os.path
+import platform
+import sys
+import tempfile
+
+METHODS = {'auto': None, 'none': ECompressionMethod.NONE, 'zstd': ECompressionMethod.ZSTD}
+
+def mps_kind(path: str) -> str:
+	"""Groups .mps files by what they hold, like 'Chunks', 'Wires' or 'GlobalData'"""
+	parts = path.split('/')
+	if parts[-1] == 'ChunkIndex.mps':
+		return 'ChunkIndex'
+	if len(parts) >= 2 and parts[-2] in ('Chunks', 'Components', 'Wires'):
+		return ('Entity' if 'Entities' in parts else '') + parts[-2]
+	return parts[-1].removesuffix('.mps')
+
+def count_items(kind: str, tree: dict) -> dict:
+	if kind == 'Chunks':
+		return {'bricks': len(tree['BrickTypeIndices'])}
+	if kind == 'Wires':
+		return {'wires': len(tree['LocalWireSources']) + len(tree['RemoteWireSources'])}
+	return {}
+
+def bench_decode(brz: BRZ, repeat: int, memory: bool) -> dict:
+	groups = {}
+	for path in brz.index.file_paths():
+		if path.endswith('.mps'):
+			groups.setdefault(mps_kind(path), []).append(path)
+
+	results = {}
+	for kind, paths in sorted(groups.items()):
+		def decode_all():
+			brz._schemas.clear() # include importing the schema, like a fresh load would
+			return [brz.unpack_mps(path) for path in paths]
+		try:
+			stats, trees = measure(decode_all, repeat, memory)
+		except Exception as e:
+			results[kind] = {'files': len(paths), 'error': f'{type(e).__name__}: {e}'}
+			continue
+		items = {}
+		for tree in trees:
+			for name, count in count_items(kind, tree).items():
+				items[name] = items.get(name, 0) + count
+		stats['files'] = len(paths)
+		results[kind] = add_rates(stats, sum(len(brz.open(path, 'r').read()) for path in paths), items)
+	return results
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks opening, decoding and saving .brz archives. Prints results as JSON.')
+	parser.add_argument('--archive', default=None, help='benchmark this .brz instead of a synthetic one')
+	parser.add_argument('--bricks', type=int, default=20000, help='bricks in the synthetic archive (default: %(default)s)')
+	parser.add_argument('--chunks', type=int, default=8, help='chunks the bricks are spread over (default: %(default)s)')
+	parser.add_argument('--wires', type=int, default=2000, help='wires in the synthetic archive (default: %(default)s)')
+	parser.add_argument('--method', choices=METHODS, default='auto', help='blob compression when saving (default: %(default)s)')
+	parser.add_argument('--level', type=int, default=3, help='zstd level when saving (default: %(default)s)')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage; the best and median are reported (default: %(default)s)')
+	parser.add_argument('--no-memory', action='store_true', help='skip the extra tracemalloc run per stage')
+	parser.add_argument('--out', default=None, help='write the JSON here instead of stdout')
+	args = parser.parse_args(argv)
+	memory = not args.no_memory
+	method = METHODS[args.method]
+
+	report = {
+		'config': vars(args),
+		'environment': {'python': sys.version, 'platform': platform.platform()},
+		'stages': {},
+	}
+	stages = report['stages']
+
+	with tempfile.TemporaryDirectory() as temp_dir:
+		saved_path = os.path.join(temp_dir, 'saved.brz')
+		if args.archive is None:
+			stats, source = measure(lambda: synth_archive(args.bricks, args.chunks, args.wires, args.seed), 1, memory)
+			stages['synthesize'] = add_rates(stats, items={'bricks': args.bricks, 'wires': args.wires})
+		else:
+			source = BRZ(args.archive)
+
+		stats, _ = measure(lambda: source.save(saved_path, args.level, method), args.repeat, memory)
+		stages['save'] = add_rates(stats, os.path.getsize(saved_path))
+
+		archive_path = args.archive if args.archive is not None else saved_path
+		archive_size = os.path.getsize(archive_path)
+		stats, brz = measure(lambda: BRZ(archive_path), args.repeat, memory)
+		stages['open'] = add_rates(stats, archive_size, {'blobs': brz.index.blob_count})
+		stages['open']['decompressed_bytes'] = sum(brz.index.decompressed_lengths)
+
+		stats, _ = measure(lambda: BRZ.read_meta(archive_path), args.repeat, memory)
+		stages['read_meta'] = add_rates(stats, archive_size)
+
+		stages['decode'] = bench_decode(brz, args.repeat, memory)
+
+	text = json.dumps(report, indent='\t')
+	if args.out is None:
+		print(text)
+	else:
+		with open(args.out, 'w', encoding='utf-8') as f:
+			f.write(text + '\n')
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,121 @@
+"""Generates synthetic .mps chunks and .brz archives for benchmarking.
+The data is random but structurally valid for whatever schema it's made from, so it decodes like a real save would.
+Schemas, Meta files and the global tables are borrowed from a template archive in assets/.
+"""
+
+from brz import BRZ, ECompressionMethod
+from msgpackschema import MPS, Value, Array, Map, INT_RANGES, MsgpackSchemaError
+from io import BytesIO
+import random
+import string
+
+TEMPLATE_PATH = 'assets/Hello world.brz' # has every schema a brick grid needs (chunks, components, wires)
+CHUNK_SIZE = 2048
+
+def load_schema(brz: BRZ, schema_path: str) -> MPS:
+	"""Makes an MPS with the .schema at `schema_path` inside `brz` imported"""
+	mps = MPS()
+	with brz.open(schema_path, 'r') as f:
+		mps.import_schema(f.read())
+	return mps
+
+def random_value(mps: MPS, type_name: str, rng: random.Random, count: int = 1, flat: bool = False):
+	"""Makes a random value of a builtin, enum or struct type. Arrays inside a struct get `count` items."""
+	match mps._get_domain_of_type(type_name):
+		case 'builtin':
+			if type_name == 'bool':
+				return rng.random() < 0.5
+			if type_name in INT_RANGES:
+				# keep numbers small-ish like real saves, which affects how msgpack sizes them
+				low, high = INT_RANGES[type_name]
+				return rng.randint(max(low, -1024), min(high, 4096))
+			if type_name in ('f32', 'f64'):
+				return rng.uniform(-1024, 1024)
+			if type_name == 'str':
+				return ''.join(rng.choices(string.ascii_letters + '_', k=rng.randint(4, 24)))
+			raise MsgpackSchemaError(f'can\'t make random \'{type_name}\' values, since they can\'t be packed')
+		case 'enum':
+			enum = mps._enums[type_name]
+			name = rng.choice(list(enum))
+			return enum[name] if flat else name # flat arrays hold raw enum values
+		case 'struct':
+			return random_struct(mps, type_name, rng, count, flat)
+	raise ValueError(f'unknown type \'{type_name}\'')
+
+def random_struct(mps: MPS, struct_name: str, rng: random.Random, count: int = 1, flat: bool = False) -> dict:
+	"""Makes a random tree for a registered struct. Every array directly in it gets `count` items (arrays nested deeper get 1)."""
+	tree = {}
+	for property_name, property_type in mps._structs[struct_name].items():
+		match property_type:
+			case Value():
+				tree[property_name] = random_value(mps, property_type.type, rng, count, flat)
+			case Array():
+				tree[property_name] = [random_value(mps, property_type.type, rng, 1, property_type.is_flat) for _ in range(count)]
+			case Map():
+				tree[property_name] = {random_value(mps, property_type.key_type, rng): random_value(mps, property_type.value_type, rng) for _ in range(min(count, 4))}
+	return tree
+
+def pack_tree(mps: MPS, tree: dict, root_struct_name: str = None) -> bytes:
+	stream = BytesIO()
+	mps.pack(stream, tree, root_struct_name)
+	return stream.getvalue()
+
+def split_evenly(total: int, parts: int) -> list[int]:
+	base, extra = divmod(total, parts)
+	return [base + (1 if i < extra else 0) for i in range(parts)]
+
+def random_wires(mps: MPS, rng: random.Random, count: int) -> dict:
+	"""Makes a wire chunk with `count` wires, about half of them coming from other chunks"""
+	remote = count // 2
+	tree = random_struct(mps, 'BRSavedWireChunkSoA', rng, count)
+	for prefix, length in (('Remote', remote), ('Local', count - remote)):
+		tree[f'{prefix}WireSources'] = tree[f'{prefix}WireSources'][0:length]
+		tree[f'{prefix}WireTargets'] = tree[f'{prefix}WireTargets'][0:length]
+	return tree
+
+def synth_archive(bricks: int = 10000, chunks: int = 4, wires: int = 1000, seed: int = 0, template_path: str = TEMPLATE_PATH) -> BRZ:
+	"""Builds an in-memory BRZ with one brick grid holding `bricks` bricks and `wires` wires spread over `chunks` chunks.
+	Everything outside World/0/Bricks/Grids is copied from the template."""
+	rng = random.Random(seed)
+	template = BRZ(template_path)
+	brz = BRZ()
+
+	# copy everything except the grids from the template
+	for path in template.index.file_paths():
+		if path.startswith('/World/0/Bricks/Grids/'):
+			continue
+		brz.makedirs(brz.dirname(path), exist_ok=True)
+		brz.write_file(path, template.open(path, 'r').read())
+
+	chunk_mps = load_schema(template, '/World/0/Bricks/ChunksShared.schema')
+	wire_mps = load_schema(template, '/World/0/Bricks/WiresShared.schema')
+	index_mps = load_schema(template, '/World/0/Bricks/ChunkIndexShared.schema')
+	for mps, root_struct_name in ((chunk_mps, 'BRSavedBrickChunkSoA'), (wire_mps, 'BRSavedWireChunkSoA'), (index_mps, 'BRSavedBrickChunkIndexSoA')):
+		mps._check_packable(root_struct_name) # before generating anything, in case a newer template's schema holds wire graph variants
+
+	grid = '/World/0/Bricks/Grids/1'
+	brz.makedirs(grid + '/Chunks')
+	if wires > 0:
+		brz.makedirs(grid + '/Wires')
+
+	chunk_index = {'Chunk3DIndices': [], 'ChunkOffsets': [], 'ChunkSizes': [], 'NumBricks': [], 'NumComponents': [], 'NumWires': []}
+	for i, (brick_count, wire_count) in enumerate(zip(split_evenly(bricks, chunks), split_evenly(wires, chunks))):
+		x, y, z = i, 0, 0
+		name = f'{x}_{y}_{z}.mps'
+		brz.write_file(f'{grid}/Chunks/{name}', pack_tree(chunk_mps, random_struct(chunk_mps, 'BRSavedBrickChunkSoA', rng, brick_count), 'BRSavedBrickChunkSoA'))
+		if wire_count > 0:
+			brz.write_file(f'{grid}/Wires/{name}', pack_tree(wire_mps, random_wires(wire_mps, rng, wire_count), 'BRSavedWireChunkSoA'))
+		chunk_index['Chunk3DIndices'].append({'X': x, 'Y': y, 'Z': z})
+		chunk_index['ChunkOffsets'].append({'X': 0, 'Y': 0, 'Z': 0})
+		chunk_index['ChunkSizes'].append(CHUNK_SIZE)
+		chunk_index['NumBricks'].append(brick_count)
+		chunk_index['NumComponents'].append(0)
+		chunk_index['NumWires'].append(wire_count)
+	brz.write_file(f'{grid}/ChunkIndex.mps', pack_tree(index_mps, chunk_index, 'BRSavedBrickChunkIndexSoA'))
+	return brz
+
+def synth_archive_file(path: str, bricks: int = 10000, chunks: int = 4, wires: int = 1000, seed: int = 0, method: ECompressionMethod = None, compression_level: int = 3):
+	"""Same as `synth_archive`, but saves it to `path`"""
+	brz = synth_archive(bricks, chunks, wires, seed)
+	brz.save(path, compression_level, method)
+	return brz
@@ -1,13 +1,12 @@
 from struct import Struct, unpack, pack, unpack_from, pack_into
-from dataclasses import dataclass, field
 from enum import Enum
 from os import SEEK_SET, SEEK_CUR, SEEK_END
 from .errors import *
 from io import BytesIO
-from blake3 import blake3
+from time import perf_counter
+from . import codec
 import os
 import os.path
-import zstd
 
 class EFormatVersion(Enum):
 	INITIAL = 0
@@ -16,32 +15,143 @@ class ECompressionMethod(Enum):
 	NONE = 0
 	ZSTD = 1
 
-@dataclass
+def blake3(data: bytes = b''):
+	"""Stands in for `blake3.blake3` until the first hash, then replaces itself with it, so importing brz doesn't load the extension"""
+	global blake3
+	from blake3 import blake3
+	return blake3(data)
+
+HEADER_SIZE = 3 + 1 + 1 + 4 + 4 + 32 # magic, version, index compression method, index lengths, index hash
+
+# the struct at the root of the .mps files described by each known .schema
+ROOT_STRUCTS = {
+	'/World/0/Owners.schema': 'BRSavedOwnerTableSoA',
+	'/World/0/GlobalData.schema': 'BRSavedGlobalDataSoA',
+	'/World/0/Entities/ChunkIndex.schema': 'BRSavedEntityChunkIndexSoA',
+	'/World/0/Entities/ChunksShared.schema': 'BRSavedEntityChunkSoA',
+	'/World/0/Bricks/ChunkIndexShared.schema': 'BRSavedBrickChunkIndexSoA',
+	'/World/0/Bricks/ChunksShared.schema': 'BRSavedBrickChunkSoA',
+	'/World/0/Bricks/ComponentsShared.schema': 'BRSavedComponentChunkSoA',
+	'/World/0/Bricks/WiresShared.schema': 'BRSavedWireChunkSoA',
+}
+
+# These are plain classes instead of dataclasses: importing dataclasses pulls in inspect/ast/dis and roughly doubles how long `import brz` takes.
+# They take the same arguments and compare equal the same way the dataclasses did; `_fields` lists what __eq__ compares, in order.
+
+def _repr_fields(obj, names: tuple[str]) -> str:
+	return f'{type(obj).__name__}(' + ', '.join(f'{name}={getattr(obj, name)!r}' for name in names) + ')'
+
+def _eq_fields(a, b):
+	if b.__class__ is not a.__class__:
+		return NotImplemented
+	return all(getattr(a, name) == getattr(b, name) for name in a._fields)
+
 class BRZIndex:
 	"""Internal class used for reading the index of a .brz file
 	Discarded after use
 	"""
-	folder_count: int = 0
-	file_count: int = 0
-	blob_count: int = 0
-	folders: list[tuple[str, int]] = field(default_factory=list) # (name: str, parent: int)
-	files: list[tuple[str, int, int]] = field(default_factory=list) # (name:str, parent: int, content: int)
-	compression_methods: list[ECompressionMethod] = field(default_factory=list) 
-	decompressed_lengths: list[int] = field(default_factory=list) 
-	compressed_lengths: list[int] = field(default_factory=list)
-	blob_hashes: [list[bytes]] = field(default_factory=list)
-	blobs: list[bytes] = field(default_factory=list)
-
-BRZFile = None # sigh... forward declaration for using the type later
-@dataclass
+	_fields = ('folder_count', 'file_count', 'blob_count', 'folders', 'files', 'compression_methods', 'decompressed_lengths', 'compressed_lengths', 'blob_hashes', 'blob_offsets', 'blobs')
+
+	def __init__(self, folder_count: int = 0, file_count: int = 0, blob_count: int = 0,
+			folders: list[tuple[str, int]] = None, files: list[tuple[str, int, int]] = None,
+			compression_methods: list[ECompressionMethod] = None, decompressed_lengths: list[int] = None, compressed_lengths: list[int] = None,
+			blob_hashes: list[bytes] = None, blob_offsets: list[int] = None, blobs: list[bytes] = None):
+		self.folder_count: int = folder_count
+		self.file_count: int = file_count
+		self.blob_count: int = blob_count
+		self.folders: list[tuple[str, int]] = [] if folders is None else folders # (name: str, parent: int)
+		self.files: list[tuple[str, int, int]] = [] if files is None else files # (name:str, parent: int, content: int)
+		self.compression_methods: list[ECompressionMethod] = [] if compression_methods is None else compression_methods
+		self.decompressed_lengths: list[int] = [] if decompressed_lengths is None else decompressed_lengths
+		self.compressed_lengths: list[int] = [] if compressed_lengths is None else compressed_lengths
+		self.blob_hashes: list[bytes] = [] if blob_hashes is None else blob_hashes
+		self.blob_offsets: list[int] = [] if blob_offsets is None else blob_offsets # where each blob's compressed data starts in the .brz
+		self.blobs: list[bytes] = [] if blobs is None else blobs
+
+	def __repr__(self):
+		return _repr_fields(self, ('folder_count', 'file_count', 'blob_count'))
+
+	__eq__ = _eq_fields
+
+	def folder_paths(self) -> list[str]:
+		"""Full path of every folder, by folder index, like '/World/0'"""
+		paths = [None] * len(self.folders)
+		for i in range(len(self.folders)):
+			chain = []
+			current = i
+			while current != -1 and paths[current] is None:
+				if current < 0 or current >= len(self.folders) or len(chain) > len(self.folders):
+					raise BRZFormatError(f'folder {i} has an invalid parent chain')
+				chain.append(current)
+				current = self.folders[current][1]
+			prefix = '' if current == -1 else paths[current]
+			for folder_id in reversed(chain):
+				prefix = prefix + '/' + self.folders[folder_id][0]
+				paths[folder_id] = prefix
+		return paths
+
+	def file_paths(self) -> list[str]:
+		"""Full path of every file, by file index, like '/Meta/Bundle.json'. Doesn't need the blobs to be read."""
+		folder_paths = self.folder_paths()
+		paths = []
+		for name, parent, _ in self.files:
+			if parent == -1:
+				paths.append('/' + name)
+			elif 0 <= parent < len(folder_paths):
+				paths.append(folder_paths[parent] + '/' + name)
+			else:
+				raise BRZFormatError(f'file "{name}" has a parent {parent} that doesn\'t exist')
+		return paths
+
+class BRZBlobEntry:
+	"""A blob ready to be written by `BRZWriter.write_entries`.
+	`data` is the blob as stored in the archive (compressed if `method` says so), or a function that returns it, so it doesn't have to be held in memory until it's written."""
+	_fields = ('method', 'decompressed_length', 'compressed_length', 'hash', 'data')
+
+	def __init__(self, method: ECompressionMethod, decompressed_length: int, compressed_length: int, hash: bytes, data: bytes = b''):
+		self.method = method
+		self.decompressed_length = decompressed_length
+		self.compressed_length = compressed_length
+		self.hash = hash # blake3 of the decompressed data
+		self.data = data
+
+	def __repr__(self):
+		return _repr_fields(self, ('method', 'decompressed_length', 'compressed_length', 'hash'))
+
+	__eq__ = _eq_fields
+
 class BRZFile:
 	"""Represents a file inside a .brz, including the raw uncompressed data as bytes.
 	Do not create yourself. Creation is handled in the `BRZ` class.
 	"""
-	name: str = ''
-	parent: BRZFile = None
-	data: bytes = None
-	is_folder: bool = False
+	_fields = ('name', 'parent', 'data', 'is_folder', 'blob_id')
+
+	def __init__(self, name: str = '', parent: 'BRZFile' = None, data: bytes = None, is_folder: bool = False, blob_id: int = -1, blobs: '_BlobCache' = None):
+		self.name = name
+		self.parent = parent
+		self._data = data
+		self._blobs = blobs # where to read the data from on demand, for archives opened with max_memory
+		self.is_folder = is_folder
+		self.blob_id = blob_id # which blob in the index the data came from, or -1 if it didn't come from one
+
+	def __repr__(self):
+		return _repr_fields(self, ('name', 'blob_id'))
+
+	__eq__ = _eq_fields
+
+	@property
+	def data(self) -> bytes:
+		if self._blobs is not None:
+			return self._blobs.get(self.blob_id)
+		return self._data
+
+	@data.setter
+	def data(self, data: bytes):
+		# the file no longer matches its blob, so file_hash and save mustn't use the index's
+		self._data = data
+		self._blobs = None
+		self.blob_id = -1
+
 	def path(self):
 		names = []
 		item = self
@@ -51,38 +161,141 @@ class BRZFile:
 		return '/'.join(names) # this isn't M$ (or Linux/Unix) so we don't need to worry about using the appropriate separator
 
 
-@dataclass
 class BRZFolder(BRZFile):
 	"""Same as a file but has a folder, and the data property is unused."""
-	children: dict[str, BRZFile] = field(default_factory=dict)
-	is_folder: bool = True
+	_fields = BRZFile._fields + ('children',)
+
+	def __init__(self, name: str = '', parent: BRZFile = None, data: bytes = None, is_folder: bool = True, blob_id: int = -1, children: dict[str, BRZFile] = None):
+		super().__init__(name, parent, data, is_folder, blob_id)
+		self.children: dict[str, BRZFile] = {} if children is None else children
 
 class BRZ:
-	"""Main class used to open (and maybe later create/modify) the contents of .brz files.
+	"""Main class used to open, create and modify the contents of .brz files.
 	Has functionality to browse/modify the embedded filesystem (as loaded in memory, not on disk).
-	Changes made to the filesystem only reside in memory and do not reflect to disk.
-	There is no functionality to export a .brz at this time."""
-	def __init__(self, file_path: str = None):
-		"""If a `file_path` to a .brz file is provided, opens that file for reading and makes a usable BRZ object."""
+	Changes made to the filesystem only reside in memory until they're written out with `save`."""
+	def __init__(self, file_path: str = None, stats: 'Stats' = None, max_memory: int = None):
+		"""If a `file_path` to a .brz file is provided, opens that file for reading and makes a usable BRZ object.
+		Pass a `Stats` as `stats` to collect per-stage timings (io, zstd, blake3, index, tree) while it loads.
+		With `max_memory` (in bytes), only the header and index are read up front. Files are decompressed when they're read,
+		and at most that many decompressed bytes are kept around, least recently used first out (one blob bigger than that is still kept on its own).
+		The .brz stays open until `close` (or the end of a `with` block), and mustn't change on disk until then."""
 		self.version: EFormatVersion = EFormatVersion.INITIAL
 		self.index_compression_method: ECompressionMethod = ECompressionMethod.NONE
 		self.index_decompressed_length: int = 0
 		self.index_compressed_length: int = 0
 		self.index_hash: bytes = b''
-		self.index: BRZIndex = BRZIndex
+		self.index: BRZIndex = BRZIndex()
 		self.tree: BRZFolder = BRZFolder()
+		self._schemas = {} # schema blob hash -> MPS with that schema imported, for unpack_mps
+		self._blobs: _BlobCache = None # set when opened with max_memory
 
 		if file_path != None:
-			self._begin_reader(file_path)
+			if max_memory is None:
+				self._begin_reader(file_path, stats)
+			else:
+				self._begin_lazy_reader(file_path, max_memory, stats)
 	
-	def _begin_reader(self, file_path):
+	def _begin_reader(self, file_path, stats = None):
 		with open(file_path, 'rb') as f:
-			reader = BRZReader(f, self)
+			reader = BRZReader(f, self, stats)
 			reader.read_archive()
+
+	def _begin_lazy_reader(self, file_path, max_memory, stats = None):
+		f = open(file_path, 'rb')
+		try:
+			reader = BRZReader(f, self, stats)
+			reader.read_header()
+			reader.read_index()
+			self._blobs = _BlobCache(reader, max_memory)
+			reader._construct_tree()
+		except BaseException:
+			f.close()
+			raise
+
+	def close(self):
+		"""Closes the .brz of an archive opened with `max_memory`. Files that weren't replaced can't be read after this. Does nothing otherwise."""
+		if self._blobs is not None:
+			self._blobs.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *_):
+		self.close()
+
+	@classmethod
+	def from_stream(cls, stream, stats: 'Stats' = None):
+		"""Loads a BRZ from a file-like object that only needs to support .read(n), like a pipe, stdin, a tar member or an HTTP body.
+		The archive is consumed in a single forward pass starting at the stream's current position; nothing is seeked."""
+		brz = cls()
+		reader = BRZReader(stream, brz, stats)
+		reader.read_archive(rewind = False)
+		return brz
+
+	@classmethod
+	def iter_stream(cls, stream):
+		"""Reads a .brz from a file-like object in a single forward pass (see `from_stream`), yielding (path, data) for each file as soon as its blob is decompressed.
+		Only one blob is held in memory at a time. Files that share a blob are yielded one after the other."""
+		reader = BRZReader(stream, cls())
+		yield from reader.iter_files()
 	
-	def save(self, path: str = None):
-		"""Sorry, not implemented at this time."""
-		raise NotImplemented
+	@classmethod
+	async def aopen(cls, file_path: str, max_memory: int = None):
+		"""asyncio version of `BRZ(file_path, max_memory=max_memory)`. Reading and decompressing happen in a worker thread, so the event loop isn't blocked.
+		Cancelling the task stops loading at the next blob, and the .brz is closed in that thread either way."""
+		from .aio import open_archive
+		brz = cls()
+		await open_archive(brz, file_path, max_memory)
+		return brz
+
+	async def aread(self, path: str) -> bytes:
+		"""asyncio version of `open(path, 'r').read()` for a file embedded in the BRZ"""
+		import asyncio
+		return await asyncio.to_thread(self._read_file, path)
+
+	async def adump(self, path: str):
+		"""asyncio version of `dump`. Files are written one at a time in a worker thread."""
+		from .aio import dump_archive
+		await dump_archive(self, path)
+
+	def _read_file(self, path):
+		with self.open(path, 'r') as stream:
+			return stream.read()
+
+	@classmethod
+	def read_files(cls, file_path: str, predicate) -> dict[str, bytes]:
+		"""Reads only the header and index of the .brz at `file_path`, then decompresses just the blobs of files whose path (like '/Meta/Bundle.json') makes `predicate(path)` return True.
+		Returns a dict of path to file contents. Nothing else in the archive gets decompressed."""
+		brz = cls()
+		with open(file_path, 'rb') as f:
+			reader = BRZReader(f, brz)
+			reader.read_header()
+			reader.read_index()
+			wanted = [(blob_id, path) for (_, _, blob_id), path in zip(brz.index.files, brz.index.file_paths()) if predicate(path)]
+			wanted.sort() # blob order is file order, so this keeps the seeks going forward
+			result = {}
+			for blob_id, path in wanted:
+				result[path] = reader.read_blob_at(blob_id)
+		return result
+
+	@classmethod
+	def read_meta(cls, file_path: str) -> dict[str, bytes]:
+		"""Fast path for reading the /Meta folder of a .brz (Bundle.json, Prefab.json, Thumbnail.png) without decompressing any world data.
+		Returns a dict of file name (like 'Bundle.json') to contents."""
+		found = cls.read_files(file_path, lambda path: path.startswith('/Meta/'))
+		return {path.removeprefix('/Meta/'): data for path, data in found.items()}
+
+	def save(self, path: str, compression_level: int = 3, method: ECompressionMethod = None):
+		"""Writes the BRZ to a .brz file at `path`.
+		Files with identical contents share one blob, like the game does.
+		`method` forces a compression method for every blob; if omitted, each blob is zstd compressed only when that makes it smaller.
+		For archives opened with `max_memory`, files that weren't replaced are copied as they're stored, without recompressing, unless `method` asks for a different one (see `python -m brz repack` for recompressing everything).
+		They're read from the original .brz while saving, so it can't be saved over."""
+		if self._blobs is not None and os.path.exists(path) and os.path.samefile(path, self._blobs.reader.file.name):
+			raise ValueError(f'can\'t save over "{path}", the archive is still being read from it')
+		with open(path, 'wb') as f:
+			writer = BRZWriter(f, self, compression_level, method)
+			writer.write_archive()
 
 	def dump(self, path: str):
 		'''
@@ -102,9 +315,8 @@ class BRZ:
 				os.mkdir(combined_path)
 				queue.extend(list(item.children.values()))
 			else:
-				with self.open(item_path, 'r') as buffer:
-					with open(combined_path, 'wb') as output:
-						output.write(buffer.read())
+				with open(combined_path, 'wb') as output:
+					output.write(item.data) # straight from the tree; a stream from `open` would be another copy
 	
 	def open(self, path: str, mode: str) -> BytesIO:
 		"""Open a file embedded inside the BRZ filesystem as a BytesIO stream.
@@ -132,8 +344,114 @@ class BRZ:
 		stream = BytesIO(file.data)
 		return stream
 		
+	def file_hash(self, path: str) -> bytes:
+		"""Returns the blake3 hash of a file's contents. Uses the hash stored in the index when the file came from an archive, so nothing gets rehashed."""
+		file = self._locate(path)
+		if file.is_folder:
+			raise IsADirectoryError(f'path "{path}" is a folder')
+		if 0 <= file.blob_id < len(self.index.blob_hashes):
+			return self.index.blob_hashes[file.blob_id]
+		return blake3(file.data).digest()
+
+	def schema_path_for(self, path: str) -> str:
+		"""Finds the .schema file that describes the .mps file at `path`.
+		Either a sibling with the same name (like 'World/0/Owners.schema' for 'World/0/Owners.mps'),
+		or a shared schema further up the tree named after the file or its folder (like 'World/0/Bricks/ChunksShared.schema' for 'World/0/Bricks/Grids/1/Chunks/0_0_0.mps')"""
+		for candidate in self.schema_candidates(path):
+			if self.exists(candidate) and not self.isdir(candidate):
+				return candidate
+		raise FileNotFoundError(f'could not find a .schema for "{path}"')
+
+	@staticmethod
+	def schema_candidates(path: str) -> list[str]:
+		"""Every path `schema_path_for` tries for the .mps at `path`, most specific first"""
+		separated = [name for name in path.split('/') if name != '']
+		if len(separated) == 0 or not separated[-1].endswith('.mps'):
+			raise ValueError(f'"{path}" is not a .mps file')
+		stem = separated[-1].removesuffix('.mps')
+		folders = separated[0:-1]
+
+		candidates = ['/'.join(folders + [stem + '.schema'])]
+		shared_names = [stem + 'Shared.schema']
+		if len(folders) > 0:
+			shared_names.append(folders[-1] + 'Shared.schema')
+		for depth in range(len(folders), -1, -1):
+			for name in shared_names:
+				candidates.append('/'.join(folders[0:depth] + [name]))
+		return ['/' + candidate for candidate in candidates]
+
+	def mps(self, schema_path: str):
+		"""An MPS with the .schema at `schema_path` imported, made once per schema and kept for `unpack_mps`"""
+		schema_hash = self.file_hash(schema_path)
+		mps = self._schemas.get(schema_hash)
+		if mps is None:
+			from msgpackschema import MPS
+			mps = MPS()
+			with self.open(schema_path, 'r') as schema:
+				mps.import_schema(schema.read())
+			self._schemas[schema_hash] = mps
+		return mps
+
+	def unpack_mps(self, path: str, schema_path: str = None, root_struct_name: str = None, cache = None, stats: 'Stats' = None):
+		"""Decodes the .mps file at `path` with the msgpackschema module and returns the tree.
+		`schema_path` is the .schema file inside this BRZ to decode with. If omitted, it's found with `schema_path_for`.
+		`root_struct_name` is passed to `MPS.unpack`. It defaults to the known root struct of the schema (see ROOT_STRUCTS), or else MPS's own guess.
+		`cache` can be a `brz.cache.ChunkCache` to reuse results decoded earlier (possibly by another process, if it has a directory).
+		`stats` is passed to `MPS.unpack`, and also counts 'cache_hits' and 'cache_misses'."""
+		if schema_path is None:
+			schema_path = self.schema_path_for(path)
+		if root_struct_name is None:
+			root_struct_name = ROOT_STRUCTS.get(schema_path)
+		schema_hash = self.file_hash(schema_path)
+
+		key = None
+		if cache is not None:
+			key = cache.make_key(self.file_hash(path), schema_hash, root_struct_name)
+			tree = cache.get(key)
+			if stats is not None:
+				stats.count('cache_misses' if tree is None else 'cache_hits')
+			if tree is not None:
+				return tree
+
+		with self.open(path, 'r') as stream:
+			tree = self.mps(schema_path).unpack(stream, root_struct_name, stats)
+		if cache is not None:
+			cache.put(key, tree)
+		return tree
+
 	def mkdir(self, path):
-		raise NotImplemented
+		"""see os.mkdir"""
+		if self.exists(path):
+			raise FileExistsError(f'path "{path}" already exists')
+		parent = self._locate(self.dirname(path))
+		if not parent.is_folder:
+			raise NotADirectoryError(f'path "{parent.path()}" is not a folder')
+		name = self.basename(path)
+		if name == '':
+			raise FileExistsError('the root folder always exists')
+		parent.children[name] = BRZFolder(name, parent, children = {})
+
+	def makedirs(self, path, exist_ok = False):
+		"""see os.makedirs"""
+		separated = self._split(path)
+		if self.exists(path) and not exist_ok:
+			raise FileExistsError(f'path "{path}" already exists')
+		for depth in range(1, len(separated) + 1):
+			partial = separated[0:depth]
+			if not self.exists(partial):
+				self.mkdir(partial)
+			elif not self.isdir(partial):
+				raise NotADirectoryError(f'path "{"/".join(partial)}" is not a folder')
+
+	def write_file(self, path, data: bytes):
+		"""Creates or replaces the file at `path` with `data`. The folder it goes in must already exist (see `makedirs`)."""
+		parent = self._locate(self.dirname(path))
+		if not parent.is_folder:
+			raise NotADirectoryError(f'path "{parent.path()}" is not a folder')
+		name = self.basename(path)
+		if name in parent.children and parent.children[name].is_folder:
+			raise IsADirectoryError(f'path "{path}" is a folder')
+		parent.children[name] = BRZFile(name, parent, bytes(data))
 	
 	def remove(self, path):
 		raise NotImplemented
@@ -174,6 +492,8 @@ class BRZ:
 	
 	def _split(self, path):
 		# split a path into components
+		if type(path) is list:
+			return path # already split (dirname returns lists)
 		separated = path.split('/') # not sure if the format supports slashes in names. assuming not, since the devs are probably sane
 		if len(separated) > 0 and separated[0] == '':
 			del separated[0]
@@ -188,51 +508,134 @@ class BRZ:
 
 		helper_path = []
 		for name in separated:
-			if name in current.children:
+			helper_path.append(name) # breadcrumb in case we fail
+			if current.is_folder and name in current.children:
 				current = current.children[name]
-				helper_path.append(current) # breadcrumb in case we fail
 			else:
-				raise FileNotFoundError(f'could not find file "{helper_path.join("/")}"')
+				raise FileNotFoundError(f'could not find file "{"/".join(helper_path)}"')
 		return current
 
 
+class _BlobCache:
+	"""Decompressed blobs of an archive opened with `max_memory`, read from its file again whenever they're needed after being evicted.
+	Least recently used blobs go first once more than `max_memory` bytes are held."""
+	def __init__(self, reader: 'BRZReader', max_memory: int):
+		from threading import Lock # BRZ.aread reads from worker threads, and they share the file position
+		self.reader = reader
+		self.max_memory = max_memory
+		self.size = 0
+		self._blobs: dict[int, bytes] = {} # blob id -> data, least recently used first
+		self._lock = Lock()
+
+	def get(self, blob_id: int) -> bytes:
+		with self._lock:
+			data = self._blobs.pop(blob_id, None)
+			if data is None:
+				data = self.reader.read_blob_at(blob_id)
+				self.size += len(data)
+			self._blobs[blob_id] = data
+			while self.size > self.max_memory and len(self._blobs) > 1:
+				self.size -= len(self._blobs.pop(next(iter(self._blobs))))
+			return data
+
+	def stored(self, blob_id: int) -> BRZBlobEntry:
+		"""The blob as it's stored in the file, read only when it's written"""
+		index = self.reader.brz.index
+		def read_compressed():
+			with self._lock:
+				self.reader.file.seek(index.blob_offsets[blob_id], SEEK_SET)
+				return self.reader.file.read(index.compressed_lengths[blob_id])
+		return BRZBlobEntry(index.compression_methods[blob_id], index.decompressed_lengths[blob_id], index.compressed_lengths[blob_id], index.blob_hashes[blob_id], read_compressed)
+
+	def close(self):
+		self.reader.file.close()
+		self._blobs.clear()
+		self.size = 0
+
+class _IndexCursor:
+	"""Walks the decompressed index, unpacking whole columns (like every folder parent) in one call"""
+	def __init__(self, data: bytes):
+		self.data = data
+		self.position = 0
+
+	def take(self, fmt: str) -> tuple:
+		size = Struct(fmt).size
+		if self.position + size > len(self.data):
+			raise BRZUnexpectedEOF(f'unexpected EOF when trying to read {size} byte(s) of the index; got {len(self.data) - self.position} instead')
+		values = unpack_from(fmt, self.data, self.position)
+		self.position += size
+		return values
+
+	def read(self, count: int) -> bytes:
+		if self.position + count > len(self.data):
+			raise BRZUnexpectedEOF(f'unexpected EOF when trying to read {count} byte(s) of the index; got {len(self.data) - self.position} instead')
+		data = self.data[self.position:self.position + count]
+		self.position += count
+		return data
+
 class BRZReader:
 	"""helper class for reading and parsing BRZ files and initializing a BRZ class with the contents"""
-	def __init__(self, file, brz):
+	def __init__(self, file, brz, stats: 'Stats' = None):
 		self.file = file
 		self.brz = brz
+		self.stats = stats
 	
 	def _read(self, count, f = None) -> bytes:
 		if f == None:
 			f = self.file
 		data = f.read(count)
-		if len(data) < count:
-			raise BRZUnexpectedEOF(f'unexpected EOF when trying to read {count} byte(s); got {len(data)} instead')
+		if data is not None and len(data) < count and len(data) > 0:
+			# raw streams (sockets, pipes) can return less than asked for without being at EOF
+			parts = [data]
+			received = len(data)
+			while received < count:
+				part = f.read(count - received)
+				if not part:
+					break
+				parts.append(part)
+				received += len(part)
+			data = b''.join(parts)
+		if data is None or len(data) < count:
+			raise BRZUnexpectedEOF(f'unexpected EOF when trying to read {count} byte(s); got {0 if data is None else len(data)} instead')
 		return data
 	
-	def _decompress(self, method: ECompressionMethod, count: int, expected_hash: bytes, f = None) -> bytes:
+	def _decompress(self, method: ECompressionMethod, count: int, expected_hash: bytes, f = None, decompressed_length: int = None) -> bytes:
 		if f == None:
 			f = self.file
+		stats = self.stats
+		if stats is not None:
+			start = perf_counter()
 		compressed = self._read(count, f)
+		if stats is not None:
+			now = perf_counter()
+			stats.record('io', now - start, count, count)
+			start = now
 		match method:
 			case ECompressionMethod.NONE:
-				result_hash = blake3(compressed).digest()
-				if result_hash != expected_hash:
-					raise BRZDecompressionError('file hash mismatch')
-				return compressed
+				decompressed = compressed
 			case ECompressionMethod.ZSTD:
-
-				decompressed = zstd.decompress(compressed)
-				result_hash = blake3(decompressed).digest()
-				if result_hash != expected_hash:
-					raise BRZDecompressionError('file hash mismatch')
-				return decompressed
-
+				try:
+					decompressed = codec.decompress(compressed, decompressed_length)
+				except Exception as e:
+					raise BRZDecompressionError(f'zstd failed to decompress: {e}') from e
+				if stats is not None:
+					now = perf_counter()
+					stats.record('zstd', now - start, count, len(decompressed))
+					start = now
 			case _:
 				raise BRZFormatError(f'unsupported decompression method {method}')
+
+		result_hash = blake3(decompressed).digest()
+		if stats is not None:
+			stats.record('blake3', perf_counter() - start, len(decompressed))
+		if result_hash != expected_hash:
+			raise BRZDecompressionError('file hash mismatch')
+		return decompressed
 	
-	def read_archive(self):
-		self.file.seek(0, SEEK_SET)
+	def read_archive(self, rewind = True):
+		"""Reads the whole archive into the BRZ. If `rewind` is False, reading starts at the current position of the file and never seeks."""
+		if rewind:
+			self.file.seek(0, SEEK_SET)
 		self.read_header()
 		self.read_index()
 
@@ -242,6 +645,27 @@ class BRZReader:
 
 		self._construct_tree()
 
+	def iter_files(self):
+		"""Reads the header, index, then every blob in order from the current position without seeking, yielding (path, data) per file as each blob is done.
+		Blobs aren't kept in the index afterwards, and blobs no file points to are skipped without decompressing."""
+		self.read_header()
+		self.read_index()
+		brz = self.brz
+
+		files_by_blob = {}
+		for (_, _, blob_id), path in zip(brz.index.files, brz.index.file_paths()):
+			if blob_id < 0 or blob_id >= brz.index.blob_count:
+				raise BRZFormatError(f'file "{path}" points to nonexistent blob {blob_id}')
+			files_by_blob.setdefault(blob_id, []).append(path)
+
+		for i in range(brz.index.blob_count):
+			if i not in files_by_blob:
+				self._read(brz.index.compressed_lengths[i])
+				continue
+			data = self._read_blob_data(i)
+			for path in files_by_blob[i]:
+				yield path, data
+
 	def read_header(self):
 		f = self.file
 		brz = self.brz
@@ -277,56 +701,90 @@ class BRZReader:
 		f = self.file
 		brz = self.brz
 		
-		index_decompressed = self._decompress(brz.index_compression_method, brz.index_compressed_length, brz.index_hash)
+		index_decompressed = self._decompress(brz.index_compression_method, brz.index_compressed_length, brz.index_hash, decompressed_length = brz.index_decompressed_length)
 		if len(index_decompressed) != brz.index_decompressed_length:
 			raise BRZDecompressionError(f'index decompresses to {len(index_decompressed)} bytes, but we expected {brz.index_decompressed_length}')
+		if self.stats is not None:
+			start = perf_counter()
 	
-		with BytesIO(index_decompressed) as index:
-			folder_count, file_count, blob_count = unpack('<iii', self._read(4 * 3, index))
-			folder_parents = [unpack('<i', self._read(4, index))[0] for _ in range(folder_count)]
-			folder_name_lengths = [unpack('<H', self._read(2, index))[0] for _ in range(folder_count)]
-			folder_names = [self._read(folder_name_lengths[i], index).decode('utf-8') for i in range(folder_count)]
-			
-			file_parents = [unpack('<i', self._read(4, index))[0] for _ in range(file_count)]
-			file_contents = [unpack('<i', self._read(4, index))[0] for _ in range(file_count)]
-			file_name_lengths = [unpack('<H', self._read(2, index))[0] for _ in range(file_count)]
-			file_names = [self._read(file_name_lengths[i], index).decode('utf-8') for i in range(file_count)]
-
-			blob_compression_methods = [ECompressionMethod(unpack('<B', self._read(1, index))[0]) for _ in range(blob_count)]
-			blob_decompressed_lengths = [unpack('<i', self._read(4, index))[0] for _ in range(blob_count)]
-			blob_compressed_lengths = [unpack('<i', self._read(4, index))[0] for _ in range(blob_count)]
-			blob_hashes = [self._read(32, index) for _ in range(blob_count)]
-
-
-			brz.index.folder_count = folder_count
-			brz.index.file_count = file_count
-			brz.index.blob_count = blob_count
-			# parse file folder and blob data into the nice properties of this obj
-
-			brz.index.folders = []
-			for i in range(folder_count):
-				brz.index.folders.append((folder_names[i], folder_parents[i]))
-
-			brz.index.files = []
-			for i in range(file_count):
-				brz.index.files.append((file_names[i], file_parents[i], file_contents[i]))
-
-			brz.index.compression_methods = blob_compression_methods
-			brz.index.decompressed_lengths = blob_decompressed_lengths
-			brz.index.compressed_lengths = blob_compressed_lengths
-			brz.index.blob_hashes = blob_hashes
+		index = _IndexCursor(index_decompressed)
+		folder_count, file_count, blob_count = index.take('<iii')
+		if folder_count < 0 or file_count < 0 or blob_count < 0:
+			raise BRZFormatError(f'index has a negative count ({folder_count} folders, {file_count} files, {blob_count} blobs)')
+		folder_parents = index.take(f'<{folder_count}i')
+		folder_name_lengths = index.take(f'<{folder_count}H')
+		folder_names = [index.read(length).decode('utf-8') for length in folder_name_lengths]
+
+		file_parents = index.take(f'<{file_count}i')
+		file_contents = index.take(f'<{file_count}i')
+		file_name_lengths = index.take(f'<{file_count}H')
+		file_names = [index.read(length).decode('utf-8') for length in file_name_lengths]
+
+		blob_compression_methods = [ECompressionMethod(method) for method in index.read(blob_count)]
+		blob_decompressed_lengths = list(index.take(f'<{blob_count}i'))
+		blob_compressed_lengths = list(index.take(f'<{blob_count}i'))
+		hashes = index.read(32 * blob_count)
+		blob_hashes = [hashes[i:i + 32] for i in range(0, len(hashes), 32)]
+
+		brz.index.folder_count = folder_count
+		brz.index.file_count = file_count
+		brz.index.blob_count = blob_count
+		# parse file folder and blob data into the nice properties of this obj
+
+		brz.index.folders = []
+		for i in range(folder_count):
+			brz.index.folders.append((folder_names[i], folder_parents[i]))
+
+		brz.index.files = []
+		for i in range(file_count):
+			brz.index.files.append((file_names[i], file_parents[i], file_contents[i]))
+
+		brz.index.compression_methods = blob_compression_methods
+		brz.index.decompressed_lengths = blob_decompressed_lengths
+		brz.index.compressed_lengths = blob_compressed_lengths
+		brz.index.blob_hashes = blob_hashes
+
+		brz.index.blob_offsets = []
+		offset = HEADER_SIZE + brz.index_compressed_length
+		for length in blob_compressed_lengths:
+			if length < 0:
+				raise BRZFormatError(f'blob compressed length is less than 0 ({length})')
+			brz.index.blob_offsets.append(offset)
+			offset += length
+
+		if self.stats is not None:
+			self.stats.record('index', perf_counter() - start, len(index_decompressed))
+			self.stats.count('files', file_count)
 
 	def read_blob(self, i):
-		f = self.file
 		brz = self.brz
+		brz.index.blobs.append(self._read_blob_data(i))
 
-		blob_decompressed = self._decompress(brz.index.compression_methods[i], brz.index.compressed_lengths[i], brz.index.blob_hashes[i])
+	def read_blob_at(self, i) -> bytes:
+		"""Seeks to blob `i` and returns it decompressed, without touching any other blob. Needs the index to be read first."""
+		brz = self.brz
+		if i < 0 or i >= brz.index.blob_count:
+			raise BRZFormatError(f'blob {i} does not exist (blob count is {brz.index.blob_count})')
+		self.file.seek(brz.index.blob_offsets[i], SEEK_SET)
+		return self._read_blob_data(i)
+
+	def _read_blob_data(self, i) -> bytes:
+		brz = self.brz
+		if self.stats is not None:
+			self.stats.count('blobs')
+		blob_decompressed = self._decompress(brz.index.compression_methods[i], brz.index.compressed_lengths[i], brz.index.blob_hashes[i], decompressed_length = brz.index.decompressed_lengths[i])
 		if len(blob_decompressed) != brz.index.decompressed_lengths[i]:
 			raise BRZDecompressionError(f'blob {i} decompresses to {len(blob_decompressed)} bytes, but we expected {brz.index.decompressed_lengths[i]}')
-
-		brz.index.blobs.append(blob_decompressed)
+		return blob_decompressed
 
 	def _construct_tree(self):
+		if self.stats is None:
+			self._construct_tree_untimed()
+		else:
+			with self.stats.timer('tree'):
+				self._construct_tree_untimed()
+
+	def _construct_tree_untimed(self):
 		# BOLD ASSUMPTION:
 		# File/folder names cannot be duplicated in the same path
 		f = self.file
@@ -344,11 +802,15 @@ class BRZReader:
 
 		files = []
 		# get files next, but don't parent.
+		blobs = brz._blobs
 		for file_name, file_parent_id, file_blob_id in brz.index.files:
-			if file_blob_id < 0 or file_blob_id >= len(brz.index.blobs):
+			if file_blob_id < 0 or file_blob_id >= (brz.index.blob_count if blobs is not None else len(brz.index.blobs)):
 				raise BRZFormatError(f'file "{file_name}" points to nonexistent blob {file_blob_id}')
 
-			file = BRZFile(file_name, file_parent_id, brz.index.blobs[file_blob_id])
+			if blobs is not None:
+				file = BRZFile(file_name, file_parent_id, blob_id = file_blob_id, blobs = blobs)
+			else:
+				file = BRZFile(file_name, file_parent_id, brz.index.blobs[file_blob_id], blob_id = file_blob_id)
 			#file = BRZFile(parent = file_parent_id, name=file_name, data = brz.index.blobs[file_blob_id])
 			files.append(file)
 
@@ -368,3 +830,108 @@ class BRZReader:
 				raise BRZFormatError(f'folder "{item.parent.path()}" already has child item "{item.name}" but a duplicate is trying to be added')
 			item.parent.children[item.name] = item
 
+
+
+class BRZWriter:
+	"""helper class for writing the contents of a BRZ class into a .brz file"""
+	def __init__(self, file, brz = None, compression_level: int = 3, method: ECompressionMethod = None):
+		self.file = file
+		self.brz = brz
+		self.compression_level = compression_level
+		self.method = method # None picks whichever is smaller per blob
+
+	def write_archive(self):
+		folders, files, blobs = self._flatten_tree()
+		entries = [blob if type(blob) is BRZBlobEntry else self.make_blob(blob) for blob in blobs]
+		self.write_entries(folders, files, entries)
+
+	def make_blob(self, data: bytes, data_hash: bytes = None) -> BRZBlobEntry:
+		"""Compresses `data` according to this writer's settings and returns it ready for writing"""
+		if data_hash is None:
+			data_hash = blake3(data).digest()
+		method = self.method
+		compressed = data
+		if method != ECompressionMethod.NONE:
+			compressed = codec.compress(data, self.compression_level)
+			if method is None:
+				if len(compressed) < len(data):
+					method = ECompressionMethod.ZSTD
+				else:
+					method = ECompressionMethod.NONE
+					compressed = data
+		return BRZBlobEntry(method, len(data), len(compressed), data_hash, compressed)
+
+	def write_entries(self, folders: list[tuple[str, int]], files: list[tuple[str, int, int]], blobs: list[BRZBlobEntry]):
+		"""Writes a whole archive from raw index parts.
+		`folders` and `files` are laid out like in `BRZIndex`. `blobs` are written in order, so file blob ids index into it."""
+		index = self._build_index(folders, files, blobs)
+		index_entry = self.make_blob(index)
+		self.write_header(index_entry)
+		self._write_entry(index_entry)
+		for i, entry in enumerate(blobs):
+			self._write_entry(entry, i)
+
+	def write_header(self, index_entry: BRZBlobEntry):
+		self.file.write(b'BRZ')
+		self.file.write(pack('<BB', EFormatVersion.INITIAL.value, index_entry.method.value))
+		self.file.write(pack('<ii', index_entry.decompressed_length, index_entry.compressed_length))
+		self.file.write(index_entry.hash)
+
+	def _write_entry(self, entry: BRZBlobEntry, i = None):
+		data = entry.data() if callable(entry.data) else entry.data
+		if len(data) != entry.compressed_length:
+			raise BRZFormatError(f'{"index" if i is None else f"blob {i}"} is {len(data)} bytes, but the index says {entry.compressed_length}')
+		self.file.write(data)
+
+	def _build_index(self, folders, files, blobs) -> bytes:
+		parts = [pack('<iii', len(folders), len(files), len(blobs))]
+		folder_names = [name.encode('utf-8') for name, _ in folders]
+		parts.extend(pack('<i', parent) for _, parent in folders)
+		parts.extend(pack('<H', len(name)) for name in folder_names)
+		parts.extend(folder_names)
+
+		file_names = [name.encode('utf-8') for name, _, _ in files]
+		parts.extend(pack('<i', parent) for _, parent, _ in files)
+		parts.extend(pack('<i', content) for _, _, content in files)
+		parts.extend(pack('<H', len(name)) for name in file_names)
+		parts.extend(file_names)
+
+		parts.extend(pack('<B', entry.method.value) for entry in blobs)
+		parts.extend(pack('<i', entry.decompressed_length) for entry in blobs)
+		parts.extend(pack('<i', entry.compressed_length) for entry in blobs)
+		parts.extend(entry.hash for entry in blobs)
+		return b''.join(parts)
+
+	def _flatten_tree(self):
+		# breadth first, so every folder comes after its parent
+		folders = []
+		files = []
+		blobs = []
+		blob_ids = {} # hash -> blob id, so identical files share a blob
+
+		queue = [(child, -1) for child in self.brz.tree.children.values()]
+		while len(queue) > 0:
+			item, parent_id = queue.pop(0)
+			if item.is_folder:
+				folders.append((item.name, parent_id))
+				folder_id = len(folders) - 1
+				queue.extend((child, folder_id) for child in item.children.values())
+			elif item._blobs is not None:
+				# unchanged file of an archive opened with max_memory: copy its blob as stored instead of holding every file decompressed,
+				# unless it has to be stored with another method, then it's recompressed right away so only compressed data is held
+				data_hash = self.brz.index.blob_hashes[item.blob_id]
+				if data_hash not in blob_ids:
+					blob_ids[data_hash] = len(blobs)
+					if self.method is None or self.method == self.brz.index.compression_methods[item.blob_id]:
+						blobs.append(item._blobs.stored(item.blob_id))
+					else:
+						blobs.append(self.make_blob(item.data, data_hash))
+				files.append((item.name, parent_id, blob_ids[data_hash]))
+			else:
+				data = item.data if item.data is not None else b''
+				data_hash = blake3(data).digest()
+				if data_hash not in blob_ids:
+					blob_ids[data_hash] = len(blobs)
+					blobs.append(data)
+				files.append((item.name, parent_id, blob_ids[data_hash]))
+		return folders, files, blobs
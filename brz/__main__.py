@@ -1,5 +1,10 @@
 from . import BRZ
-if __name__ == '__main__':
+import argparse
+import json
+import os.path
+import sys
+
+def example():
 	brz = BRZ('assets/single brick.brz')
 	print(brz.ls('/')) # should output ['Meta', 'World']
 
@@ -7,4 +12,129 @@ if __name__ == '__main__':
 	with open('output/thumbnail.png', 'wb') as out_file:
 		with brz.open('/Meta/Thumbnail.png', 'r') as in_file:
 			out_file.write(in_file.read())
-	
+
+def cmd_batch(args):
+	from .batch import find_archives, run_batch, parse_size
+	paths = find_archives(args.directory, not args.no_recursive)
+	memory_limit = parse_size(args.memory_limit) if args.memory_limit else None
+	if args.out == '-':
+		succeeded, failed = run_batch(paths, args.func, sys.stdout, args.workers, args.max_tasks, memory_limit, None if args.quiet else sys.stderr)
+	else:
+		with open(args.out, 'a' if args.append else 'w', encoding='utf-8') as output:
+			succeeded, failed = run_batch(paths, args.func, output, args.workers, args.max_tasks, memory_limit, None if args.quiet else sys.stderr)
+	return 1 if failed > 0 else 0
+
+def cmd_meta(args):
+	failed = 0
+	for path in args.files:
+		try:
+			meta = BRZ.read_meta(path)
+		except Exception as e:
+			print(json.dumps({'path': path, 'ok': False, 'error': f'{type(e).__name__}: {e}'}))
+			failed += 1
+			continue
+		record = {'path': path, 'ok': True}
+		for name, data in meta.items():
+			if name.lower().endswith('.json'):
+				record[name] = json.loads(data)
+			else:
+				record[name] = {'size': len(data)}
+		if args.thumbnails is not None and 'Thumbnail.png' in meta:
+			thumbnail_path = os.path.join(args.thumbnails, os.path.splitext(os.path.basename(path))[0] + '.png')
+			with open(thumbnail_path, 'wb') as f:
+				f.write(meta['Thumbnail.png'])
+		print(json.dumps(record, indent=None if len(args.files) > 1 else '\t'))
+	return 1 if failed > 0 else 0
+
+def cmd_diff(args):
+	from .diff import diff_archives, format_diff
+	result = diff_archives(args.a, args.b, args.max_indices)
+	if args.json:
+		print(json.dumps(result, indent='\t'))
+	else:
+		for line in format_diff(result):
+			print(line)
+	return 0 if result['identical'] else 1
+
+def cmd_inspect(args):
+	from .inspect import inspect_archive, format_report
+	failed = 0
+	for path in args.files:
+		try:
+			report = inspect_archive(path, args.depth, args.largest)
+		except Exception as e:
+			if args.json:
+				print(json.dumps({'path': path, 'ok': False, 'error': f'{type(e).__name__}: {e}'}))
+			else:
+				print(f'{path}: {type(e).__name__}: {e}', file=sys.stderr)
+			failed += 1
+			continue
+		if args.json:
+			print(json.dumps({'ok': True} | report, indent=None if len(args.files) > 1 else '\t'))
+		else:
+			print('\n'.join(format_report(report)))
+	return 1 if failed > 0 else 0
+
+def cmd_repack(args):
+	from .repack import repack, format_report
+	from . import ECompressionMethod
+	method = None if args.method == 'auto' else ECompressionMethod[args.method.upper()]
+	report = repack(args.source, args.destination, args.level, args.workers, method)
+	if args.json:
+		print(json.dumps(report, indent='\t'))
+	else:
+		print(format_report(report))
+	return 0
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m brz', description='Tools for Brickadia .brz archives. Runs the example code if no command is given.')
+	commands = parser.add_subparsers(dest='command')
+
+	batch = commands.add_parser('batch', help='run a function over every .brz in a directory with a process pool, writing results as JSON lines')
+	batch.add_argument('directory', help='directory to search for .brz files')
+	batch.add_argument('--func', default='brz.batch:summary', help='per-archive function as \'module:function\'. it gets the archive path and returns something JSON serializable (default: %(default)s)')
+	batch.add_argument('--out', default='-', help='JSONL file to write results to, or - for stdout (default: %(default)s)')
+	batch.add_argument('--append', action='store_true', help='append to --out instead of overwriting it')
+	batch.add_argument('--workers', type=int, default=None, help='number of worker processes (default: CPU count)')
+	batch.add_argument('--max-tasks', type=int, default=100, help='archives each worker handles before being replaced with a fresh process (default: %(default)s)')
+	batch.add_argument('--memory-limit', default=None, help='address space limit per worker, like 512M or 2G (unix only)')
+	batch.add_argument('--no-recursive', action='store_true', help='don\'t search subdirectories')
+	batch.add_argument('--quiet', action='store_true', help='don\'t print progress to stderr')
+	batch.set_defaults(handler=cmd_batch)
+
+	meta = commands.add_parser('meta', help='print the Meta/*.json files of archives without decompressing world data (one JSON line per archive)')
+	meta.add_argument('files', nargs='+', help='.brz files to read')
+	meta.add_argument('--thumbnails', default=None, help='also extract each Thumbnail.png into this directory, named after the archive')
+	meta.set_defaults(handler=cmd_meta)
+
+	diff = commands.add_parser('diff', help='compare two archives by blob hash, then field by field for .mps files that differ. exits with 1 if they differ')
+	diff.add_argument('a', help='first .brz')
+	diff.add_argument('b', help='second .brz')
+	diff.add_argument('--max-indices', type=int, default=10, help='how many differing array indices to list per field (default: %(default)s)')
+	diff.add_argument('--json', action='store_true', help='print the result as JSON')
+	diff.set_defaults(handler=cmd_diff)
+
+	inspect = commands.add_parser('inspect', help='report sizes per folder, compression methods, duplicate blobs and the largest files, from the index only (nothing is decompressed)')
+	inspect.add_argument('files', nargs='+', help='.brz files to inspect')
+	inspect.add_argument('--depth', type=int, default=3, help='how many path parts to group folders by, like 3 for /World/0/Bricks (default: %(default)s)')
+	inspect.add_argument('--largest', type=int, default=10, help='how many of the largest files to list (default: %(default)s)')
+	inspect.add_argument('--json', action='store_true', help='print one JSON line per archive (indented if there\'s only one)')
+	inspect.set_defaults(handler=cmd_inspect)
+
+	repack = commands.add_parser('repack', help='recompress every blob of an archive in parallel, keeping whichever of raw, the new zstd output or the original is smallest, and removing duplicate blobs')
+	repack.add_argument('source', help='.brz to read')
+	repack.add_argument('destination', help='.brz to write')
+	repack.add_argument('--level', type=int, default=19, help='zstd compression level (default: %(default)s)')
+	repack.add_argument('--workers', type=int, default=None, help='number of worker processes (default: CPU count)')
+	repack.add_argument('--method', choices=['auto', 'zstd', 'none'], default='auto', help='force a compression method for every blob; auto picks the smaller per blob (default: %(default)s)')
+	repack.add_argument('--json', action='store_true', help='print the report as JSON')
+	repack.set_defaults(handler=cmd_repack)
+
+	args = parser.parse_args(argv)
+	if args.command is None:
+		example()
+		return 0
+	return args.handler(args)
+
+if __name__ == '__main__':
+	sys.exit(main())
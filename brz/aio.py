@@ -0,0 +1,66 @@
+"""asyncio helpers for BRZ. Use them through `BRZ.aopen`, `BRZ.aread` and `BRZ.adump`.
+
+All the blocking work (file I/O, zstd, blake3) runs in worker threads, so the event loop keeps running meanwhile. `adump` uses one thread call per file.
+Cancelling the awaiting task stops at the next blob/file boundary. The blob being worked on when it's cancelled is finished in the background and thrown away.
+"""
+
+import asyncio
+import os
+import os.path
+import threading
+
+async def open_archive(brz, file_path: str, max_memory: int = None):
+	"""Reads the .brz at `file_path` into `brz` without blocking the event loop."""
+	cancelled = threading.Event()
+	# the file is opened and closed by the same function in the worker thread, so a cancellation can't come between them
+	future = asyncio.ensure_future(asyncio.to_thread(_read_archive, brz, file_path, max_memory, cancelled))
+	try:
+		await asyncio.shield(future)
+	except asyncio.CancelledError:
+		cancelled.set()
+		future.add_done_callback(lambda done: _discard(done, brz))
+		raise
+
+def _discard(future, brz):
+	# nobody gets `brz` after a cancellation, but with max_memory it still has the .brz open once the thread is done
+	if not future.cancelled():
+		future.exception() # retrieved so asyncio doesn't log it as unhandled
+	brz.close()
+
+def _read_archive(brz, file_path: str, max_memory: int, cancelled: threading.Event):
+	from . import BRZReader
+	if max_memory is not None:
+		# only the header and index are read now, the rest happens in `aread`/`adump`
+		brz._begin_lazy_reader(file_path, max_memory)
+		return
+	with open(file_path, 'rb') as f:
+		reader = BRZReader(f, brz)
+		reader.read_header()
+		reader.read_index()
+
+		brz.index.blobs = []
+		for i in range(brz.index.blob_count):
+			if cancelled.is_set():
+				return
+			reader.read_blob(i)
+
+		reader._construct_tree()
+
+async def dump_archive(brz, path: str):
+	"""Same as `BRZ.dump` but writes one file at a time in a worker thread."""
+	await asyncio.to_thread(os.mkdir, path) # throws error automatically if it exists, like dump()
+
+	queue = list(brz.tree.children.values())
+	while len(queue) > 0:
+		item = queue.pop(0)
+		combined_path = os.path.join(path, item.path().removeprefix('/'))
+		if item.is_folder:
+			await asyncio.to_thread(os.mkdir, combined_path)
+			queue.extend(list(item.children.values()))
+		else:
+			await asyncio.to_thread(_write_file, combined_path, item)
+
+def _write_file(path, file):
+	# file.data is read here too, since for archives opened with max_memory that decompresses
+	with open(path, 'wb') as output:
+		output.write(file.data)
@@ -0,0 +1,138 @@
+"""Runs a function over every .brz archive in a directory using a pool of worker processes.
+Each archive produces one JSON line in the output, so results can be streamed/appended and processed later.
+
+The function is given the path of a single archive and must return something JSON serializable.
+It can be passed as a 'module:function' string (like 'mytools.scrape:count_bricks'), which is what the CLI does.
+"""
+
+from multiprocessing import Pool
+from . import BRZ, BRZReader
+import importlib
+import json
+import os
+import os.path
+import sys
+import time
+
+try:
+	import resource # unix only. used to cap the address space of each worker
+except ImportError:
+	resource = None
+
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def parse_size(text: str) -> int:
+	"""Parses a size like '512M', '2G' or '1048576' into a number of bytes"""
+	text = text.strip().upper().removesuffix('B')
+	if text[-1:] in SIZE_SUFFIXES:
+		return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+	return int(text)
+
+def load_function(spec: str):
+	"""Resolves a 'module:function' string into the function it names."""
+	module_name, sep, func_name = spec.partition(':')
+	if not sep or not module_name or not func_name:
+		raise ValueError(f'function must be given as \'module:function\', got \'{spec}\'')
+	module = importlib.import_module(module_name)
+	func = module
+	for name in func_name.split('.'):
+		func = getattr(func, name)
+	if not callable(func):
+		raise TypeError(f'\'{spec}\' is not callable')
+	return func
+
+def find_archives(directory: str, recursive: bool = True) -> list[str]:
+	"""Lists every .brz file in `directory` (and its subdirectories if `recursive`), sorted so runs are repeatable."""
+	found = []
+	if recursive:
+		for root, dirs, files in os.walk(directory):
+			dirs.sort()
+			for name in sorted(files):
+				if name.lower().endswith('.brz'):
+					found.append(os.path.join(root, name))
+	else:
+		for name in sorted(os.listdir(directory)):
+			path = os.path.join(directory, name)
+			if name.lower().endswith('.brz') and os.path.isfile(path):
+				found.append(path)
+	return found
+
+def summary(path: str) -> dict:
+	"""Example per-archive function: counts the files and bytes inside an archive. Only the header and index are read."""
+	brz = BRZ()
+	with open(path, 'rb') as f:
+		reader = BRZReader(f, brz)
+		reader.read_header()
+		reader.read_index()
+	return {
+		'files': brz.index.file_count,
+		'blobs': brz.index.blob_count,
+		'compressed_bytes': sum(brz.index.compressed_lengths),
+		'decompressed_bytes': sum(brz.index.decompressed_lengths),
+	}
+
+
+# ----------
+# Worker side
+# ----------
+
+_worker_func = None
+
+def _init_worker(func, memory_limit):
+	global _worker_func
+	if memory_limit is not None and resource is not None:
+		# an archive that needs more than this raises MemoryError inside the worker, which gets reported for that archive only
+		resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+	if isinstance(func, str):
+		func = load_function(func)
+	_worker_func = func
+
+def _run_one(path):
+	# serialize in the worker so an unpicklable or non-JSON result only fails that archive
+	start = time.perf_counter()
+	try:
+		record = {'path': path, 'ok': True, 'result': _worker_func(path)}
+		record['seconds'] = round(time.perf_counter() - start, 6)
+		return True, json.dumps(record)
+	except Exception as e:
+		record = {'path': path, 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+		record['seconds'] = round(time.perf_counter() - start, 6)
+		return False, json.dumps(record)
+
+
+# ----------
+# Driver
+# ----------
+
+def run_batch(paths: list[str], func, output, workers: int = None, max_tasks_per_worker: int = 100, memory_limit: int = None, progress=sys.stderr) -> tuple[int, int]:
+	"""Runs `func` over every archive in `paths` and writes a JSON line per archive to the `output` stream.
+	`func` is a callable or a 'module:function' string. Callables must be picklable (defined at the top level of a module).
+	`workers` defaults to the number of CPUs.
+	`max_tasks_per_worker` recycles each worker process after that many archives, so memory fragmentation from big archives doesn't pile up.
+	`memory_limit` caps the address space (in bytes) of each worker on platforms that support it.
+	`progress` is a text stream that gets a progress line while running, or None for silence.
+	Results are written in completion order, not input order. Returns (succeeded, failed) counts."""
+	if isinstance(func, str):
+		load_function(func) # fail early in the parent instead of once per worker
+
+	total = len(paths)
+	succeeded = 0
+	failed = 0
+	start = time.perf_counter()
+	with Pool(workers, _init_worker, (func, memory_limit), max_tasks_per_worker) as pool:
+		for ok, line in pool.imap_unordered(_run_one, paths):
+			if ok:
+				succeeded += 1
+			else:
+				failed += 1
+			output.write(line + '\n')
+
+			if progress is not None:
+				done = succeeded + failed
+				elapsed = time.perf_counter() - start
+				rate = done / elapsed if elapsed > 0 else 0
+				progress.write(f'\r[{done}/{total}] ok={succeeded} failed={failed} {rate:.1f} archives/s')
+				progress.flush()
+	if progress is not None and total > 0:
+		progress.write('\n')
+	return succeeded, failed
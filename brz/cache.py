@@ -0,0 +1,220 @@
+"""Cache for decoded .mps results so the same chunk from the same archive doesn't get decoded over and over.
+
+Entries are keyed by the blake3 hash of the .mps blob and the blake3 hash of the .schema blob it was decoded with (plus the root struct name).
+The .brz index already stores a blake3 hash for every blob, so making a key doesn't need any hashing of the data.
+
+There are two tiers:
+* memory: recently used entries kept as packed bytes, bounded by `max_memory_bytes`
+* disk (optional): one file per entry in a directory, bounded by `max_disk_bytes`, evicting the least recently used files first
+Decoded trees are stored packed with msgpack, which is compact and much faster to load than decoding the .mps again.
+Disk entries can also be zstd compressed, optionally with a dictionary trained on typical entries (see `brz.codec.train_dictionary`), which suits lots of small chunks.
+Every `get` returns a fresh copy, so modifying a result won't corrupt the cache.
+"""
+
+from collections import OrderedDict
+from blake3 import blake3
+from struct import pack, unpack_from
+from . import codec
+import msgpack
+import os
+import os.path
+import tempfile
+
+CACHE_MAGIC = b'BRDC'
+CACHE_FORMAT_VERSION = 2
+CACHE_HEADER = CACHE_MAGIC + bytes([CACHE_FORMAT_VERSION])
+CACHE_HEADER_SIZE = len(CACHE_HEADER) + 1 + 4 # + compressed flag, dictionary id
+
+class ChunkCache:
+	"""Size-bounded LRU cache of decoded .mps trees, in memory and (if `directory` is given) on disk.
+	If `compression_level` is set, disk entries are zstd compressed at that level, using `dictionary` (a `brz.codec.ZstdDictionary`) if given."""
+	def __init__(self, directory: str = None, max_disk_bytes: int = 256 * 1024 * 1024, max_memory_bytes: int = 32 * 1024 * 1024, compression_level: int = None, dictionary = None):
+		self.directory = directory
+		self.max_disk_bytes = max_disk_bytes
+		self.max_memory_bytes = max_memory_bytes
+		self.compression_level = compression_level
+		self.dictionary = dictionary
+		self.hits = 0
+		self.misses = 0
+
+		self._memory: OrderedDict[bytes, bytes] = OrderedDict() # key -> packed tree
+		self._memory_bytes = 0
+		self._disk: OrderedDict[str, int] = OrderedDict() # file name -> size, least recently used first
+		self._disk_bytes = 0
+
+		if directory is not None:
+			os.makedirs(directory, exist_ok=True)
+			self._scan_disk()
+
+	@staticmethod
+	def make_key(blob_hash: bytes, schema_hash: bytes, root_struct_name: str = None) -> bytes:
+		"""Makes a cache key from the blake3 hash of the .mps blob, the blake3 hash of the .schema blob, and the root struct (None for the default)"""
+		return blob_hash + schema_hash + (root_struct_name or '').encode('utf-8')
+
+	def get(self, key: bytes):
+		"""Returns the cached tree for `key`, or None if it's not cached."""
+		packed = self._memory.get(key)
+		if packed is not None:
+			self._memory.move_to_end(key)
+		elif self.directory is not None:
+			packed = self._read_disk(key)
+			if packed is not None:
+				self._remember(key, packed)
+
+		if packed is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return self._unpack(packed)
+
+	def put(self, key: bytes, tree):
+		"""Stores a decoded tree under `key` in memory and on disk."""
+		packed = msgpack.packb(tree, use_bin_type=True)
+		self._remember(key, packed)
+		if self.directory is not None:
+			self._write_disk(key, packed)
+
+	def clear(self):
+		"""Removes every entry from both tiers"""
+		self._memory.clear()
+		self._memory_bytes = 0
+		if self.directory is not None:
+			for name in list(self._disk):
+				self._remove_disk(name)
+
+	def __len__(self):
+		return len(self._disk) if self.directory is not None else len(self._memory)
+
+	# ----------
+	# Memory tier
+	# ----------
+
+	def _remember(self, key, packed):
+		if len(packed) > self.max_memory_bytes:
+			return
+		old = self._memory.pop(key, None)
+		if old is not None:
+			self._memory_bytes -= len(old)
+		self._memory[key] = packed
+		self._memory_bytes += len(packed)
+		while self._memory_bytes > self.max_memory_bytes:
+			_, evicted = self._memory.popitem(last=False)
+			self._memory_bytes -= len(evicted)
+
+	def _unpack(self, packed):
+		return msgpack.unpackb(packed, raw=False, strict_map_key=False)
+
+	# ----------
+	# Disk tier
+	# ----------
+
+	def _file_name(self, key):
+		return blake3(key).hexdigest() + '.bin'
+
+	def _file_path(self, name):
+		return os.path.join(self.directory, name[:2], name)
+
+	def _scan_disk(self):
+		# rebuild the LRU order from what's already there, using modification times as "last used"
+		found = []
+		for shard in os.scandir(self.directory):
+			if not shard.is_dir():
+				continue
+			for entry in os.scandir(shard.path):
+				if entry.name.endswith('.bin'):
+					stat = entry.stat()
+					found.append((stat.st_mtime, entry.name, stat.st_size))
+		found.sort()
+		for _, name, size in found:
+			self._disk[name] = size
+			self._disk_bytes += size
+		self._evict_disk()
+
+	def _read_disk(self, key):
+		name = self._file_name(key)
+		path = self._file_path(name)
+		try:
+			with open(path, 'rb') as f:
+				data = f.read()
+		except FileNotFoundError:
+			self._forget_disk(name) # someone else (another process sharing the directory?) evicted it
+			return None
+		packed = self._decode_entry(data)
+		if packed is None:
+			self._remove_disk(name) # written by an incompatible version, or with a dictionary we don't have
+			return None
+
+		try:
+			os.utime(path) # mark as recently used for the next _scan_disk
+		except OSError:
+			pass
+		if name in self._disk:
+			self._disk.move_to_end(name)
+		else:
+			self._disk[name] = len(data)
+			self._disk_bytes += len(data)
+		return packed
+
+	def _encode_entry(self, packed):
+		if self.compression_level is None:
+			return CACHE_HEADER + pack('<BI', 0, 0) + packed
+		dict_id = self.dictionary.dict_id if self.dictionary is not None else 0
+		return CACHE_HEADER + pack('<BI', 1, dict_id) + codec.compress(packed, self.compression_level, self.dictionary)
+
+	def _decode_entry(self, data):
+		if len(data) < CACHE_HEADER_SIZE or not data.startswith(CACHE_HEADER):
+			return None
+		compressed, dict_id = unpack_from('<BI', data, len(CACHE_HEADER))
+		body = data[CACHE_HEADER_SIZE:]
+		if not compressed:
+			return body
+		dictionary = None
+		if dict_id != 0:
+			if self.dictionary is None or self.dictionary.dict_id != dict_id:
+				return None
+			dictionary = self.dictionary
+		try:
+			return codec.decompress(body, dictionary = dictionary)
+		except Exception:
+			return None
+
+	def _write_disk(self, key, packed):
+		name = self._file_name(key)
+		path = self._file_path(name)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		# write to a temp file and rename it in place so readers never see a half-written entry
+		entry = self._encode_entry(packed)
+		fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(entry)
+			os.replace(temp_path, path)
+		except BaseException:
+			try:
+				os.remove(temp_path)
+			except OSError:
+				pass
+			raise
+
+		self._forget_disk(name)
+		size = len(entry)
+		self._disk[name] = size
+		self._disk_bytes += size
+		self._evict_disk()
+
+	def _evict_disk(self):
+		while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 0:
+			name = next(iter(self._disk))
+			self._remove_disk(name)
+
+	def _forget_disk(self, name):
+		size = self._disk.pop(name, None)
+		if size is not None:
+			self._disk_bytes -= size
+
+	def _remove_disk(self, name):
+		self._forget_disk(name)
+		try:
+			os.remove(self._file_path(name))
+		except FileNotFoundError:
+			pass
@@ -0,0 +1,94 @@
+"""zstd compression for blobs.
+
+With the `zstandard` package (in requirements.txt), compression/decompression contexts are created once per thread and reused,
+which is a lot cheaper than setting up fresh state for every blob when an archive has hundreds of tiny .mps/.schema files.
+It also enables dictionaries (see `train_dictionary`). If it isn't installed, this falls back to the `zstd` package, without contexts or dictionaries.
+
+Dictionaries can't be used for blobs inside a .brz: the format has no way to say which dictionary a blob needs, so the game couldn't read it.
+They're for our own storage of lots of small blobs, like the chunk cache.
+"""
+
+import threading
+from importlib.util import find_spec
+
+# the bindings are imported by _load() on the first (de)compression, so tools that only read an index don't pay for them
+zstd = None
+zstandard = None
+_loaded = False
+
+HAS_CONTEXTS = find_spec('zstandard') is not None
+
+def _load():
+	global zstd, zstandard, _loaded
+	try:
+		import zstandard
+	except ImportError:
+		zstandard = None
+		import zstd
+	_loaded = True
+
+_local = threading.local()
+
+class ZstdDictionary:
+	"""A trained zstd dictionary. `data` is the raw dictionary, which can be saved and loaded with `ZstdDictionary(data)`."""
+	def __init__(self, data: bytes):
+		if not _loaded:
+			_load()
+		if zstandard is None:
+			raise ImportError('zstd dictionaries need the \'zstandard\' package')
+		self.data = bytes(data)
+		self._dict = zstandard.ZstdCompressionDict(self.data)
+		self.dict_id = self._dict.dict_id()
+
+	def __repr__(self):
+		return f'ZstdDictionary(id={self.dict_id}, size={len(self.data)})'
+
+def train_dictionary(samples: list[bytes], size: int = 16 * 1024) -> ZstdDictionary:
+	"""Trains a dictionary of at most `size` bytes from example blobs. Works best with many small, similar samples (like every .mps of one kind)."""
+	if not _loaded:
+		_load()
+	if zstandard is None:
+		raise ImportError('training zstd dictionaries needs the \'zstandard\' package')
+	trained = zstandard.train_dictionary(size, list(samples))
+	return ZstdDictionary(trained.as_bytes())
+
+def _contexts() -> dict:
+	contexts = getattr(_local, 'contexts', None)
+	if contexts is None:
+		contexts = _local.contexts = {}
+	return contexts
+
+def compress(data: bytes, level: int = 3, dictionary: ZstdDictionary = None) -> bytes:
+	"""Compresses `data` into a single zstd frame, reusing this thread's compressor for `level`/`dictionary`"""
+	if not _loaded:
+		_load()
+	if zstandard is None:
+		if dictionary is not None:
+			raise ImportError('zstd dictionaries need the \'zstandard\' package')
+		return zstd.compress(data, level)
+
+	key = ('c', level, dictionary.dict_id if dictionary is not None else 0)
+	contexts = _contexts()
+	compressor = contexts.get(key)
+	if compressor is None:
+		compressor = contexts[key] = zstandard.ZstdCompressor(level=level, dict_data=dictionary._dict if dictionary is not None else None)
+	return compressor.compress(data)
+
+def decompress(data: bytes, decompressed_length: int = None, dictionary: ZstdDictionary = None) -> bytes:
+	"""Decompresses a zstd frame, reusing this thread's decompressor.
+	If `decompressed_length` is known (like from the .brz index), the output buffer is allocated at exactly that size up front."""
+	if not _loaded:
+		_load()
+	if zstandard is None:
+		if dictionary is not None:
+			raise ImportError('zstd dictionaries need the \'zstandard\' package')
+		return zstd.decompress(data)
+
+	key = ('d', dictionary.dict_id if dictionary is not None else 0)
+	contexts = _contexts()
+	decompressor = contexts.get(key)
+	if decompressor is None:
+		decompressor = contexts[key] = zstandard.ZstdDecompressor(dict_data=dictionary._dict if dictionary is not None else None)
+	if decompressed_length is not None:
+		return decompressor.decompress(data, max_output_size=decompressed_length)
+	return decompressor.decompress(data)
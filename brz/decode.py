@@ -0,0 +1,197 @@
+"""Decoding every chunk of a grid at once, spread over a process pool.
+
+Decoding is CPU bound, so threads don't help; `decode_grid` sends batches of chunk blobs to worker processes instead.
+The workers get the already imported MPS for each chunk kind once, when they start, rather than with every task.
+Results don't come back as pickled trees (a dict per brick is most of the cost of pickling them):
+every flat array and int array becomes a column of packed little-endian items, which a worker writes into one shared memory block per batch.
+The parent copies them from there into one buffer per column for the whole grid.
+
+Columns can be read with `struct.iter_unpack(fmt, column)` or `numpy.frombuffer` (with a structured dtype for struct items like RelativePositions).
+"""
+
+from . import BRZ, ROOT_STRUCTS
+from msgpackschema import MPS, Value, Array, INT_RANGES
+from io import BytesIO
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from struct import calcsize, pack
+import os
+import sys
+
+KINDS = ('Chunks', 'Components', 'Wires')
+
+# `track` is new in 3.13. before that every process that opens a block registers it with the resource tracker, which unlinks it
+# (with a warning) when that process exits, even though the parent is still reading it or already unlinked it
+_CAN_SKIP_TRACKING = sys.version_info >= (3, 13)
+_TRACKED = not _CAN_SKIP_TRACKING and os.name == 'posix' # blocks are only ever registered on posix
+
+def decode_grid(brz: BRZ, grid_id: int, workers: int = None, kinds: tuple[str] = KINDS) -> dict:
+	"""Decodes every .mps in the Chunks, Components and Wires folders of grid `grid_id` (1 is the static grid).
+	Returns a dict per kind (missing if the grid has none of them):
+	* 'names': chunk names in the order they were decoded, like '0_0_0'
+	* 'columns': column name -> bytearray of packed items for all chunks one after the other. Nested properties are named with dots, like 'CollisionFlags_Player.Flags'
+	* 'formats': column name -> struct format of one item, like '<hhh'
+	* 'offsets': column name -> item index where each chunk starts, plus the total at the end
+	* 'trees': per chunk, everything that isn't a column (like BrickSizes), laid out like `MPS.unpack` returns it
+	* 'trailing': (Components only) per chunk, the per-component data after the root struct
+	`workers` defaults to the CPU count; with 1 (or a single chunk) everything is decoded in this process."""
+	folder = f'/World/0/Bricks/Grids/{grid_id}'
+	if not brz.exists(folder) or not brz.isdir(folder):
+		raise FileNotFoundError(f'no grid {grid_id} in this archive')
+
+	schemas = {}
+	tasks = []
+	for kind in kinds:
+		kind_folder = f'{folder}/{kind}'
+		if not brz.exists(kind_folder) or not brz.isdir(kind_folder):
+			continue
+		names = sorted(name for name in brz.ls(kind_folder) if name.endswith('.mps'))
+		if len(names) == 0:
+			continue
+		schema_path = brz.schema_path_for(f'{kind_folder}/{names[0]}')
+		schemas[kind] = (brz.mps(schema_path), ROOT_STRUCTS.get(schema_path))
+		for name in names:
+			with brz.open(f'{kind_folder}/{name}', 'r') as stream:
+				tasks.append((kind, name.removesuffix('.mps'), stream.getvalue()))
+
+	result = {}
+	for kind in schemas:
+		result[kind] = {'names': [], 'columns': {}, 'formats': {}, 'offsets': {}, 'trees': []}
+		if kind == 'Components':
+			result[kind]['trailing'] = []
+
+	if workers is None:
+		workers = os.cpu_count() or 1
+	if workers <= 1 or len(tasks) <= 1:
+		_init_worker(schemas)
+		for kind, name, data in tasks:
+			_collect(result[kind], name, *_decode(kind, data), lambda offset, length, data: data)
+		return result
+
+	# a few batches per worker, so one slow batch doesn't leave the others idle at the end
+	batch_size = max(1, len(tasks) // (workers * 4))
+	batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+	with Pool(min(workers, len(batches)), _init_worker, (schemas,)) as pool:
+		results = pool.imap(_decode_batch, batches)
+		try:
+			for memory_name, decoded in results:
+				memory = _shared_memory(memory_name) if memory_name is not None else None
+				try:
+					for kind, name, columns, tree, trailing in decoded:
+						_collect(result[kind], name, columns, tree, trailing, lambda offset, length, data: data if memory is None else memory.buf[offset:offset + length])
+				finally:
+					if memory is not None:
+						_unlink(memory)
+		except BaseException:
+			# blocks aren't tracked (see _shared_memory), so any the remaining batches make would outlive us unless they're unlinked here
+			_unlink_rest(results)
+			raise
+	return result
+
+def _unlink_rest(results):
+	while True:
+		try:
+			memory_name, _ = next(results)
+		except StopIteration:
+			return
+		except Exception:
+			continue # that batch failed, and its worker unlinked its own block
+		if memory_name is not None:
+			try:
+				memory = _shared_memory(memory_name)
+			except FileNotFoundError:
+				continue
+			_unlink(memory)
+
+def _shared_memory(name: str = None, size: int = 0) -> SharedMemory:
+	# creates a block, or opens the one called `name`, without leaving it to the resource tracker. it's up to us to unlink it
+	if _CAN_SKIP_TRACKING:
+		return SharedMemory(name, create = name is None, size = size, track = False)
+	memory = SharedMemory(name, create = name is None, size = size)
+	if _TRACKED:
+		resource_tracker.unregister(memory._name, 'shared_memory')
+	return memory
+
+def _unlink(memory: SharedMemory):
+	memory.close()
+	if _TRACKED:
+		resource_tracker.register(memory._name, 'shared_memory') # unlink() unregisters it, which the tracker complains about if it was never registered
+	memory.unlink()
+
+def _collect(decoded: dict, name: str, columns: list, tree: dict, trailing: bytes, read):
+	# `read(offset, length, data)` gets a column's bytes from wherever the worker put them
+	decoded['names'].append(name)
+	decoded['trees'].append(tree)
+	if 'trailing' in decoded:
+		decoded['trailing'].append(trailing)
+	for column_name, fmt, offset, length, data in columns:
+		column = decoded['columns'].get(column_name)
+		if column is None:
+			column = decoded['columns'][column_name] = bytearray()
+			decoded['formats'][column_name] = fmt
+			decoded['offsets'][column_name] = [0]
+		column += read(offset, length, data)
+		decoded['offsets'][column_name].append(len(column) // calcsize(fmt))
+
+def _split(mps: MPS, struct_name: str, tree: dict, prefix: str, columns: list) -> dict:
+	"""Moves the flat and int arrays of `tree` into `columns` as (name, fmt, bytes), returning what's left"""
+	rest = {}
+	for property_name, property_type in mps._structs[struct_name].items():
+		value = tree[property_name]
+		match property_type:
+			case Array() if property_type.is_flat:
+				columns.append((prefix + property_name, mps._get_flat_fmt(property_type.type), value))
+			case Array() if property_type.type in INT_RANGES:
+				fmt = mps._get_flat_fmt(property_type.type)
+				columns.append((prefix + property_name, fmt, pack(f'<{len(value)}{fmt[1:]}', *value)))
+			case Value() if mps._get_domain_of_type(property_type.type) == 'struct':
+				rest[property_name] = _split(mps, property_type.type, value, f'{prefix}{property_name}.', columns)
+			case _:
+				rest[property_name] = value
+	return rest
+
+# ----------
+# Worker side
+# ----------
+
+_worker_schemas = None
+
+def _init_worker(schemas: dict):
+	global _worker_schemas
+	_worker_schemas = schemas
+
+def _decode(kind: str, data: bytes):
+	"""Returns (columns as (name, fmt, offset, length, bytes), the rest of the tree, trailing bytes)"""
+	mps, root_struct_name = _worker_schemas[kind]
+	stream = BytesIO(data)
+	tree = mps.unpack(stream, root_struct_name, raw_flat = True)
+	columns = []
+	rest = _split(mps, mps._get_root_struct_name(root_struct_name), tree, '', columns)
+	return [(name, fmt, 0, len(column), column) for name, fmt, column in columns], rest, data[stream.tell():]
+
+def _decode_batch(batch: list) -> tuple:
+	decoded = []
+	size = 0
+	for kind, name, data in batch:
+		columns, rest, trailing = _decode(kind, data)
+		decoded.append((kind, name, columns, rest, trailing))
+		size += sum(length for _, _, _, length, _ in columns)
+	if size == 0:
+		return None, decoded # only empty columns, which are small enough to pickle
+
+	# the parent unlinks the block once it has copied the columns out. until it has the name, unlinking it is up to us
+	memory = _shared_memory(size = size)
+	try:
+		offset = 0
+		for i, (kind, name, columns, rest, trailing) in enumerate(decoded):
+			placed = []
+			for column_name, fmt, _, length, column in columns:
+				memory.buf[offset:offset + length] = column
+				placed.append((column_name, fmt, offset, length, None))
+				offset += length
+			decoded[i] = (kind, name, placed, rest, trailing)
+	except BaseException:
+		_unlink(memory)
+		raise
+	memory.close()
+	return memory.name, decoded
@@ -0,0 +1,81 @@
+"""Structural diff between two .brz archives.
+
+The indexes are compared first: files whose blake3 hashes match are never decompressed.
+Differing .mps files are decoded (each with the schema from its own archive) and compared field by field.
+Arrays are compared whole first, and only the ones that differ are walked to find which items (usually bricks) changed.
+"""
+
+from .transform import ArchiveSource
+
+def diff_archives(a_path: str, b_path: str, max_indices: int = 10) -> dict:
+	"""Compares the .brz files at `a_path` and `b_path`.
+	Returns a dict with 'identical', 'only_in_a', 'only_in_b' (lists of paths) and 'changed', a list of
+	{'path', 'size_a', 'size_b', 'fields'} where 'fields' comes from `diff_trees` for .mps files (or 'error' if decoding failed).
+	At most `max_indices` differing indices are listed per array."""
+	with ArchiveSource(a_path) as a, ArchiveSource(b_path) as b:
+		a_paths = set(a.paths)
+		b_paths = set(b.paths)
+		result = {
+			'identical': False,
+			'only_in_a': [path for path in a.paths if path not in b_paths],
+			'only_in_b': [path for path in b.paths if path not in a_paths],
+			'changed': [],
+		}
+		for path in a.paths:
+			if path not in b_paths or a.hash(path) == b.hash(path):
+				continue
+			change = {'path': path, 'size_a': a.entry(path).decompressed_length, 'size_b': b.entry(path).decompressed_length}
+			if path.endswith('.mps'):
+				try:
+					change['fields'] = diff_trees(a.unpack_mps(path), b.unpack_mps(path), max_indices)
+				except Exception as e:
+					change['error'] = f'{type(e).__name__}: {e}'
+			result['changed'].append(change)
+	result['identical'] = len(result['only_in_a']) == 0 and len(result['only_in_b']) == 0 and len(result['changed']) == 0
+	return result
+
+def diff_trees(a, b, max_indices: int = 10, field: str = '') -> list[dict]:
+	"""Lists differences between two decoded .mps trees, with `field` like 'ColorsAndAlphas' or 'CollisionFlags_Player.Flags'.
+	Differing arrays give {'field', 'length_a', 'length_b', 'differing', 'indices'} where 'differing' counts items that differ in the common length.
+	Other values give {'field', 'a', 'b'}, and fields in only one tree give {'field', 'only_in': 'a' or 'b'}."""
+	if type(a) is dict and type(b) is dict:
+		differences = []
+		for key in list(a) + [key for key in b if key not in a]:
+			name = f'{field}.{key}' if field else str(key)
+			if key not in b:
+				differences.append({'field': name, 'only_in': 'a'})
+			elif key not in a:
+				differences.append({'field': name, 'only_in': 'b'})
+			else:
+				differences.extend(diff_trees(a[key], b[key], max_indices, name))
+		return differences
+
+	if type(a) is list and type(b) is list:
+		if a == b: # one C-level comparison for the common case of an unchanged column
+			return []
+		indices = [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+		return [{'field': field, 'length_a': len(a), 'length_b': len(b), 'differing': len(indices), 'indices': indices[0:max_indices]}]
+
+	if a != b:
+		return [{'field': field, 'a': a, 'b': b}]
+	return []
+
+def format_diff(result: dict) -> list[str]:
+	"""Human readable lines for the result of `diff_archives`"""
+	lines = [f'only in a: {path}' for path in result['only_in_a']]
+	lines.extend(f'only in b: {path}' for path in result['only_in_b'])
+	for change in result['changed']:
+		lines.append(f'changed: {change["path"]} ({change["size_a"]} -> {change["size_b"]} bytes)')
+		if 'error' in change:
+			lines.append(f'\tcould not decode: {change["error"]}')
+		for difference in change.get('fields', []):
+			if 'only_in' in difference:
+				lines.append(f'\t{difference["field"]}: only in {difference["only_in"]}')
+			elif 'indices' in difference:
+				length = f'{difference["length_a"]} -> {difference["length_b"]} items' if difference['length_a'] != difference['length_b'] else f'{difference["length_a"]} items'
+				shown = ', '.join(str(i) for i in difference['indices'])
+				more = ', ...' if difference['differing'] > len(difference['indices']) else ''
+				lines.append(f'\t{difference["field"]}: {length}, {difference["differing"]} differ' + (f' (at {shown}{more})' if shown else ''))
+			else:
+				lines.append(f'\t{difference["field"]}: {difference["a"]!r} -> {difference["b"]!r}')
+	return lines
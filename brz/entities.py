@@ -0,0 +1,173 @@
+"""Reading every entity of an archive (physics grids, wheels and other actors) as columns.
+
+Entities live in /World/0/Entities: ChunkIndex.mps lists the chunks and how many entities each has,
+and each Chunks/<x>_<y>_<z>.mps holds them grouped by type (TypeCounters), followed by one data struct per entity named by GlobalData's EntityDataClassNames.
+Dynamic brick grids are entities too: the folder name of /World/0/Bricks/Grids/<id> is the entity's persistent index,
+so `EntityTable.by_id` is how brick data finds the entity (and so the location) of its grid.
+
+Flat arrays (Locations, Rotations, velocities, colors) are read without a dict per entity, straight into `array.array` columns.
+"""
+
+from . import BRZ, ROOT_STRUCTS
+from .errors import BRZFormatError
+from msgpackschema import Value, Array, INT_RANGES
+from array import array
+from struct import calcsize
+import sys
+
+CHUNK_INDEX = '/World/0/Entities/ChunkIndex.mps'
+CHUNK_INDEX_SCHEMA = '/World/0/Entities/ChunkIndex.schema'
+CHUNKS = '/World/0/Entities/Chunks'
+GLOBAL_DATA = '/World/0/GlobalData.mps'
+
+# struct format character -> array typecode of the same kind (see _typecode for the size check)
+_TYPECODES = {'b': 'b', 'B': 'B', '?': 'B', 'h': 'h', 'H': 'H', 'i': 'i', 'I': 'I', 'q': 'q', 'Q': 'Q', 'f': 'f', 'd': 'd'}
+
+class EntityTable:
+	"""Every entity in an archive, one row per entity, in the order they're stored.
+	* `ids`: persistent index of each entity (also the grid id of dynamic brick grids)
+	* `types`/`classes`: EntityTypeNames and EntityDataClassNames entry of each entity, like 'Entity_DynamicBrickGrid'
+	* `chunks`: name of the chunk each entity is in, like '0_0_0'
+	* `columns`: every other per-entity array of the chunk schema by property name, as `array.array`s.
+	  Struct items are laid out inline, `widths[name]` values per entity; Locations is x, y, z, x, y, z...
+	* `flags`: BRSavedBitFlags properties (like PhysicsSleepingFlags) as lists of bools
+	* `weld_parents`: persistent index of the entity each one is welded to, or None
+	* `data`: the per-entity data struct, decoded with its class
+	* `by_id`: persistent index -> row, for looking up many entities (or grids) by id"""
+	def __init__(self):
+		self.next_persistent_index: int = 0
+		self.ids: array = array('I')
+		self.types: list[str] = []
+		self.classes: list[str] = []
+		self.chunks: list[str] = []
+		self.columns: dict[str, array] = {}
+		self.widths: dict[str, int] = {}
+		self.flags: dict[str, list[bool]] = {}
+		self.weld_parents: list[int] = []
+		self.data: list[dict] = []
+		self.by_id: dict[int, int] = {}
+
+	def __len__(self):
+		return len(self.ids)
+
+	def __contains__(self, persistent_index: int) -> bool:
+		return persistent_index in self.by_id
+
+	def value(self, name: str, row: int):
+		"""The `name` column of one entity: a number, or a tuple for struct items (like (x, y, z) for Locations)"""
+		width = self.widths[name]
+		column = self.columns[name]
+		return column[row] if width == 1 else tuple(column[row * width:(row + 1) * width])
+
+	def row(self, persistent_index: int) -> dict:
+		"""Everything about the entity with this persistent index, as one dict. Raises KeyError if there's none"""
+		row = self.by_id[persistent_index]
+		result = {'id': self.ids[row], 'type': self.types[row], 'class': self.classes[row], 'chunk': self.chunks[row], 'weld_parent': self.weld_parents[row], 'data': self.data[row]}
+		for name in self.columns:
+			result[name] = self.value(name, row)
+		for name, bits in self.flags.items():
+			result[name] = bits[row]
+		return result
+
+	def grid(self, grid_id: int) -> int:
+		"""Row of the entity that owns the dynamic brick grid `grid_id`, or None for the static grid (1) and grids without an entity"""
+		return self.by_id.get(grid_id)
+
+def read_entities(brz: BRZ) -> EntityTable:
+	"""Decodes every entity chunk of `brz` into an `EntityTable`. Archives without entities give an empty one."""
+	table = EntityTable()
+	if not brz.exists(CHUNK_INDEX):
+		return table
+	index = brz.unpack_mps(CHUNK_INDEX, CHUNK_INDEX_SCHEMA, ROOT_STRUCTS[CHUNK_INDEX_SCHEMA])
+	table.next_persistent_index = index['NextPersistentIndex']
+	global_data = brz.unpack_mps(GLOBAL_DATA)
+	type_names = global_data['EntityTypeNames']
+	class_names = global_data['EntityDataClassNames']
+
+	for chunk_index, count in zip(index['Chunk3DIndices'], index['NumEntities']):
+		chunk_name = f'{chunk_index["X"]}_{chunk_index["Y"]}_{chunk_index["Z"]}'
+		path = f'{CHUNKS}/{chunk_name}.mps'
+		schema_path = brz.schema_path_for(path)
+		mps = brz.mps(schema_path)
+		root_struct_name = ROOT_STRUCTS.get(schema_path, 'BRSavedEntityChunkSoA')
+		with brz.open(path, 'r') as stream:
+			tree = mps.unpack(stream, root_struct_name, raw_flat = True)
+			type_indices = [counter['TypeIndex'] for counter in tree['TypeCounters'] for _ in range(counter['NumEntities'])]
+			if len(type_indices) != count:
+				raise BRZFormatError(f'"{path}" has {len(type_indices)} entities, but the chunk index says {count}')
+			# the data struct of each entity comes right after the chunk's root struct
+			for type_index in type_indices:
+				table.data.append(mps.unpack(stream, class_names[type_index]))
+			left = len(stream.getbuffer()) - stream.tell()
+			if left != 0:
+				raise BRZFormatError(f'"{path}" has {left} bytes after the entity data')
+
+		table.types.extend(type_names[type_index] for type_index in type_indices)
+		table.classes.extend(class_names[type_index] for type_index in type_indices)
+		table.chunks.extend([chunk_name] * count)
+		flags = {}
+		for property_name, property_type in mps._structs[root_struct_name].items():
+			value = tree[property_name]
+			match property_type:
+				case Value() if property_type.type == 'BRSavedBitFlags':
+					flags[property_name] = flag_bits(value, count)
+					table.flags.setdefault(property_name, []).extend(flags[property_name])
+				case Array() if property_type.is_flat:
+					_extend(table, property_name, mps._get_flat_fmt(property_type.type), value)
+				case Array() if property_name == 'PersistentIndices':
+					table.ids.extend(value)
+				case Array() if property_name == 'WeldParentIndices':
+					pass # needs WeldParentFlags, see below
+				case Array() if property_type.type in INT_RANGES:
+					if property_name not in table.columns:
+						table.columns[property_name] = array(_typecode(mps._get_flat_fmt(property_type.type)[1]) or 'q')
+						table.widths[property_name] = 1
+					table.columns[property_name].extend(value)
+
+		table.weld_parents.extend(weld_parent_indices(tree, flags, count))
+
+	for row, persistent_index in enumerate(table.ids):
+		table.by_id[persistent_index] = row
+	return table
+
+def flag_bits(flags: dict, count: int) -> list[bool]:
+	"""Expands a BRSavedBitFlags value (like PhysicsSleepingFlags, or CollisionFlags_Player in brick chunks) to one bool per item.
+	Bits are lowest first; saves sometimes leave out bytes that would be all zero."""
+	data = flags['Flags']
+	return [i // 8 < len(data) and bool(data[i // 8] >> (i % 8) & 1) for i in range(count)]
+
+def weld_parent_indices(tree: dict, flags: dict[str, list[bool]], count: int) -> list[int]:
+	"""Persistent index of the entity each of the `count` entities in an entity chunk `tree` is welded to, or None.
+	If the schema has WeldParentFlags (`flags` has those bits, see `flag_bits`), WeldParentIndices has one index per set bit. Otherwise it has one per entity.
+	Raises BRZFormatError if the number of indices doesn't match."""
+	welds = tree.get('WeldParentIndices', [])
+	if 'WeldParentFlags' in flags:
+		welded = flags['WeldParentFlags']
+		if len(welds) != sum(welded):
+			raise BRZFormatError(f'{len(welds)} WeldParentIndices for {sum(welded)} entities with their WeldParentFlags bit set')
+		remaining = iter(welds)
+		return [next(remaining) if is_welded else None for is_welded in welded]
+	if 'WeldParentIndices' not in tree:
+		return [None] * count
+	if len(welds) != count:
+		raise BRZFormatError(f'{len(welds)} WeldParentIndices for {count} entities, and no WeldParentFlags to tell which they belong to')
+	return list(welds)
+
+def _typecode(fmt_char: str) -> str:
+	# array sizes depend on the platform's C types, .mps sizes don't
+	typecode = _TYPECODES.get(fmt_char)
+	return typecode if typecode is not None and array(typecode).itemsize == calcsize('<' + fmt_char) else None
+
+def _extend(table: EntityTable, name: str, fmt: str, data: bytes):
+	# flat arrays whose items are all one type (like '<fff') become a typed array. anything else stays bytes, calcsize(fmt) per entity
+	typecode = _typecode(fmt[1]) if len(set(fmt[1:])) == 1 else None
+	if name not in table.columns:
+		table.columns[name] = array(typecode or 'B')
+		table.widths[name] = len(fmt) - 1 if typecode is not None else calcsize(fmt)
+	if typecode is None:
+		table.columns[name].extend(data)
+		return
+	values = array(typecode, data)
+	if sys.byteorder == 'big':
+		values.byteswap() # .mps files are little-endian
+	table.columns[name].extend(values)
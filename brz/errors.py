@@ -12,3 +12,6 @@ class BRZVersionError(BRZException):
 
 class BRZDecompressionError(BRZException):
 	pass
+
+class BRZMergeError(BRZException):
+	pass
@@ -0,0 +1,263 @@
+"""Building prefabs straight from NumPy arrays of bricks.
+
+`generate` takes one row per brick (positions, sizes, colors...) and writes a .brz with all of them on the static grid (grid 1).
+Bricks are sorted into 2048 unit chunks with NumPy, and each chunk is encoded and compressed in a process pool.
+Flat columns (positions, colors, orientations, materials, collision/visibility bits) are handed to MPS as raw bytes, so nothing makes a dict per brick.
+
+Schemas, the material table and Meta/Thumbnail.png come from a template archive (assets/single brick.brz by default).
+Meta/Prefab.json gets the template's with every pivot's half extent set to the bounds of the bricks.
+How the game uses the pivot centers and addedGlobalGridOffset isn't figured out yet, so those are 0.
+
+NumPy is optional for the rest of brz, so it's only imported when generating.
+"""
+
+from . import BRZWriter, ECompressionMethod, ROOT_STRUCTS
+from .transform import ArchiveSource, ArchiveBuilder
+from msgpackschema import MPS
+from datetime import datetime
+from io import BytesIO
+from multiprocessing import Pool
+import json
+import os
+import os.path
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'single brick.brz')
+CHUNK_SIZE = 2048 # chunk centers are at index * CHUNK_SIZE, so positions inside one are -1024..1023 from it
+OPAQUE_ALPHA = 5 # what the sample saves store in ColorsAndAlphas.A for opaque bricks
+DEFAULT_ORIENTATION = 16 # facing Z+, not rotated, like the template's brick
+
+STATIC_GRID = '/World/0/Bricks/Grids/1'
+CHUNK_SCHEMA = '/World/0/Bricks/ChunksShared.schema'
+CHUNK_INDEX_SCHEMA = '/World/0/Bricks/ChunkIndexShared.schema'
+ZERO_GUID = '00000000-0000-0000-0000-000000000000'
+
+def generate(
+	destination_path: str,
+	positions,
+	sizes,
+	colors = None,
+	assets = None,
+	asset_names: list[str] = ('PB_DefaultBrick',),
+	materials = None,
+	material_names: list[str] = None,
+	orientations = None,
+	collision = True,
+	visible = True,
+	name: str = '',
+	description: str = '',
+	owner_name: str = 'Generator',
+	owner_id: str = ZERO_GUID,
+	thumbnail: bytes = None,
+	workers: int = None,
+	compression_level: int = 3,
+	method: ECompressionMethod = None,
+	template_path: str = TEMPLATE_PATH,
+) -> dict:
+	"""Writes a .brz to `destination_path` with one procedural brick per row of `positions`.
+	* `positions`: N x 3 brick centers in world units (ints)
+	* `sizes`: N x 3 half extents as stored in BrickSizes, like (5, 5, 6) for a 1x1 brick, or one row for every brick
+	* `colors`: N x 4 RGBA or N x 3 RGB (A becomes OPAQUE_ALPHA), 0-255. White if None
+	* `assets`: per brick index into `asset_names` (procedural brick assets like 'PB_DefaultBrick'), 0 if None
+	* `materials`: per brick index into `material_names`, which defaults to the template's (BMC_Plastic, BMC_Glass...)
+	* `orientations`: per brick orientation byte, DEFAULT_ORIENTATION if None
+	* `collision`/`visible`: a bool for every brick, or one bool per brick
+	All bricks belong to one owner. `workers` is the number of processes encoding chunks (default: CPU count, 1 encodes in this process).
+	Returns a summary with the brick and chunk counts."""
+	np = _numpy()
+	positions = np.asarray(positions, dtype=np.int64)
+	if positions.ndim != 2 or positions.shape[1] != 3:
+		raise ValueError(f'positions must be N x 3, got shape {positions.shape}')
+	count = len(positions)
+	if count == 0:
+		raise ValueError('no bricks to generate')
+
+	sizes = _column(np, sizes, count, 3, 'sizes')
+	if sizes.min() < 0 or sizes.max() > 0xffff:
+		raise ValueError('sizes must fit in u16')
+	if colors is None:
+		colors = (255, 255, 255, OPAQUE_ALPHA)
+	colors = np.asarray(colors)
+	if colors.shape[-1:] == (3,):
+		colors = np.concatenate((np.broadcast_to(colors, (count, 3)), np.full((count, 1), OPAQUE_ALPHA)), axis=1)
+	colors = _column(np, colors, count, 4, 'colors')
+	assets = _column(np, 0 if assets is None else assets, count, None, 'assets')
+	if assets.min() < 0 or assets.max() >= len(asset_names):
+		raise ValueError(f'assets must be indices into asset_names ({len(asset_names)} names)')
+	materials = _column(np, 0 if materials is None else materials, count, None, 'materials')
+	orientations = _column(np, DEFAULT_ORIENTATION if orientations is None else orientations, count, None, 'orientations')
+	collision = _column(np, collision, count, None, 'collision').astype(bool)
+	visible = _column(np, visible, count, None, 'visible').astype(bool)
+
+	# which chunk each brick is in, then bricks grouped by chunk
+	chunks = np.floor_divide(positions + CHUNK_SIZE // 2, CHUNK_SIZE)
+	if chunks.min() < -0x8000 or chunks.max() > 0x7fff:
+		raise ValueError('positions are too far from the origin for i16 chunk indices')
+	relative = positions - chunks * CHUNK_SIZE
+	order = np.lexsort((chunks[:, 2], chunks[:, 1], chunks[:, 0]))
+	sorted_chunks = chunks[order]
+	starts = [0] + (np.flatnonzero(np.any(sorted_chunks[1:] != sorted_chunks[:-1], axis=1)) + 1).tolist() + [count]
+
+	tasks = []
+	for start, end in zip(starts[0:-1], starts[1:]):
+		picked = order[start:end]
+		tasks.append((
+			tuple(sorted_chunks[start].tolist()),
+			relative[picked].astype('<i2'),
+			sizes[picked],
+			colors[picked].astype('u1'),
+			assets[picked],
+			materials[picked].astype('u1'),
+			orientations[picked].astype('u1'),
+			collision[picked],
+			visible[picked],
+		))
+
+	with ArchiveSource(template_path) as template:
+		builder = ArchiveBuilder(compression_level, method)
+		for path in template.paths:
+			if path.endswith('.schema') or path == '/World/0/Entities/ChunkIndex.mps':
+				builder.copy(template, path)
+
+		chunk_index = {'Chunk3DIndices': [], 'ChunkOffsets': [], 'ChunkSizes': [], 'NumBricks': [], 'NumComponents': [], 'NumWires': []}
+		init_args = (template.read(CHUNK_SCHEMA), compression_level, method)
+		if workers is None:
+			workers = os.cpu_count() or 1
+		workers = min(workers, len(tasks))
+		if workers <= 1:
+			_init_worker(*init_args)
+			results = map(_encode_chunk, tasks)
+			encoded = [(task[0], len(task[1]), entry) for task, entry in zip(tasks, results)]
+		else:
+			with Pool(workers, _init_worker, init_args) as pool:
+				results = pool.imap(_encode_chunk, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+				encoded = [(task[0], len(task[1]), entry) for task, entry in zip(tasks, results)]
+		for (x, y, z), brick_count, entry in encoded:
+			builder.add_entry(f'{STATIC_GRID}/Chunks/{x}_{y}_{z}.mps', entry)
+			chunk_index['Chunk3DIndices'].append({'X': x, 'Y': y, 'Z': z})
+			chunk_index['ChunkOffsets'].append({'X': 0, 'Y': 0, 'Z': 0})
+			chunk_index['ChunkSizes'].append(CHUNK_SIZE)
+			chunk_index['NumBricks'].append(brick_count)
+			chunk_index['NumComponents'].append(0)
+			chunk_index['NumWires'].append(0)
+		_add_tree(builder, template, f'{STATIC_GRID}/ChunkIndex.mps', CHUNK_INDEX_SCHEMA, chunk_index)
+
+		global_data = template.unpack_mps('/World/0/GlobalData.mps')
+		for column, value in global_data.items():
+			if type(value) is list:
+				global_data[column] = []
+		global_data['ProceduralBrickAssetNames'] = list(asset_names)
+		global_data['MaterialAssetNames'] = list(material_names) if material_names is not None else template.unpack_mps('/World/0/GlobalData.mps')['MaterialAssetNames']
+		if materials.min() < 0 or materials.max() >= len(global_data['MaterialAssetNames']):
+			raise ValueError(f'materials must be indices into material_names ({len(global_data["MaterialAssetNames"])} names)')
+		_add_tree(builder, template, '/World/0/GlobalData.mps', '/World/0/GlobalData.schema', global_data)
+
+		_add_tree(builder, template, '/World/0/Owners.mps', '/World/0/Owners.schema', {
+			'UserIds': [_guid(owner_id)],
+			'UserNames': [owner_name],
+			'DisplayNames': [owner_name],
+			'EntityCounts': [0],
+			'BrickCounts': [count],
+			'ComponentCounts': [0],
+			'WireCounts': [0],
+		})
+
+		bundle = json.loads(template.read('/Meta/Bundle.json'))
+		now = datetime.now().strftime('%Y.%m.%d-%H.%M.%S')
+		bundle.update({'name': name, 'description': description, 'authors': [{'iD': owner_id, 'name': owner_name}], 'createdAt': now, 'updatedAt': now})
+		builder.add('/Meta/Bundle.json', _json(bundle))
+
+		prefab = json.loads(template.read('/Meta/Prefab.json'))
+		low = (positions - sizes).min(axis=0)
+		high = (positions + sizes).max(axis=0)
+		half_extent = dict(zip('xyz', ((high - low) // 2).tolist()))
+		for pivot in prefab['pivots'].values():
+			if type(pivot) is dict:
+				pivot['center'] = {'x': 0, 'y': 0, 'z': 0}
+				pivot['halfExtent'] = dict(half_extent)
+		prefab['addedGlobalGridOffset'] = {'x': 0, 'y': 0, 'z': 0}
+		builder.add('/Meta/Prefab.json', _json(prefab))
+
+		if thumbnail is not None:
+			builder.add('/Meta/Thumbnail.png', thumbnail)
+		else:
+			builder.copy(template, '/Meta/Thumbnail.png')
+		builder.write(destination_path)
+	return {'bricks': count, 'chunks': len(tasks)}
+
+def encode_chunk(mps: MPS, relative, sizes, colors, assets, materials, orientations, collision, visible) -> bytes:
+	"""Packs one brick chunk .mps from per-brick arrays (see `generate`), with `relative` positions from the chunk's center.
+	Every distinct (asset, size) gets one BrickSizes entry, grouped by asset."""
+	np = _numpy()
+	count = len(relative)
+	unique, type_indices = np.unique(np.column_stack((assets, sizes)), axis=0, return_inverse=True)
+	asset_ids, size_counts = np.unique(unique[:, 0], return_counts=True)
+	tree = {
+		'ProceduralBrickStartingIndex': 0, # no basic bricks, so BrickTypeIndices are BrickSizes indices
+		'BrickSizeCounters': [{'AssetIndex': asset, 'NumSizes': sizes_of_asset} for asset, sizes_of_asset in zip(asset_ids.tolist(), size_counts.tolist())],
+		'BrickSizes': [{'X': x, 'Y': y, 'Z': z} for x, y, z in unique[:, 1:].tolist()],
+		'BrickTypeIndices': type_indices.reshape(-1).tolist(),
+		'OwnerIndices': [0] * count,
+		'RelativePositions': np.ascontiguousarray(relative, dtype='<i2').tobytes(),
+		'Orientations': np.ascontiguousarray(orientations, dtype='u1').tobytes(),
+		'MaterialIndices': np.ascontiguousarray(materials, dtype='u1').tobytes(),
+		'ColorsAndAlphas': np.ascontiguousarray(colors, dtype='u1').tobytes(),
+	}
+	for property_name, property_type in mps._structs[ROOT_STRUCTS[CHUNK_SCHEMA]].items():
+		if property_type.type == 'BRSavedBitFlags':
+			# one bit per brick, lowest bit first
+			bits = visible if property_name == 'VisibilityFlags' else collision
+			tree[property_name] = {'Flags': np.packbits(bits, bitorder='little').tobytes()}
+	stream = BytesIO()
+	mps.pack(stream, tree, ROOT_STRUCTS[CHUNK_SCHEMA])
+	return stream.getvalue()
+
+# ----------
+# Helpers
+# ----------
+
+def _numpy():
+	try:
+		import numpy
+	except ImportError:
+		raise ImportError('generating prefabs needs the \'numpy\' package') from None
+	return numpy
+
+def _column(np, value, count: int, width: int, name: str):
+	"""`value` as a `count` row array (of `width` columns if given), repeating a single value/row for every brick"""
+	shape = (count,) if width is None else (count, width)
+	array = np.asarray(value)
+	try:
+		return np.broadcast_to(array, shape)
+	except ValueError:
+		raise ValueError(f'{name} must have shape {shape} or be one value for every brick, got shape {array.shape}') from None
+
+def _guid(text: str) -> dict:
+	# BRGuid is the 4 groups of 8 hex digits of the uuid, in order
+	digits = text.replace('-', '')
+	return {part: int(digits[i * 8:i * 8 + 8], 16) for i, part in enumerate('ABCD')}
+
+def _json(value) -> bytes:
+	# laid out like the game writes them
+	return json.dumps(value, indent='\t').replace('\n', '\r\n').encode('utf-8')
+
+def _add_tree(builder: ArchiveBuilder, template: ArchiveSource, path: str, schema_path: str, tree: dict):
+	stream = BytesIO()
+	template.mps(schema_path).pack(stream, tree, ROOT_STRUCTS.get(schema_path))
+	builder.add(path, stream.getvalue())
+
+# ----------
+# Worker side
+# ----------
+
+_worker_mps = None
+_worker_writer = None
+
+def _init_worker(chunk_schema: bytes, compression_level: int, method: ECompressionMethod):
+	global _worker_mps, _worker_writer
+	_worker_mps = MPS()
+	_worker_mps.import_schema(chunk_schema)
+	_worker_writer = BRZWriter(None, compression_level = compression_level, method = method)
+
+def _encode_chunk(task):
+	# compressed here too, so the parent only collects finished blobs
+	return _worker_writer.make_blob(encode_chunk(_worker_mps, *task[1:]))
@@ -0,0 +1,107 @@
+"""Size reports for .brz archives, built from the header and index only.
+
+No blob is decompressed (only the index itself), so this is cheap enough to run over a whole library to find bloated prefabs.
+Sizes of blobs shared by several files are counted once, for the first file that uses them, so folder totals add up to the archive's.
+"""
+
+from . import BRZ, BRZReader
+import os
+
+def inspect_archive(path: str, depth: int = 3, largest: int = 10) -> dict:
+	"""Reads the header and index of the .brz at `path` and returns a report as a dict:
+	'folders' groups files by the first `depth` parts of their path (like '/World/0/Bricks'),
+	'methods' has per compression method totals, 'duplicates' lists blobs stored more than once with the same hash,
+	and 'largest' the `largest` files by compressed size."""
+	brz = BRZ()
+	with open(path, 'rb') as f:
+		reader = BRZReader(f, brz)
+		reader.read_header()
+		reader.read_index()
+	index = brz.index
+	paths = index.file_paths()
+
+	report = {
+		'path': path,
+		'size': os.path.getsize(path),
+		'version': brz.version,
+		'index': {'method': brz.index_compression_method.name, 'compressed': brz.index_compressed_length, 'decompressed': brz.index_decompressed_length},
+		'files': index.file_count,
+		'blobs': index.blob_count,
+		'compressed': sum(index.compressed_lengths),
+		'decompressed': sum(index.decompressed_lengths),
+		'folders': {},
+		'methods': {},
+		'shared_files': 0,
+		'duplicates': [],
+		'largest': [],
+	}
+
+	for i in range(index.blob_count):
+		totals = report['methods'].setdefault(index.compression_methods[i].name, {'blobs': 0, 'compressed': 0, 'decompressed': 0})
+		totals['blobs'] += 1
+		totals['compressed'] += index.compressed_lengths[i]
+		totals['decompressed'] += index.decompressed_lengths[i]
+
+	counted = set()
+	files = []
+	for (_, _, blob_id), file_path in zip(index.files, paths):
+		if not 0 <= blob_id < index.blob_count:
+			continue # a broken index; diff and transform would complain, a size report shouldn't
+		folder = '/' + '/'.join(file_path.split('/')[1:-1][0:depth])
+		totals = report['folders'].setdefault(folder, {'files': 0, 'compressed': 0, 'decompressed': 0})
+		totals['files'] += 1
+		if blob_id in counted:
+			report['shared_files'] += 1
+			continue
+		counted.add(blob_id)
+		totals['compressed'] += index.compressed_lengths[blob_id]
+		totals['decompressed'] += index.decompressed_lengths[blob_id]
+		files.append((index.compressed_lengths[blob_id], file_path, blob_id))
+
+	# the writer stores every distinct blob once, so a repeated hash means whatever wrote the archive didn't deduplicate
+	blobs_by_hash = {}
+	for i, blob_hash in enumerate(index.blob_hashes):
+		blobs_by_hash.setdefault(blob_hash, []).append(i)
+	paths_by_blob = {}
+	for (_, _, blob_id), file_path in zip(index.files, paths):
+		paths_by_blob.setdefault(blob_id, []).append(file_path)
+	for blob_hash, blob_ids in blobs_by_hash.items():
+		if len(blob_ids) > 1:
+			report['duplicates'].append({
+				'hash': blob_hash.hex(),
+				'blobs': len(blob_ids),
+				'paths': [file_path for blob_id in blob_ids for file_path in paths_by_blob.get(blob_id, [])],
+				'wasted': sum(index.compressed_lengths[blob_id] for blob_id in blob_ids[1:]),
+			})
+	report['duplicates'].sort(key=lambda duplicate: duplicate['wasted'], reverse=True)
+
+	files.sort(reverse=True)
+	for compressed, file_path, blob_id in files[0:largest]:
+		report['largest'].append({'path': file_path, 'compressed': compressed, 'decompressed': index.decompressed_lengths[blob_id], 'method': index.compression_methods[blob_id].name})
+	return report
+
+def format_report(report: dict) -> list[str]:
+	"""Human readable lines for the result of `inspect_archive`"""
+	def ratio(totals):
+		return f'{totals["compressed"] / totals["decompressed"]:.1%}' if totals['decompressed'] > 0 else '-'
+
+	lines = [
+		f'{report["path"]}: {report["size"]} bytes, {report["files"]} files in {report["blobs"]} blobs, {report["compressed"]} -> {report["decompressed"]} bytes ({ratio(report)})',
+		f'index: {report["index"]["compressed"]} -> {report["index"]["decompressed"]} bytes ({report["index"]["method"]})',
+		'folders:',
+	]
+	for folder, totals in sorted(report['folders'].items(), key=lambda item: item[1]['compressed'], reverse=True):
+		lines.append(f'\t{folder}: {totals["files"]} files, {totals["compressed"]} -> {totals["decompressed"]} bytes ({ratio(totals)})')
+	lines.append('methods:')
+	for method, totals in report['methods'].items():
+		lines.append(f'\t{method}: {totals["blobs"]} blobs, {totals["compressed"]} -> {totals["decompressed"]} bytes')
+	if report['shared_files'] > 0:
+		lines.append(f'files sharing a blob with another file: {report["shared_files"]}')
+	if len(report['duplicates']) > 0:
+		lines.append(f'duplicate blobs ({sum(duplicate["wasted"] for duplicate in report["duplicates"])} bytes wasted):')
+		for duplicate in report['duplicates']:
+			lines.append(f'\t{duplicate["hash"][0:16]}: {duplicate["blobs"]} copies, {duplicate["wasted"]} bytes wasted ({", ".join(duplicate["paths"])})')
+	lines.append('largest files:')
+	for file in report['largest']:
+		lines.append(f'\t{file["path"]}: {file["compressed"]} -> {file["decompressed"]} bytes ({file["method"]})')
+	return lines
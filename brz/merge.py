@@ -0,0 +1,853 @@
+"""Merging several prefabs into one archive, and splitting one archive into several.
+
+Everything works a file at a time on top of `brz.transform.ArchiveSource`/`ArchiveBuilder`: only the index of each archive stays in memory,
+each .mps is decoded when it's needed and compressed again right away, and files that don't need any changes are copied without being decompressed.
+
+Merging renumbers everything that points into a per-archive table:
+* every entity (and so every dynamic grid, whose id is its entity's persistent index) gets a new persistent index
+* grid 1, the static grid, stays grid 1; chunks at the same position are merged brick by brick
+* owners are deduplicated by user id, and the name tables in GlobalData.mps (brick assets, materials, component types, ports...) are combined
+
+Component data after the component SoA isn't decoded (see the wire graph variants in msgpackschema), so it's carried over as-is.
+That data can refer to ExternalAssetReferences by index, so if an archive with components would need them renumbered, merging raises `BRZMergeError`
+instead of writing a prefab with components pointing at the wrong assets. Putting that archive first keeps its table as it is.
+For the same reason components can't be reordered, so merging static grid chunks raises if one type's components would end up in two groups.
+Layouts that haven't been seen in a save yet (wire flags with bits set, component brick indices that aren't two copies of one list) raise too, rather than being guessed at.
+"""
+
+from . import BRZ, ROOT_STRUCTS
+from .entities import flag_bits, weld_parent_indices
+from .errors import BRZMergeError
+from .transform import ArchiveSource, ArchiveBuilder
+from msgpackschema import MPS
+from contextlib import ExitStack
+from io import BytesIO
+import math
+import msgpack
+import os
+import os.path
+
+STATIC_GRID = 1
+WORLD = '/World/0'
+GRIDS = WORLD + '/Bricks/Grids'
+OWNERS = WORLD + '/Owners.mps'
+GLOBAL_DATA = WORLD + '/GlobalData.mps'
+ENTITY_INDEX = WORLD + '/Entities/ChunkIndex.mps'
+ENTITY_CHUNKS = WORLD + '/Entities/Chunks'
+CHUNK_KINDS = ('Chunks', 'Components', 'Wires')
+
+# columns of GlobalData that are part of another column's table (entity type i has data class i)
+PAIRED_TABLES = {'EntityDataClassNames': 'EntityTypeNames', 'ComponentDataStructNames': 'ComponentTypeNames'}
+
+def merge(source_paths: list[str], destination_path: str, compression_level: int = 3, method = None) -> dict:
+	"""Combines the prefabs at `source_paths` into one .brz at `destination_path`.
+	Meta files (name, thumbnail...) come from the first archive. Positions aren't changed, so prefabs saved in the same place will overlap.
+	Returns a summary with counts of archives, grids, entities, and files copied/rewritten."""
+	if len(source_paths) == 0:
+		raise ValueError('nothing to merge')
+	with ExitStack() as stack:
+		archives = [_Archive(stack.enter_context(ArchiveSource(path))) for path in source_paths]
+		builder = ArchiveBuilder(compression_level, method)
+		merger = _Merger(archives, builder)
+		merger.run()
+		builder.write(destination_path)
+	return {
+		'archives': len(archives),
+		'grids': merger.grids,
+		'entities': merger.entities,
+		'copied_files': merger.copied,
+		'rewritten_files': merger.rewritten,
+	}
+
+def extract(source_path: str, destination_path: str, grids: set[int] = None, region: tuple = None, compression_level: int = 3, method = None) -> dict:
+	"""Writes the part of the .brz at `source_path` selected by `grids` and/or `region` to `destination_path`.
+	`grids` is a set of grid ids (1 is the static grid). `region` is ((min x, y, z), (max x, y, z)) in world units;
+	static grid chunks are picked by their center and entities by their location. With both, things have to match both.
+	Anything attached by joints to what's picked comes along, wherever it is. Wires and joints to anything left out are dropped.
+	Returns a summary with counts of static chunks, grids and entities kept."""
+	with ArchiveSource(source_path) as source:
+		plan = _SplitPlan(_Archive(source))
+		return plan.extract(destination_path, grids, region, compression_level, method)
+
+def split_by_grid(source_path: str, directory: str, compression_level: int = 3, method = None) -> list[str]:
+	"""Splits the .brz at `source_path` into one archive per grid, named like 'name.grid40.brz' in `directory`.
+	Grids attached to another grid by a joint (like a servo's rotor) go with the grid they're attached to.
+	Returns the paths written."""
+	os.makedirs(directory, exist_ok=True)
+	stem = os.path.splitext(os.path.basename(source_path))[0]
+	written = []
+	with ArchiveSource(source_path) as source:
+		plan = _SplitPlan(_Archive(source))
+		roots = [STATIC_GRID] if len(plan.static_chunks) > 0 else []
+		roots.extend(sorted(grid for grid in plan.grid_ids if grid != STATIC_GRID and grid not in plan.attached))
+		for grid in roots:
+			path = os.path.join(directory, f'{stem}.grid{grid}.brz')
+			plan.extract(path, {grid}, None, compression_level, method)
+			written.append(path)
+	return written
+
+def split_by_region(source_path: str, directory: str, size: float, compression_level: int = 3, method = None) -> list[str]:
+	"""Splits the .brz at `source_path` into cubes `size` world units wide, one archive per non-empty cube, named like 'name.0_0_-1.brz' in `directory`.
+	See `extract` for how things are placed in a cube. Returns the paths written."""
+	os.makedirs(directory, exist_ok=True)
+	stem = os.path.splitext(os.path.basename(source_path))[0]
+	written = []
+	with ArchiveSource(source_path) as source:
+		plan = _SplitPlan(_Archive(source))
+		points = list(plan.static_chunks.values())
+		points.extend(location for entity, (_, location) in plan.entities.items() if entity not in plan.attached)
+		cells = sorted({tuple(math.floor(axis / size) for axis in point) for point in points})
+		for cell in cells:
+			region = (tuple(axis * size for axis in cell), tuple((axis + 1) * size for axis in cell))
+			path = os.path.join(directory, f'{stem}.{"_".join(str(axis) for axis in cell)}.brz')
+			plan.extract(path, None, region, compression_level, method)
+			written.append(path)
+	return written
+
+# ----------
+# Helpers
+# ----------
+
+def _chunk_name(index: dict) -> str:
+	return f'{index["X"]}_{index["Y"]}_{index["Z"]}'
+
+def _grid_of(path: str) -> int:
+	return int(path[len(GRIDS) + 1:].split('/')[0])
+
+def _is_flags(value) -> bool:
+	return type(value) is dict and list(value) == ['Flags']
+
+def _pack_flags(bits: list[bool], leave_empty: bool = False) -> dict:
+	if leave_empty and not any(bits):
+		return {'Flags': []}
+	data = bytearray((len(bits) + 7) // 8)
+	for i, bit in enumerate(bits):
+		if bit:
+			data[i // 8] |= 1 << (i % 8)
+	return {'Flags': list(data)}
+
+def _key(value) -> bytes:
+	return msgpack.packb(value)
+
+def _is_identity(mapping: list[int]) -> bool:
+	return all(new == old for old, new in enumerate(mapping))
+
+class _Archive:
+	"""An `ArchiveSource` with decoding helpers, plus how its indices map into the archive being written (unchanged by default)"""
+	def __init__(self, source: ArchiveSource):
+		self.source = source
+		self.tables: dict[str, list[int]] = {} # GlobalData column -> new index by old index
+		self.owners: list[int] = None
+		self.id_offset = 0
+		self.brick_offsets: dict[str, int] = {} # static grid chunk name -> where this archive's bricks start in the merged chunk
+		self.global_data = self.unpack(GLOBAL_DATA) if source.exists(GLOBAL_DATA) else {}
+
+	def mps(self, schema_path: str) -> MPS:
+		return self.source.mps(schema_path)
+
+	def unpack(self, path: str, trailing: bool = False):
+		return self.source.unpack_mps(path, trailing)
+
+	def unpack_entities(self, path: str) -> tuple[dict, list[dict]]:
+		"""Decodes an entity chunk, and the per-entity data after it (one struct per entity, named by EntityDataClassNames)"""
+		tree, rest = self.unpack(path, True)
+		mps = self.mps(self.source.schema_path_for(path))
+		classes = self.global_data['EntityDataClassNames']
+		stream = BytesIO(rest)
+		data = [mps.unpack(stream, classes[counter['TypeIndex']]) for counter in tree['TypeCounters'] for _ in range(counter['NumEntities'])]
+		if stream.tell() != len(rest):
+			raise BRZMergeError(f'"{path}" in "{self.source.path}" has {len(rest) - stream.tell()} bytes after the entity data')
+		return tree, data
+
+	def table(self, name: str, index: int) -> int:
+		mapping = self.tables.get(name)
+		return index if mapping is None else mapping[index]
+
+	def owner(self, index: int) -> int:
+		return index if self.owners is None else self.owners[index]
+
+	def entity(self, persistent_index: int) -> int:
+		return persistent_index + self.id_offset
+
+	def grid(self, grid: int) -> int:
+		return grid if grid == STATIC_GRID else self.entity(grid)
+
+	def brick_offset(self, grid: int, chunk_name: str) -> int:
+		return self.brick_offsets.get(chunk_name, 0) if grid == STATIC_GRID else 0
+
+	def unchanged(self) -> bool:
+		"""True if nothing from this archive needs renumbering, so its files can be copied as they are"""
+		return self.id_offset == 0 and \
+			(self.owners is None or _is_identity(self.owners)) and \
+			all(_is_identity(mapping) for mapping in self.tables.values()) and \
+			not any(self.brick_offsets.values())
+
+# ----------
+# Combining chunks
+# Each takes [(archive, tree, trailing bytes)] for one chunk position, and returns (tree, trailing bytes) with everything renumbered
+# ----------
+
+def _combine_bricks(decoded, grid, chunk_name):
+	first = decoded[0][1]
+	merged = {name: [] for name in first}
+	bricks = [] # (asset index, size key or None for basic bricks)
+	sizes = {} # procedural asset index -> {size key: size}
+	flags = {name: [] for name, value in first.items() if _is_flags(value)}
+	for archive, tree, _ in decoded:
+		# BrickTypeIndices below ProceduralBrickStartingIndex are BasicBrickAssetNames indices, the rest are BrickSizes indices offset by it
+		start = tree['ProceduralBrickStartingIndex']
+		size_assets = [archive.table('ProceduralBrickAssetNames', counter['AssetIndex']) for counter in tree['BrickSizeCounters'] for _ in range(counter['NumSizes'])]
+		for type_index in tree['BrickTypeIndices']:
+			if type_index < start:
+				bricks.append((archive.table('BasicBrickAssetNames', type_index), None))
+			else:
+				size = tree['BrickSizes'][type_index - start]
+				asset = size_assets[type_index - start]
+				key = tuple(size.values())
+				sizes.setdefault(asset, {}).setdefault(key, size)
+				bricks.append((asset, key))
+
+		count = len(tree['BrickTypeIndices'])
+		for name, value in tree.items():
+			if name in ('ProceduralBrickStartingIndex', 'BrickSizeCounters', 'BrickSizes', 'BrickTypeIndices'):
+				continue
+			if _is_flags(value):
+				flags[name].extend(flag_bits(value, count))
+			elif name == 'OwnerIndices':
+				merged[name].extend(archive.owner(owner) for owner in value)
+			elif name == 'MaterialIndices':
+				merged[name].extend(archive.table('MaterialAssetNames', material) for material in value)
+			elif type(value) is list:
+				merged[name].extend(value)
+			else:
+				raise BRZMergeError(f'don\'t know how to combine {name} in brick chunks')
+
+	basics = [asset for asset, key in bricks if key is None]
+	start = max(basics) + 1 if len(basics) > 0 else 0
+	position = {}
+	merged['ProceduralBrickStartingIndex'] = start
+	for asset, asset_sizes in sizes.items():
+		merged['BrickSizeCounters'].append({'AssetIndex': asset, 'NumSizes': len(asset_sizes)})
+		for key, size in asset_sizes.items():
+			position[asset, key] = len(merged['BrickSizes'])
+			merged['BrickSizes'].append(size)
+	merged['BrickTypeIndices'] = [asset if key is None else start + position[asset, key] for asset, key in bricks]
+	for name, bits in flags.items():
+		merged[name] = _pack_flags(bits)
+	return merged, b''
+
+def _combine_components(decoded, grid, chunk_name):
+	first = decoded[0][1]
+	merged = {name: [] for name in first}
+	for archive, tree, _ in decoded:
+		offset = archive.brick_offset(grid, chunk_name)
+		instances = sum(counter['NumInstances'] for counter in tree['ComponentTypeCounters'])
+		for name, value in tree.items():
+			match name:
+				case 'ComponentTypeCounters':
+					for counter in value:
+						type_index = archive.table('ComponentTypeNames', counter['TypeIndex'])
+						if len(merged[name]) > 0 and merged[name][-1]['TypeIndex'] == type_index:
+							merged[name][-1]['NumInstances'] += counter['NumInstances']
+						elif any(merged_counter['TypeIndex'] == type_index for merged_counter in merged[name]):
+							# components are grouped by type, but component data isn't decoded, so it can't be reordered to group them
+							type_name = archive.global_data['ComponentTypeNames'][counter['TypeIndex']]
+							raise BRZMergeError(f'chunk {chunk_name} of grid {grid} has {type_name} components in several archives with other components between them, which can\'t be grouped together')
+						else:
+							merged[name].append({**counter, 'TypeIndex': type_index})
+				case 'ComponentBrickIndices':
+					# the brick of every component, twice over in every save seen so far. what a different layout means isn't known
+					if len(value) != 2 * instances or value[0:instances] != value[instances:]:
+						raise BRZMergeError(f'{len(value)} component brick indices for {instances} components in "{archive.source.path}" aren\'t two copies of the same list')
+					merged[name].extend(brick + offset for brick in value[0:instances])
+				case 'JointBrickIndices':
+					merged[name].extend(brick + offset for brick in value)
+				case 'JointEntityReferences':
+					merged[name].extend(archive.entity(entity) for entity in value)
+				case _:
+					if type(value) is not list:
+						raise BRZMergeError(f'don\'t know how to combine {name} in component chunks')
+					merged[name].extend(value)
+
+	merged['ComponentBrickIndices'] *= 2
+	# component data is in the same order as ComponentTypeCounters, which were appended in the same order
+	return merged, b''.join(trailing for _, _, trailing in decoded)
+
+def _wire_port(archive, port, offset):
+	port = dict(port)
+	port['BrickIndexInChunk'] += offset
+	port['ComponentTypeIndex'] = archive.table('ComponentTypeNames', port['ComponentTypeIndex'])
+	port['PortIndex'] = archive.table('ComponentWirePortNames', port['PortIndex'])
+	return port
+
+def _combine_wires(decoded, grid, chunk_name):
+	first = decoded[0][1]
+	merged = {name: [] for name in first}
+	for archive, tree, _ in decoded:
+		offset = archive.brick_offset(grid, chunk_name)
+		for name, value in tree.items():
+			if _is_flags(value):
+				continue
+			elif name == 'RemoteWireSources':
+				for port in value:
+					source_offset = archive.brick_offset(port['GridPersistentIndex'], _chunk_name(port['ChunkIndex']))
+					port = _wire_port(archive, port, source_offset)
+					port['GridPersistentIndex'] = archive.grid(port['GridPersistentIndex'])
+					merged[name].append(port)
+			elif type(value) is list:
+				merged[name].extend(_wire_port(archive, port, offset) for port in value)
+			else:
+				raise BRZMergeError(f'don\'t know how to combine {name} in wire chunks')
+	for name, value in first.items():
+		if not _is_flags(value):
+			continue
+		if len(decoded) == 1:
+			merged[name] = value # nothing moved
+		elif any(len(tree[name]['Flags']) > 0 for _, tree, _ in decoded):
+			# empty in every save seen so far, so which wires the bits belong to (and so where they go once combined) isn't known
+			raise BRZMergeError(f'{name} of wire chunk {chunk_name} in grid {grid} has bits set, which can\'t be combined')
+		else:
+			merged[name] = {'Flags': []}
+	return merged, b''
+
+COMBINERS = {'Chunks': _combine_bricks, 'Components': _combine_components, 'Wires': _combine_wires}
+
+def _combine_entities(decoded, keep = None) -> tuple[dict, list[str]]:
+	"""Like the other combiners, but takes [(archive, tree, per-entity data)] and returns (tree, per-entity data).
+	`keep(archive, persistent_index)` can leave entities out. Weld parents that are left out are cleared."""
+	first = decoded[0][1]
+	flag_names = [name for name, value in first.items() if _is_flags(value)]
+	empty = {name: all(len(tree[name]['Flags']) == 0 for _, tree, _ in decoded) for name in flag_names}
+	records = [] # (type, columns, flags, weld parent, data)
+	for archive, tree, data in decoded:
+		types = [archive.table('EntityTypeNames', counter['TypeIndex']) for counter in tree['TypeCounters'] for _ in range(counter['NumEntities'])]
+		count = len(types)
+		flags = {name: flag_bits(tree[name], count) for name in flag_names}
+
+		# WeldParentIndices are assumed to be persistent indices, so they're renumbered like PersistentIndices
+		weld_parents = weld_parent_indices(tree, flags, count)
+		for i, parent in enumerate(weld_parents):
+			if parent is not None and keep is not None and not keep(archive, parent):
+				parent = None
+				if 'WeldParentFlags' in flags:
+					flags['WeldParentFlags'][i] = False
+			weld_parents[i] = None if parent is None else archive.entity(parent)
+
+		for i in range(count):
+			if keep is not None and not keep(archive, tree['PersistentIndices'][i]):
+				continue
+			columns = {}
+			for name, value in tree.items():
+				if name in ('TypeCounters', 'WeldParentIndices') or _is_flags(value):
+					continue
+				if type(value) is not list:
+					raise BRZMergeError(f'don\'t know how to combine {name} in entity chunks')
+				if name == 'PersistentIndices':
+					columns[name] = archive.entity(value[i])
+				elif name == 'OwnerIndices':
+					columns[name] = archive.owner(value[i])
+				else:
+					columns[name] = value[i]
+			records.append((types[i], columns, {name: flags[name][i] for name in flag_names}, weld_parents[i], data[i]))
+
+	# entities are stored grouped by type
+	type_order = {}
+	for record in records:
+		type_order.setdefault(record[0], len(type_order))
+	records.sort(key = lambda record: type_order[record[0]])
+
+	merged = {}
+	for name, value in first.items():
+		if name == 'TypeCounters':
+			merged[name] = [{'TypeIndex': entity_type, 'NumEntities': sum(1 for record in records if record[0] == entity_type)} for entity_type in type_order]
+		elif _is_flags(value):
+			merged[name] = _pack_flags([record[2][name] for record in records], empty[name])
+		elif name == 'WeldParentIndices':
+			if 'WeldParentFlags' not in flag_names and any(record[3] is None for record in records):
+				raise BRZMergeError('can\'t leave out a weld parent without WeldParentFlags to say which entities have one')
+			merged[name] = [record[3] for record in records if record[3] is not None]
+		else:
+			merged[name] = [record[1][name] for record in records]
+	return merged, [record[4] for record in records]
+
+# ----------
+# Merging
+# ----------
+
+class _Merger:
+	def __init__(self, archives: list[_Archive], builder: ArchiveBuilder):
+		self.archives = archives
+		self.builder = builder
+		self.schemas: dict[str, MPS] = {} # schema path -> MPS of the merged schema
+		self.global_data = {}
+		self.copied = 0
+		self.rewritten = 0
+		self.grids = 0
+		self.entities = 0
+
+	def run(self):
+		self._merge_schemas()
+		self._merge_global_data()
+		self._merge_owners()
+		self._assign_persistent_indices()
+		self._merge_static_grid()
+		self._merge_grids()
+		self._merge_entities()
+		self._copy_rest()
+
+	def _copy(self, archive, path, new_path = None):
+		self.builder.copy(archive.source, path, new_path)
+		self.copied += 1
+
+	def _pack(self, path, tree, trailing = b''):
+		for candidate in BRZ.schema_candidates(path):
+			if candidate in self.schemas:
+				stream = BytesIO()
+				self.schemas[candidate].pack(stream, tree, ROOT_STRUCTS.get(candidate))
+				stream.write(trailing)
+				self.builder.add(path, stream.getvalue())
+				self.rewritten += 1
+				return
+		raise BRZMergeError(f'could not find a .schema for "{path}"')
+
+	def _having(self, path):
+		return [archive for archive in self.archives if archive.source.exists(path)]
+
+	def _merge_schemas(self):
+		# schemas can differ between archives (e.g. component data structs only exist for components that are used), so they're combined
+		paths = {}
+		for archive in self.archives:
+			paths.update((path, None) for path in archive.source.paths if path.endswith('.schema'))
+		for path in paths:
+			having = self._having(path)
+			if len({archive.source.hash(path) for archive in having}) == 1:
+				self._copy(having[0], path)
+				data = having[0].source.read(path)
+			else:
+				data = self._union_schema(path, having)
+				self.builder.add(path, data)
+				self.rewritten += 1
+			self.schemas[path] = MPS()
+			self.schemas[path].import_schema(data)
+
+	def _union_schema(self, path, having) -> bytes:
+		tables = ({}, {}) # enums, structs
+		origins = {}
+		for archive in having:
+			for kind, table, found in zip(('enum', 'struct'), tables, msgpack.unpackb(archive.source.read(path))):
+				for name, definition in found.items():
+					if name in table and table[name] != definition:
+						raise BRZMergeError(f'{kind} {name} in "{path}" is different in "{origins[kind, name]}" and "{archive.source.path}"')
+					table[name] = definition
+					origins.setdefault((kind, name), archive.source.path)
+		return msgpack.packb(list(tables))
+
+	def _merge_global_data(self):
+		having = self._having(GLOBAL_DATA)
+		if len(having) == 0:
+			return
+		columns = list(having[0].global_data)
+		merged = {name: [] for name in columns}
+		groups = [[name] + [paired for paired, table in PAIRED_TABLES.items() if table == name] for name in columns if name not in PAIRED_TABLES]
+		seen = {group[0]: {} for group in groups}
+		for archive in having:
+			for group in groups:
+				rows = zip(*(archive.global_data.get(name, []) for name in group))
+				mapping = []
+				for row in rows:
+					key = _key(row)
+					index = seen[group[0]].get(key)
+					if index is None:
+						index = seen[group[0]][key] = len(merged[group[0]])
+						for name, value in zip(group, row):
+							merged[name].append(value)
+					mapping.append(index)
+				for name in group:
+					archive.tables[name] = mapping
+			if not _is_identity(archive.tables.get('ExternalAssetReferences', [])) and any('/Components/' in path for path in archive.source.files_in(GRIDS)):
+				# component data isn't decoded, so references to these from it can't be renumbered
+				raise BRZMergeError(f'ExternalAssetReferences of "{archive.source.path}" would have to be renumbered, which would break its component data; try merging it first')
+
+		self.global_data = merged
+		if len({archive.source.hash(GLOBAL_DATA) for archive in having}) == 1:
+			self._copy(having[0], GLOBAL_DATA)
+		else:
+			self._pack(GLOBAL_DATA, merged)
+
+	def _merge_owners(self):
+		having = self._having(OWNERS)
+		if len(having) == 0:
+			return
+		trees = [archive.unpack(OWNERS) for archive in having]
+		merged = {name: [] for name in trees[0]}
+		counts = [name for name in merged if name.endswith('Counts')] # EntityCounts, BrickCounts, ... are summed
+		seen = {}
+		for archive, tree in zip(having, trees):
+			archive.owners = []
+			for row, user_id in enumerate(tree['UserIds']):
+				key = _key(user_id)
+				index = seen.get(key)
+				if index is None:
+					index = seen[key] = len(merged['UserIds'])
+					for name in merged:
+						merged[name].append(0 if name in counts else tree[name][row])
+				for name in counts:
+					merged[name][index] += tree[name][row]
+				archive.owners.append(index)
+		self._pack(OWNERS, merged)
+
+	def _assign_persistent_indices(self):
+		self.entity_indexes = {}
+		next_index = 0
+		for archive in self.archives:
+			if not archive.source.exists(ENTITY_INDEX):
+				continue
+			tree = archive.unpack(ENTITY_INDEX)
+			self.entity_indexes[archive] = tree
+			archive.id_offset = next_index
+			next_index += tree['NextPersistentIndex']
+		self.next_persistent_index = next_index
+
+	def _merge_chunk(self, parts, grid, chunk_name, destination):
+		"""Writes the Chunks, Components and Wires files for one chunk position. `parts` are (archive, source grid folder)."""
+		for kind in CHUNK_KINDS:
+			present = [(archive, f'{folder}/{kind}/{chunk_name}.mps') for archive, folder in parts]
+			present = [(archive, path) for archive, path in present if archive.source.exists(path)]
+			if len(present) == 0:
+				continue
+			output = f'{destination}/{kind}/{chunk_name}.mps'
+			if len(present) == 1 and present[0][0].unchanged():
+				self._copy(present[0][0], present[0][1], output)
+				continue
+			decoded = [(archive, *archive.unpack(path, True)) for archive, path in present]
+			tree, trailing = COMBINERS[kind](decoded, grid, chunk_name)
+			self._pack(output, tree, trailing)
+
+	def _merge_static_grid(self):
+		folder = f'{GRIDS}/{STATIC_GRID}'
+		index_path = folder + '/ChunkIndex.mps'
+		having = self._having(index_path)
+		if len(having) == 0:
+			return
+		self.grids += 1
+		indexes = [(archive, archive.unpack(index_path)) for archive in having]
+		chunks = {} # chunk name -> [(archive, index tree, row)]
+		for archive, tree in indexes:
+			for row, chunk_index in enumerate(tree['Chunk3DIndices']):
+				chunks.setdefault(_chunk_name(chunk_index), []).append((archive, tree, row))
+
+		# where each archive's bricks go in merged chunks has to be known before renumbering any wires pointing at them
+		for chunk_name, parts in chunks.items():
+			offset = 0
+			for archive, tree, row in parts:
+				archive.brick_offsets[chunk_name] = offset
+				offset += tree['NumBricks'][row]
+
+		merged = {name: [] for name in indexes[0][1]}
+		for chunk_name, parts in chunks.items():
+			_, first, first_row = parts[0]
+			for archive, tree, row in parts[1:]:
+				if tree['ChunkOffsets'][row] != first['ChunkOffsets'][first_row] or tree['ChunkSizes'][row] != first['ChunkSizes'][first_row]:
+					raise BRZMergeError(f'static grid chunk {chunk_name} has a different offset or size in "{archive.source.path}"')
+			for name in merged:
+				if name in ('Chunk3DIndices', 'ChunkOffsets', 'ChunkSizes'):
+					merged[name].append(first[name][first_row])
+				else:
+					merged[name].append(sum(tree[name][row] for _, tree, row in parts))
+			self._merge_chunk([(archive, folder) for archive, _, _ in parts], STATIC_GRID, chunk_name, folder)
+		self._pack(index_path, merged)
+
+	def _merge_grids(self):
+		for archive in self.archives:
+			grids = {}
+			for path in archive.source.files_in(GRIDS):
+				grids.setdefault(_grid_of(path), []).append(path)
+			for grid, paths in grids.items():
+				if grid == STATIC_GRID:
+					continue
+				self.grids += 1
+				folder = f'{GRIDS}/{grid}'
+				destination = f'{GRIDS}/{archive.grid(grid)}'
+				chunk_names = {}
+				for path in paths:
+					relative = path[len(folder) + 1:]
+					kind = relative.split('/')[0]
+					if kind in CHUNK_KINDS and relative.endswith('.mps'):
+						chunk_names[os.path.basename(relative).removesuffix('.mps')] = None
+					else:
+						self._copy(archive, path, destination + '/' + relative) # ChunkIndex.mps has nothing to renumber
+				for chunk_name in chunk_names:
+					self._merge_chunk([(archive, folder)], grid, chunk_name, destination)
+
+	def _merge_entities(self):
+		if len(self.entity_indexes) == 0:
+			return
+		chunk_indices = {}
+		chunk_counts = {}
+		for tree in self.entity_indexes.values():
+			for chunk_index, count in zip(tree['Chunk3DIndices'], tree['NumEntities']):
+				chunk_indices.setdefault(_chunk_name(chunk_index), chunk_index)
+				chunk_counts[_chunk_name(chunk_index)] = chunk_counts.get(_chunk_name(chunk_index), 0) + count
+
+		classes = self.global_data['EntityDataClassNames']
+		for chunk_name in chunk_indices:
+			path = f'{ENTITY_CHUNKS}/{chunk_name}.mps'
+			having = self._having(path)
+			if len(having) == 0:
+				continue
+			if len(having) == 1 and having[0].unchanged():
+				self._copy(having[0], path)
+				continue
+			mps = self.schemas[having[0].source.schema_path_for(path)]
+			decoded = [(archive, *archive.unpack_entities(path)) for archive in having]
+			tree, data = _combine_entities(decoded)
+			trailing = BytesIO()
+			entity_data = iter(data)
+			for counter in tree['TypeCounters']:
+				for _ in range(counter['NumEntities']):
+					mps.pack(trailing, next(entity_data), classes[counter['TypeIndex']])
+			chunk_counts[chunk_name] = len(tree['PersistentIndices'])
+			self._pack(path, tree, trailing.getvalue())
+
+		self.entities = sum(chunk_counts.values())
+		index = dict(next(iter(self.entity_indexes.values())))
+		index['NextPersistentIndex'] = self.next_persistent_index
+		index['Chunk3DIndices'] = list(chunk_indices.values())
+		index['NumEntities'] = [chunk_counts[chunk_name] for chunk_name in chunk_indices]
+		self._pack(ENTITY_INDEX, index)
+
+	def _copy_rest(self):
+		# Meta files, and anything else this doesn't know about, from whichever archive has it first
+		for archive in self.archives:
+			for path in archive.source.paths:
+				if path in self.builder or path.startswith(GRIDS + '/') or path.startswith(ENTITY_CHUNKS + '/'):
+					continue
+				self._copy(archive, path)
+
+# ----------
+# Splitting
+# ----------
+
+class _SplitPlan:
+	"""What's where in one archive: static grid chunks, entities, and which entities are attached to which grids by joints.
+	Made once per archive, then `extract` can be called for as many selections as needed."""
+	def __init__(self, archive: _Archive):
+		self.archive = archive
+		source = archive.source
+		self.grid_ids = sorted({_grid_of(path) for path in source.files_in(GRIDS)})
+
+		self.static_index = None
+		self.static_chunks = {} # chunk name -> center
+		static_index_path = f'{GRIDS}/{STATIC_GRID}/ChunkIndex.mps'
+		if source.exists(static_index_path):
+			self.static_index = archive.unpack(static_index_path)
+			for chunk_index, offset, size in zip(self.static_index['Chunk3DIndices'], self.static_index['ChunkOffsets'], self.static_index['ChunkSizes']):
+				self.static_chunks[_chunk_name(chunk_index)] = tuple(chunk_index[axis] * size + offset[axis] for axis in 'XYZ')
+
+		self.entities = {} # persistent index -> (entity chunk name, location)
+		for path in source.files_in(ENTITY_CHUNKS):
+			tree = archive.unpack(path)
+			chunk_name = os.path.basename(path).removesuffix('.mps')
+			for entity, location in zip(tree['PersistentIndices'], tree['Locations']):
+				self.entities[entity] = (chunk_name, tuple(location.values()))
+
+		# joints: grid id -> entities attached to it. for the static grid, per chunk
+		self.joints: dict[int, set[int]] = {}
+		self.static_joints: dict[str, set[int]] = {}
+		for path in source.files_in(GRIDS):
+			if path.split('/')[-2] != 'Components':
+				continue
+			attached = set(archive.unpack(path).get('JointEntityReferences', []))
+			grid = _grid_of(path)
+			if grid == STATIC_GRID:
+				self.static_joints.setdefault(os.path.basename(path).removesuffix('.mps'), set()).update(attached)
+			else:
+				self.joints.setdefault(grid, set()).update(attached)
+		self.attached = set().union(*self.joints.values(), *self.static_joints.values())
+
+	def select(self, grids: set[int] = None, region: tuple = None) -> tuple[set[str], set[int]]:
+		"""Returns (static grid chunk names, persistent indices of entities) to keep"""
+		def in_region(point):
+			return region is None or all(low <= axis < high for low, axis, high in zip(region[0], point, region[1]))
+
+		static = set()
+		if grids is None or STATIC_GRID in grids:
+			static = {chunk_name for chunk_name, center in self.static_chunks.items() if in_region(center)}
+		if grids is None:
+			entities = {entity for entity, (_, location) in self.entities.items() if entity not in self.attached and in_region(location)}
+		else:
+			entities = {entity for entity, (_, location) in self.entities.items() if entity in grids and in_region(location)}
+
+		pending = list(entities)
+		for chunk_name in static:
+			pending.extend(self.static_joints.get(chunk_name, ()))
+		while len(pending) > 0:
+			entity = pending.pop()
+			if entity in self.entities:
+				entities.add(entity)
+				pending.extend(self.joints.get(entity, set()) - entities)
+		return static, entities
+
+	def extract(self, destination_path, grids, region, compression_level, method) -> dict:
+		static, entities = self.select(grids, region)
+		writer = _SplitWriter(self, static, entities, ArchiveBuilder(compression_level, method))
+		writer.run()
+		writer.builder.write(destination_path)
+		return {'static_chunks': len(static), 'grids': writer.grids, 'entities': len(entities)}
+
+class _SplitWriter:
+	def __init__(self, plan: _SplitPlan, static: set[str], entities: set[int], builder: ArchiveBuilder):
+		self.plan = plan
+		self.archive = plan.archive
+		self.static = static
+		self.entities = entities
+		self.builder = builder
+		self.grids = 0
+		owner_count = len(self.archive.unpack(OWNERS)['UserIds']) if self.archive.source.exists(OWNERS) else 0
+		self.counts = {name: [0] * owner_count for name in ('EntityCounts', 'BrickCounts', 'ComponentCounts', 'WireCounts')}
+
+	def run(self):
+		source = self.archive.source
+		for path in source.paths:
+			if not (path.startswith(GRIDS + '/') or path.startswith(ENTITY_CHUNKS + '/') or path in (ENTITY_INDEX, OWNERS)):
+				self.builder.copy(source, path) # schemas, GlobalData and Meta don't change
+		for grid in self.plan.grid_ids:
+			if grid == STATIC_GRID:
+				self._write_static_grid()
+			elif grid in self.entities:
+				self._write_grid(grid)
+		self._write_entities()
+		self._write_owners()
+
+	def _keeps_wire_source(self, port) -> bool:
+		if port['GridPersistentIndex'] == STATIC_GRID:
+			return _chunk_name(port['ChunkIndex']) in self.static
+		return port['GridPersistentIndex'] in self.entities
+
+	def _write_chunk(self, folder, chunk_name):
+		source = self.archive.source
+		bricks_path = f'{folder}/Chunks/{chunk_name}.mps'
+		owners = []
+		if source.exists(bricks_path):
+			self.builder.copy(source, bricks_path)
+			owners = self.archive.unpack(bricks_path)['OwnerIndices']
+			for owner in owners:
+				self.counts['BrickCounts'][owner] += 1
+
+		components_path = f'{folder}/Components/{chunk_name}.mps'
+		if source.exists(components_path):
+			tree, trailing = self.archive.unpack(components_path, True)
+			instances = sum(counter['NumInstances'] for counter in tree['ComponentTypeCounters'])
+			for brick in tree['ComponentBrickIndices'][0:instances]:
+				self._count('ComponentCounts', owners, brick)
+			kept = [i for i, entity in enumerate(tree['JointEntityReferences']) if entity in self.entities]
+			if len(kept) == len(tree['JointEntityReferences']):
+				self.builder.copy(source, components_path)
+			else:
+				for name in tree:
+					if name.startswith('Joint'):
+						tree[name] = [tree[name][i] for i in kept]
+				self._pack(components_path, tree, trailing)
+
+		wires_path = f'{folder}/Wires/{chunk_name}.mps'
+		if source.exists(wires_path):
+			tree = self.archive.unpack(wires_path)
+			remote = len(tree['RemoteWireSources'])
+			kept = [i for i, port in enumerate(tree['RemoteWireSources']) if self._keeps_wire_source(port)]
+			if len(kept) < remote:
+				tree['RemoteWireSources'] = [tree['RemoteWireSources'][i] for i in kept]
+				tree['RemoteWireTargets'] = [tree['RemoteWireTargets'][i] for i in kept]
+				for name, value in tree.items():
+					if _is_flags(value) and len(value['Flags']) > 0:
+						# see _combine_wires
+						raise BRZMergeError(f'{name} of "{wires_path}" has bits set, so wires to what\'s left out can\'t be dropped')
+				self._pack(wires_path, tree)
+			else:
+				self.builder.copy(source, wires_path)
+			for port in tree['RemoteWireTargets'] + tree['LocalWireTargets']:
+				self._count('WireCounts', owners, port['BrickIndexInChunk'])
+
+	def _count(self, name, owners, brick):
+		# components and wires count for the owner of their brick. without the chunk's bricks there's no owner to count them for
+		if brick < len(owners):
+			self.counts[name][owners[brick]] += 1
+
+	def _write_grid(self, grid):
+		self.grids += 1
+		folder = f'{GRIDS}/{grid}'
+		chunk_names = {}
+		for path in self.archive.source.files_in(folder):
+			relative = path[len(folder) + 1:]
+			if relative.split('/')[0] in CHUNK_KINDS:
+				chunk_names[os.path.basename(relative).removesuffix('.mps')] = None
+			else:
+				self.builder.copy(self.archive.source, path)
+		for chunk_name in chunk_names:
+			self._write_chunk(folder, chunk_name)
+
+	def _write_static_grid(self):
+		if len(self.static) == 0:
+			return
+		self.grids += 1
+		folder = f'{GRIDS}/{STATIC_GRID}'
+		index = self.plan.static_index
+		rows = [row for row, chunk_index in enumerate(index['Chunk3DIndices']) if _chunk_name(chunk_index) in self.static]
+		if len(rows) == len(index['Chunk3DIndices']):
+			self.builder.copy(self.archive.source, folder + '/ChunkIndex.mps')
+		else:
+			self._pack(folder + '/ChunkIndex.mps', {name: [value[row] for row in rows] for name, value in index.items()})
+		for row in rows:
+			self._write_chunk(folder, _chunk_name(index['Chunk3DIndices'][row]))
+
+	def _write_entities(self):
+		source = self.archive.source
+		if not source.exists(ENTITY_INDEX):
+			return
+		index = self.archive.unpack(ENTITY_INDEX)
+		rows = []
+		counts = []
+		for row, chunk_index in enumerate(index['Chunk3DIndices']):
+			path = f'{ENTITY_CHUNKS}/{_chunk_name(chunk_index)}.mps'
+			if not source.exists(path):
+				continue
+			tree, data = self.archive.unpack_entities(path)
+			for entity, owner in zip(tree['PersistentIndices'], tree['OwnerIndices']):
+				if entity in self.entities:
+					self.counts['EntityCounts'][owner] += 1
+			kept = sum(1 for entity in tree['PersistentIndices'] if entity in self.entities)
+			if kept == 0:
+				continue
+			rows.append(row)
+			counts.append(kept)
+			flags = {name: flag_bits(value, len(tree['PersistentIndices'])) for name, value in tree.items() if _is_flags(value)}
+			welded_to_kept = all(parent is None or parent in self.entities for parent in weld_parent_indices(tree, flags, len(tree['PersistentIndices'])))
+			if kept == len(tree['PersistentIndices']) and welded_to_kept:
+				self.builder.copy(source, path)
+				continue
+			tree, data = _combine_entities([(self.archive, tree, data)], lambda _, entity: entity in self.entities)
+			mps = self.archive.mps(source.schema_path_for(path))
+			trailing = BytesIO()
+			entity_data = iter(data)
+			for counter in tree['TypeCounters']:
+				for _ in range(counter['NumEntities']):
+					mps.pack(trailing, next(entity_data), self.archive.global_data['EntityDataClassNames'][counter['TypeIndex']])
+			self._pack(path, tree, trailing.getvalue())
+		index['Chunk3DIndices'] = [index['Chunk3DIndices'][row] for row in rows]
+		index['NumEntities'] = counts
+		self._pack(ENTITY_INDEX, index)
+
+	def _write_owners(self):
+		if not self.archive.source.exists(OWNERS):
+			return
+		tree = self.archive.unpack(OWNERS)
+		for name, counts in self.counts.items():
+			if name in tree:
+				tree[name] = counts
+		self._pack(OWNERS, tree)
+
+	def _pack(self, path, tree, trailing = b''):
+		schema_path = self.archive.source.schema_path_for(path)
+		stream = BytesIO()
+		self.archive.mps(schema_path).pack(stream, tree, ROOT_STRUCTS.get(schema_path))
+		stream.write(trailing)
+		self.builder.add(path, stream.getvalue())
@@ -0,0 +1,103 @@
+"""Recompressing every blob of an archive, to make prefabs the game exported smaller on disk.
+
+Each distinct blob (by hash) is decompressed and compressed again at the chosen level in a pool of worker processes,
+which read their blobs straight from the source file, so only compressed data goes between processes.
+Per blob, the smallest of stored raw, the new zstd output and the original compressed data is written,
+so a repack never makes a blob bigger. Blobs the source stored more than once are written once.
+"""
+
+from . import BRZWriter, ECompressionMethod
+from .transform import ArchiveSource, ArchiveBuilder, replacing
+from multiprocessing import Pool
+import os
+import os.path
+import time
+
+def repack(source_path: str, destination_path: str, compression_level: int = 3, workers: int = None, method: ECompressionMethod = None) -> dict:
+	"""Writes the files of `source_path` to `destination_path` with every blob recompressed at `compression_level`.
+	`method` forces a compression method like in `BRZ.save` (the original data is then only kept if it already uses it).
+	`workers` defaults to the CPU count; with 1 everything runs in this process.
+	Returns a report with sizes before and after, blob counts per method and how long it took."""
+	start = time.perf_counter()
+	before = os.path.getsize(source_path)
+	# the source is closed before the destination replaces it, so an archive can be repacked in place
+	with replacing(destination_path) as destination, ArchiveSource(source_path) as source:
+		index = source.brz.index
+		first_blob = {} # hash -> first blob id with it, the only one that gets recompressed
+		for blob_id, blob_hash in enumerate(index.blob_hashes):
+			first_blob.setdefault(blob_hash, blob_id)
+		blob_ids = list(first_blob.values())
+
+		if workers is None:
+			workers = os.cpu_count() or 1
+		workers = min(workers, len(blob_ids))
+		if workers <= 1:
+			_init_worker(source_path, compression_level, method)
+			try:
+				entries = dict(zip(blob_ids, map(_recompress, blob_ids)))
+			finally:
+				_close_worker()
+		else:
+			# biggest first, so a huge chunk doesn't start last and keep one worker busy after the others finish
+			blob_ids.sort(key = lambda blob_id: index.decompressed_lengths[blob_id], reverse = True)
+			with Pool(workers, _init_worker, (source_path, compression_level, method)) as pool:
+				entries = dict(zip(blob_ids, pool.imap(_recompress, blob_ids, chunksize = max(1, len(blob_ids) // (workers * 16)))))
+
+		builder = ArchiveBuilder(compression_level, method)
+		written = {} # hash -> entry, for the report
+		for path, (_, _, blob_id) in zip(source.paths, index.files):
+			blob_id = first_blob[index.blob_hashes[blob_id]]
+			entry = entries[blob_id]
+			if index.compressed_lengths[blob_id] <= entry.compressed_length and (method is None or method == index.compression_methods[blob_id]):
+				entry = source.entry(path) # the original was already at least as small
+			builder.add_entry(path, entry)
+			written[entry.hash] = entry
+		builder.write_file(destination)
+
+	methods = {}
+	kept = 0
+	for entry in written.values():
+		kept += callable(entry.data) # entries copied from the source read their data when written
+		methods[entry.method.name] = methods.get(entry.method.name, 0) + 1
+	after = os.path.getsize(destination_path)
+	return {
+		'source': source_path,
+		'destination': destination_path,
+		'before': before,
+		'after': after,
+		'saved': before - after,
+		'blobs_before': index.blob_count,
+		'blobs_after': len(written),
+		'duplicates_removed': index.blob_count - len(first_blob),
+		'kept_original': kept,
+		'methods': methods,
+		'seconds': round(time.perf_counter() - start, 3),
+	}
+
+def format_report(report: dict) -> str:
+	"""One human readable line for the result of `repack`"""
+	ratio = f'{report["after"] / report["before"]:.1%}' if report['before'] > 0 else '-'
+	methods = ', '.join(f'{count} {name}' for name, count in report['methods'].items())
+	return f'{report["source"]} -> {report["destination"]}: {report["before"]} -> {report["after"]} bytes ({ratio}, saved {report["saved"]}), {report["blobs_before"]} -> {report["blobs_after"]} blobs ({methods}; {report["duplicates_removed"]} duplicates removed, {report["kept_original"]} kept as they were) in {report["seconds"]}s'
+
+# ----------
+# Worker side
+# ----------
+
+_worker_source = None
+_worker_writer = None
+
+def _init_worker(source_path: str, compression_level: int, method: ECompressionMethod):
+	global _worker_source, _worker_writer
+	_worker_source = ArchiveSource(source_path)
+	_worker_writer = BRZWriter(None, compression_level = compression_level, method = method)
+
+def _close_worker():
+	global _worker_source
+	_worker_source.close()
+	_worker_source = None
+
+def _recompress(blob_id: int):
+	# the hash is checked while decompressing, so it's reused instead of hashing again
+	data = _worker_source._reader.read_blob_at(blob_id)
+	return _worker_writer.make_blob(data, _worker_source.brz.index.blob_hashes[blob_id])
@@ -0,0 +1,271 @@
+"""Streaming archive-to-archive transforms: read a .brz, rewrite a few files, write a new .brz.
+
+Blobs of files that aren't touched are copied over as-is (compressed bytes, lengths and hashes straight from the source index),
+so they're never decompressed or recompressed. Only the files given callbacks get read, and only one copied blob is in memory at a time.
+
+Example, renaming a prefab:
+	def rename(data):
+		bundle = json.loads(data)
+		bundle['name'] = 'New name'
+		return json.dumps(bundle, indent='\t').encode('utf-8')
+
+	transform('in.brz', 'out.brz', {'/Meta/Bundle.json': rename})
+
+`ArchiveSource` and `ArchiveBuilder` are the same idea as building blocks, for tools that combine several archives (see `brz.merge`).
+"""
+
+from . import BRZ, BRZReader, BRZWriter, BRZBlobEntry, ECompressionMethod, ROOT_STRUCTS
+from contextlib import contextmanager
+from io import BytesIO
+from os import SEEK_SET
+import os
+import os.path
+import stat
+import tempfile
+
+# the only way to read the umask is to set it, which races with other threads creating files, so it's read once here
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _normalize(path: str) -> str:
+	return '/' + path.strip('/')
+
+@contextmanager
+def replacing(destination_path: str):
+	"""Opens a temp file next to `destination_path` for writing, which replaces it once the block finishes without errors.
+	The destination is left alone until then, so it can be the archive being read from (as long as that's closed first on Windows)."""
+	try:
+		mode = stat.S_IMODE(os.stat(destination_path).st_mode) # keep the mode of the file being replaced
+	except FileNotFoundError:
+		mode = 0o666 & ~_UMASK # what open() would have made. mkstemp makes it readable only by us
+	fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(destination_path)), suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			os.fchmod(f.fileno(), mode)
+			yield f
+		os.replace(temp_path, destination_path)
+	except BaseException:
+		try:
+			os.remove(temp_path)
+		except OSError:
+			pass
+		raise
+
+def transform(source_path: str, destination_path: str, callbacks: dict, compression_level: int = 3, method: ECompressionMethod = None) -> dict:
+	"""Copies the .brz at `source_path` to `destination_path`, passing selected files through callbacks.
+	`callbacks` maps file paths (like '/Meta/Bundle.json') to a function that gets the file's contents and returns the new contents as bytes, or None to leave the file out.
+	Paths in `callbacks` that don't exist in the source are an error, so typos don't silently do nothing.
+	New contents are compressed with `compression_level`/`method` (see `BRZ.save`). Everything else keeps its original compression.
+	Returns a summary with counts of copied blobs, rewritten/removed files and bytes copied without recompressing."""
+	callbacks = {_normalize(path): callback for path, callback in callbacks.items()}
+
+	# the source is closed before the destination replaces it, so `destination_path` can be `source_path`
+	with replacing(destination_path) as destination, open(source_path, 'rb') as source:
+		brz = BRZ()
+		reader = BRZReader(source, brz)
+		reader.read_header()
+		reader.read_index()
+		index = brz.index
+		paths = index.file_paths()
+
+		missing = set(callbacks) - set(paths)
+		if len(missing) > 0:
+			raise FileNotFoundError(f'no such file(s) in "{source_path}": {", ".join(sorted(missing))}')
+
+		# run the callbacks first; this is the only place blobs get decompressed
+		writer = BRZWriter(destination, compression_level = compression_level, method = method)
+		new_data = {} # file id -> new contents, or None if removed
+		for file_id, path in enumerate(paths):
+			if path in callbacks:
+				blob_id = index.files[file_id][2]
+				new_data[file_id] = callbacks[path](reader.read_blob_at(blob_id))
+
+		# untouched blobs keep their original order, so copying them reads the source front to back
+		kept = sorted({index.files[file_id][2] for file_id in range(len(paths)) if file_id not in new_data})
+		entries = []
+		blob_map = {} # source blob id -> destination blob id
+		blob_by_hash = {}
+		for blob_id in kept:
+			blob_map[blob_id] = len(entries)
+			blob_by_hash[index.blob_hashes[blob_id]] = len(entries)
+			entries.append(BRZBlobEntry(
+				index.compression_methods[blob_id],
+				index.decompressed_lengths[blob_id],
+				index.compressed_lengths[blob_id],
+				index.blob_hashes[blob_id],
+				_copier(source, index.blob_offsets[blob_id], index.compressed_lengths[blob_id]),
+			))
+
+		files = []
+		removed = 0
+		for file_id, (name, parent, blob_id) in enumerate(index.files):
+			if file_id not in new_data:
+				files.append((name, parent, blob_map[blob_id]))
+				continue
+			data = new_data[file_id]
+			if data is None:
+				removed += 1
+				continue
+			entry = writer.make_blob(bytes(data))
+			if entry.hash not in blob_by_hash: # identical contents share a blob, same as BRZ.save
+				blob_by_hash[entry.hash] = len(entries)
+				entries.append(entry)
+			files.append((name, parent, blob_by_hash[entry.hash]))
+
+		writer.write_entries(index.folders, files, entries)
+
+	return {
+		'copied_blobs': len(kept),
+		'copied_bytes': sum(index.compressed_lengths[blob_id] for blob_id in kept),
+		'rewritten_files': len(new_data) - removed,
+		'removed_files': removed,
+	}
+
+def _copier(source, offset, length):
+	def read_compressed():
+		source.seek(offset, SEEK_SET)
+		data = source.read(length)
+		if len(data) != length:
+			raise EOFError(f'source archive ended early while copying {length} bytes at {offset}')
+		return data
+	return read_compressed
+
+class ArchiveSource:
+	"""A .brz opened for reading one file at a time. Only the header and index are read up front.
+	Keep it open until anything copied from it with `ArchiveBuilder.copy` has been written."""
+	def __init__(self, path: str):
+		self.path = path
+		self.file = open(path, 'rb')
+		self.brz = BRZ()
+		self._reader = BRZReader(self.file, self.brz)
+		try:
+			self._reader.read_header()
+			self._reader.read_index()
+		except BaseException:
+			self.file.close()
+			raise
+		self.paths = self.brz.index.file_paths()
+		self._blob_ids = {path: blob_id for path, (_, _, blob_id) in zip(self.paths, self.brz.index.files)}
+		self._schemas = {} # schema path -> MPS
+
+	def close(self):
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *_):
+		self.close()
+
+	def exists(self, path: str) -> bool:
+		return _normalize(path) in self._blob_ids
+
+	def files_in(self, folder: str) -> list[str]:
+		"""Paths of every file anywhere under `folder`, in index order"""
+		prefix = _normalize(folder) + '/'
+		return [path for path in self.paths if path.startswith(prefix)]
+
+	def read(self, path: str) -> bytes:
+		"""Decompresses and returns the file at `path`"""
+		return self._reader.read_blob_at(self._blob_id(path))
+
+	def hash(self, path: str) -> bytes:
+		"""blake3 hash of the file at `path`, from the index"""
+		return self.brz.index.blob_hashes[self._blob_id(path)]
+
+	def entry(self, path: str) -> BRZBlobEntry:
+		"""The file's blob exactly as stored, for copying into another archive without recompressing"""
+		blob_id = self._blob_id(path)
+		index = self.brz.index
+		return BRZBlobEntry(
+			index.compression_methods[blob_id],
+			index.decompressed_lengths[blob_id],
+			index.compressed_lengths[blob_id],
+			index.blob_hashes[blob_id],
+			_copier(self.file, index.blob_offsets[blob_id], index.compressed_lengths[blob_id]),
+		)
+
+	def schema_path_for(self, path: str) -> str:
+		"""Same as `BRZ.schema_path_for`, using this archive's index"""
+		for candidate in BRZ.schema_candidates(path):
+			if candidate in self._blob_ids:
+				return candidate
+		raise FileNotFoundError(f'could not find a .schema for "{path}" in "{self.path}"')
+
+	def mps(self, schema_path: str):
+		"""An MPS with the .schema at `schema_path` imported, made once per schema"""
+		mps = self._schemas.get(schema_path)
+		if mps is None:
+			from msgpackschema import MPS
+			mps = self._schemas[schema_path] = MPS()
+			mps.import_schema(self.read(schema_path))
+		return mps
+
+	def unpack_mps(self, path: str, trailing: bool = False):
+		"""Decodes the .mps at `path` with its schema (see `schema_path_for`), using the right root struct for known schemas.
+		With `trailing`, returns (tree, whatever bytes come after the root struct), like the per-component data in component chunks."""
+		schema_path = self.schema_path_for(path)
+		data = self.read(path)
+		stream = BytesIO(data)
+		tree = self.mps(schema_path).unpack(stream, ROOT_STRUCTS.get(schema_path))
+		if trailing:
+			return tree, data[stream.tell():]
+		return tree
+
+	def _blob_id(self, path):
+		blob_id = self._blob_ids.get(_normalize(path))
+		if blob_id is None:
+			raise FileNotFoundError(f'no file "{path}" in "{self.path}"')
+		return blob_id
+
+class ArchiveBuilder:
+	"""Collects the files of a new .brz, compressing each one as it's added, and writes them all with `write`.
+	Only compressed data is held until then. Files with identical contents share a blob."""
+	def __init__(self, compression_level: int = 3, method: ECompressionMethod = None):
+		self._writer = BRZWriter(None, compression_level = compression_level, method = method)
+		self._files: dict[str, int] = {} # path -> blob id
+		self._entries: list[BRZBlobEntry] = []
+		self._blob_by_hash: dict[bytes, int] = {}
+
+	def __contains__(self, path: str) -> bool:
+		return _normalize(path) in self._files
+
+	def __len__(self):
+		return len(self._files)
+
+	def add(self, path: str, data: bytes):
+		"""Adds (or replaces) the file at `path`"""
+		self.add_entry(path, self._writer.make_blob(bytes(data)))
+
+	def copy(self, source: ArchiveSource, path: str, new_path: str = None):
+		"""Adds a file from `source` as-is, without decompressing it. It's stored at `new_path` if given."""
+		self.add_entry(new_path if new_path is not None else path, source.entry(path))
+
+	def add_entry(self, path: str, entry: BRZBlobEntry):
+		"""Adds (or replaces) the file at `path` with a blob that's already compressed, like one made by `BRZWriter.make_blob` in another process"""
+		blob_id = self._blob_by_hash.get(entry.hash)
+		if blob_id is None:
+			blob_id = self._blob_by_hash[entry.hash] = len(self._entries)
+			self._entries.append(entry)
+		self._files[_normalize(path)] = blob_id
+
+	def write(self, destination_path: str):
+		"""Writes the archive to `destination_path` through a temp file (see `replacing`)"""
+		with replacing(destination_path) as f:
+			self.write_file(f)
+
+	def write_file(self, f):
+		"""Writes the archive to a binary file opened for writing"""
+		folders = []
+		folder_ids = {(): -1}
+		files = []
+		for path, blob_id in self._files.items():
+			parts = tuple(path.strip('/').split('/'))
+			for depth in range(1, len(parts)):
+				if parts[0:depth] not in folder_ids:
+					folder_ids[parts[0:depth]] = len(folders)
+					folders.append((parts[depth - 1], folder_ids[parts[0:depth - 1]]))
+			files.append((parts[-1], folder_ids[parts[0:-1]], blob_id))
+
+		self._writer.file = f
+		self._writer.write_entries(folders, files, self._entries)
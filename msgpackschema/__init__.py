@@ -1,10 +1,11 @@
-import msgpack
-import logging
 from .errors import *
-from .msgpack_lite import MPLReader, TAG_PY_TYPES
-from struct import unpack, calcsize
+from .msgpack_lite import MPLReader, MPLWriter, TAG_PY_TYPES, reader_for
+from .stats import Stats
+from struct import unpack, pack, calcsize, iter_unpack
 from enum import IntEnum
-from pprint import pp
+from time import perf_counter
+
+_DEBUG = 10 # logging.DEBUG, without importing logging
 
 """TODO maybe
 Possibly rewrite this module to be closer towards the Rust brdb library. the idea of read_f64 being able to read any compatible Tag is pretty neat.
@@ -35,6 +36,7 @@ VALID_TYPES = {
 # bricj functionality
 VALID_TYPES['wire_graph_variant'] = VALID_TYPES['f64'] # can be a f64, int, bool, an "object", or exec
 VALID_TYPES['wire_graph_prim_math_variant'] = VALID_TYPES['f64'] # can be a f64 or int
+VARIANT_TYPES = ('wire_graph_variant', 'wire_graph_prim_math_variant') # how the variant's value follows its type isn't figured out yet, so these can't be packed or unpacked
 
 class WireVariantType(IntEnum):
 	NUMBER = 0
@@ -50,6 +52,22 @@ class WireVariant:
 
 VALID_ENUM_TYPES = (bool, int)
 
+# range of values each integer builtin can be packed as
+INT_RANGES = {
+	'u8': (0, 0xff),
+	'u16': (0, 0xffff),
+	'u32': (0, 0xffffffff),
+	'u64': (0, 0xffffffffffffffff),
+
+	'i8': (-0x80, 0x7f),
+	'i16': (-0x8000, 0x7fff),
+	'i32': (-0x80000000, 0x7fffffff),
+	'i64': (-0x8000000000000000, 0x7fffffffffffffff),
+
+	'object': (-0x80000000, 0x7fffffff),
+	'class': (-0x80000000, 0x7fffffff),
+}
+
 class PropertyType:
 	def validate_mp_type(self, mp_type: str):
 		"""After reading a Tag from msgpack, checks if the type of the tag fits the built-in type.
@@ -118,14 +136,22 @@ class MPS:
 
 	def __init__(self):
 		self._enums = {}
+		self._enum_names = {} # enum name -> {value: name}, for decoding
+		self._enum_value_types = {} # enum name -> type of its values
 		self._structs: PropertyType = {}
+		self._stats = None
+		self._raw_flat = False
+		self._fingerprints = {} # type name -> layout fingerprint, see migrate.py. registered types never change, so this is never invalidated
+		self._packable = set() # struct names already checked by _check_packable
+		import logging # imported here rather than at the top, so importing the package stays cheap
 		self.logger = logging.getLogger('MPS')
 	
 	def import_schema(self, schema_data: bytes):
 		"""Imports the contents of a .schema file (`schema_data` as bytes) and adds the Enums and Structs to this object's registry."""
 		
+		import msgpack
 		dumped = msgpack.unpackb(schema_data)
-		pp(dumped)
+		self.logger.debug(f'imported schema: {dumped}')
 		assert type(dumped) is list, f'Schema must have an array/list as the root'
 		assert len(dumped) == 2, f'Schema root map must have 2 children (enums and structs), but has {len(dumped)} instead.'
 		assert type(dumped[0]) is dict, f'Schema enums section must be a map/dict, but it\'s {type(dumped[0])} instead.'
@@ -143,34 +169,34 @@ class MPS:
 			struct_contents = structs[struct_name]
 			self._register_struct(struct_name, struct_contents)
 	
-	def unpack(self, file_like, root_struct_name: str = None):
+	def unpack(self, file_like, root_struct_name: str = None, stats: Stats = None, raw_flat: bool = False):
 		"""Parses a .mps file in the `file_like` object that supports .read(n) where n is number of bytes.
 
 		`root_struct_name` is the name of the registered Struct to treat as the "root" of the .mps file. If omitted, this will default to the most recently registered occurrence of a Struct with name ending in "SoA" (structure of arrays)
+		`stats` is an optional `Stats` that gets the time and bytes taken as the 'mps_unpack' stage, plus a 'struct:<name>' counter for every struct decoded.
+		With `raw_flat`, flat arrays are returned as the bytes the file stores (the same layout `pack` accepts) instead of lists, for reading them as columns.
 		"""
-
-		if root_struct_name is not None:
-			assert root_struct_name in self._structs, f'root struct \'{root_struct_name}\' not registered'
-			root_struct = self._structs[root_struct_names]
-		else:
-			keys = list(self._structs.keys())
-			keys.reverse()
-			root_struct = None
-			for struct_name in keys:
-				if struct_name.endswith('SoA'):
-					root_struct = self._structs[struct_name]
-					break
-			assert root_struct is not None, f'could not find a root struct registered with a name ending in \'SoA\''
-		self.logger.debug(f'begin unpacking with root struct \'{root_struct_name}\'')
-		self._reader = MPLReader(file_like)
-		self._file_like = file_like
+		if stats is not None:
+			start = perf_counter()
+			start_position = file_like.tell()
+		self._stats = stats
+		self._raw_flat = raw_flat
+
+		root_struct_name = self._get_root_struct_name(root_struct_name)
+		root_struct = self._structs[root_struct_name]
+		if stats is not None:
+			stats.count('struct:' + root_struct_name)
+		self._debug = self.logger.isEnabledFor(_DEBUG) # building debug messages for every value is slow, so only do it when they'd be shown
+		if self._debug:
+			self.logger.debug(f'begin unpacking with root struct \'{root_struct_name}\'')
+		self._reader = reader_for(file_like)
 		reader = self._reader
 		
 		self._queue = [] # (container, container_child_key: any = None, property_type: PropertyType, is_key: bool, is_value: bool)
 		self._cached_key = None # cached key str, for Values being interpreted as keyvalue pairs
 		queue = self._queue
 		"""
-			The queue is a list of struct properties or array/maps to read next.
+			The queue is a stack of struct properties or array/maps to read next: the last item is read first, so children are pushed in reverse.
 			`container` is the pointer to a list or dict for where to store the resulting data after unpacking it
 			`container_child_key` is the index of WHERE in the container to put the data. if None, treats container like a list and just appends.
 			`property_type` is the PropertyType of the value to expect to read
@@ -186,68 +212,189 @@ class MPS:
 		# 	property_type = root_struct[property_name]
 		# 	queue.append((tree, property_name, property_type))
 
-		self._enqueue_struct(tree, root_struct)
+		try:
+			self._enqueue_struct(tree, root_struct)
 
-		while len(queue) > 0:
-			container, container_child_key, property_type, is_key, is_value = queue.pop(0)
-			pointer = hex(file_like.tell())
-			match property_type:
-				case Value():
-					self._unpack_value(container, container_child_key, property_type, is_key, is_value)
+			while len(queue) > 0:
+				container, container_child_key, property_type, is_key, is_value = queue.pop()
+				match property_type:
+					case Value():
+						self._unpack_value(container, container_child_key, property_type, is_key, is_value)
 
-				case Array():
-					self._unpack_array(container, container_child_key, property_type)
+					case Array():
+						self._unpack_array(container, container_child_key, property_type)
 
-				case Map():
-					self._unpack_map(container, container_child_key, property_type)
+					case Map():
+						self._unpack_map(container, container_child_key, property_type)
 
-				case _:
-					raise ValueError(f'unknown queued property type \'{property_type}\'')
+					case _:
+						raise ValueError(f'unknown queued property type \'{property_type}\'')
+		finally:
+			reader.finish() # also on errors, so a BytesIO isn't left with its buffer exported
+		if stats is not None:
+			stats.record('mps_unpack', perf_counter() - start, file_like.tell() - start_position)
 		return tree
 
 	
-	def pack(self, file_like, root_struct=None):
+	def pack(self, file_like, tree: dict, root_struct_name: str = None):
 		"""Outputs a .mps file to the `file_like` object that supports .write(x: bytes) method.
-		`root_struct` is the name of the registered Struct to treat as the "root" of the .mps file. If omitted, this will default to the most recently registered occurrence of a Struct with name ending in "SoA" (structure of arrays)
+		`tree` is laid out the same way `unpack` returns it: structs are dicts, arrays are lists, enums are their names (or raw values), flat arrays of enums are raw values.
+		Flat arrays can also be given as bytes already packed like the file stores them (little-endian, structs laid out inline), which skips building a dict per item.
+		`root_struct_name` is the name of the registered Struct to treat as the "root" of the .mps file. If omitted, this will default to the most recently registered occurrence of a Struct with name ending in "SoA" (structure of arrays)
+		Raises `MsgpackSchemaError` before writing anything if the root struct can hold a wire graph variant, which can't be packed yet.
 		"""
-		raise NotImplemented
+		root_struct_name = self._get_root_struct_name(root_struct_name)
+		self._check_packable(root_struct_name)
+		writer = MPLWriter(file_like)
+		self._pack_struct(writer, root_struct_name, tree)
+
+	def fingerprint(self, type_name: str) -> bytes:
+		"""Returns a hash of the on-disk layout of a registered type. Types with the same fingerprint decode the same way, whatever they're named or whichever schema they came from."""
+		from .migrate import fingerprint
+		return fingerprint(self, type_name)
+
+	def migrate(self, tree: dict, target: 'MPS', root_struct_name: str = None, target_root_struct_name: str = None) -> dict:
+		"""Projects `tree`, which was unpacked with this schema, onto the layout of the `target` schema (e.g. the one a newer game version saves with), so it can be packed with `target`.
+		Missing properties get defaults and removed ones are dropped; see migrate.py for the rules. Raises `MigrationError` if a property changed in a way that can't be converted."""
+		from .migrate import migrate
+		return migrate(self, target, tree, root_struct_name, target_root_struct_name)
 
 	# ----------
-	# Unpack helpers
+	# Pack helpers
 	# ----------
 
-	def _enqueue_struct(self, container, struct):
-		self.logger.debug(f'_enqueue_struct:')
-		queue_next_index = 0
+	def _check_packable(self, struct_name: str, _path: str = None):
+		"""Raises MsgpackSchemaError if a wire graph variant can be reached from the struct, so pack fails up front instead of halfway through a file"""
+		if struct_name in self._packable:
+			return
+		for property_name, property_type in self._structs[struct_name].items():
+			path = f'{_path or struct_name}.{property_name}'
+			type_names = (property_type.key_type, property_type.value_type) if type(property_type) is Map else (property_type.type,)
+			for type_name in type_names:
+				if type_name in VARIANT_TYPES:
+					raise MsgpackSchemaError(f'{path} is a \'{type_name}\', which can\'t be packed yet')
+				if type_name in self._structs and type_name != struct_name:
+					self._check_packable(type_name, path)
+		self._packable.add(struct_name)
+
+	def _pack_struct(self, writer, struct_name, value):
+		struct = self._structs[struct_name]
+		assert type(value) is dict, f'expected a dict for struct \'{struct_name}\', got \'{type(value)}\''
 		for property_name in struct:
+			assert property_name in value, f'struct {struct_name}.{property_name} is missing from the tree'
 			property_type = struct[property_name]
-			self.logger.debug(f'> added \'{property_name}\': {property_type}')
-			self._queue.insert(queue_next_index, (container, property_name, property_type, False, False))
-			queue_next_index += 1
+			property_value = value[property_name]
+			match property_type:
+				case Value():
+					self._pack_value(writer, property_type.type, property_value)
+				case Array():
+					self._pack_array(writer, property_type, property_value)
+				case Map():
+					assert type(property_value) is dict, f'expected a dict for {struct_name}.{property_name}, got \'{type(property_value)}\''
+					writer.write_map_header(len(property_value))
+					for key, item in property_value.items():
+						self._pack_value(writer, property_type.key_type, key)
+						self._pack_value(writer, property_type.value_type, item)
+				case _:
+					raise ValueError(f'unknown property type \'{property_type}\'')
+
+	def _pack_value(self, writer, value_type, value):
+		match self._get_domain_of_type(value_type):
+			case 'builtin':
+				if value_type == 'bool':
+					writer.write_bool(bool(value))
+				elif value_type in INT_RANGES:
+					assert type(value) is int, f'expected an int for \'{value_type}\', got \'{type(value)}\''
+					low, high = INT_RANGES[value_type]
+					assert low <= value <= high, f'{value} does not fit in \'{value_type}\''
+					writer.write_int(value)
+				elif value_type == 'f32':
+					writer.write_float32(value)
+				elif value_type == 'f64':
+					writer.write_float64(value)
+				elif value_type == 'str':
+					assert type(value) is str, f'expected a str, got \'{type(value)}\''
+					writer.write_str(value)
+				else:
+					# wire graph variants, which _check_packable already rejected
+					raise MsgpackSchemaError(f'packing \'{value_type}\' is not supported')
+
+			case 'enum':
+				enum = self._enums[value_type]
+				raw = enum[value] if value in enum else value
+				assert raw in enum.values(), f'\'{value}\' is not a name or value of enum \'{value_type}\''
+				if type(raw) is bool:
+					writer.write_bool(raw)
+				else:
+					writer.write_int(raw)
+
+			case 'struct':
+				self._pack_struct(writer, value_type, value)
+
+			case _:
+				raise ValueError(f'unknown type \'{value_type}\'')
+
+	def _pack_array(self, writer, property_type: Array, values: list):
+		item_type = property_type.type
+		if property_type.is_flat and isinstance(values, (bytes, bytearray, memoryview)):
+			# already laid out, like numpy's tobytes() of a little-endian array
+			stride = calcsize(self._get_flat_fmt(item_type))
+			assert len(values) % stride == 0, f'{len(values)} bytes for {property_type} is not a whole number of {stride} byte items'
+			writer.write_bin(bytes(values))
+			return
+		assert type(values) is list, f'expected a list for {property_type}, got \'{type(values)}\''
+		if property_type.is_flat:
+			fmt = self._get_flat_fmt(item_type)
+			if self._get_domain_of_type(item_type) == 'struct':
+				data = b''.join(pack(fmt, *self._flat_values_from_struct(item_type, item)) for item in values)
+			else:
+				# one call for the whole array; fmt is '<X' so this becomes '<' + count + 'X'
+				data = pack(f'<{len(values)}{fmt[1:]}', *values)
+			writer.write_bin(data)
+			return
+
+		writer.write_array_header(len(values))
+		if item_type in INT_RANGES and len(values) > 0:
+			# checked once for the whole array instead of per item; big index columns are most of a brick chunk
+			low, high = INT_RANGES[item_type]
+			assert all(type(item) is int for item in values), f'expected ints for {property_type}'
+			assert low <= min(values) and max(values) <= high, f'values of {property_type} do not fit in \'{item_type}\''
+			writer.write_ints(values)
+			return
+		for item in values:
+			self._pack_value(writer, item_type, item)
+
+	# ----------
+	# Unpack helpers
+	# ----------
+
+	def _enqueue_struct(self, container, struct):
+		if self._debug:
+			self.logger.debug(f'_enqueue_struct: {list(struct)}')
+		self._queue.extend([(container, property_name, property_type, False, False) for property_name, property_type in reversed(struct.items())])
 
 	def _unpack_value(self, container, container_child_key, property_type, is_key, is_value):
-		pointer = hex(self._file_like.tell())
 		reader = self._reader
-		queue = self._queue
+		pointer = reader.tell() # shown as hex in errors
+		debug = self._debug
 
-		if is_key:
-			self.logger.debug('> is key')
 		if is_value:
 			container_child_key = self._cached_key
-			self.logger.debug(f'> is value, for cached key \'{container_child_key}\'')
 			assert container_child_key is not None, f'reading a Value with is_value=True, but no key was ever read beforehand!'
 
-		self.logger.debug(f'_unpack_value with type {property_type} -> {container_child_key}')
-		self.logger.debug(f'ptr: {pointer}')
 		value_type = property_type.type
 		domain = self._get_domain_of_type(value_type)
-		self.logger.debug(f'> domain: {domain}')
+		if debug:
+			self.logger.debug(f'_unpack_value with type {property_type} -> {container_child_key} (is_key={is_key}, is_value={is_value})')
+			self.logger.debug(f'ptr: {hex(pointer)}')
+			self.logger.debug(f'> domain: {domain}')
 		match domain:
 			case 'builtin':
 				"""tree[member_name] = 1"""
 				result_type, values = reader.read_next()
-				self.logger.debug(f'> read {result_type} with values: {values})')
-				assert result_type in VALID_TYPES[value_type], f'expected to read a compatible \'{value_type}\' Tag at {pointer}, but got Tag type \'{result_type}\' instead'
+				if debug:
+					self.logger.debug(f'> read {result_type} with values: {values})')
+				assert result_type in VALID_TYPES[value_type], f'expected to read a compatible \'{value_type}\' Tag at {hex(pointer)}, but got Tag type \'{result_type}\' instead'
 				# not an array
 
 				result_value = values[0]
@@ -257,10 +404,10 @@ class MPS:
 						variant_type = WireVariantType(result_value)
 					except ValueError:
 						raise ValueError(f'unknown wire graph variant type {result_value}')
-					raise NotImplemented
+					raise MsgpackSchemaError(f'unpacking a \'{value_type}\' ({variant_type.name}) is not supported yet')
 				elif value_type == 'str':
 					# result value is len of string
-					result_bytes = self._file_like.read(result_value)
+					result_bytes = reader.read(result_value)
 					assert (result_bytes is not None) and (len(result_bytes) == result_value), f'unexpected EOF while reading a string of {result_value} bytes'
 					result_value = result_bytes.decode('utf-8')
 
@@ -274,21 +421,22 @@ class MPS:
 			case 'enum':
 				"""tree[member_name] = 'Enum.MY_ENUM_VALUE'"""
 				result_type, values = reader.read_next()
-				self.logger.debug(f'> read {result_type} with values: {values})')
 				enum = self._enums[value_type]
-				enum_first_key = next(iter(enum))
-				enum_first_value = enum[enum_first_key]
+				enum_value_type = self._enum_value_types[value_type]
 				result_py_type = TAG_PY_TYPES[result_type]
-				self.logger.debug(f'> enum_first_value type: {type(enum_first_value)}')
-				self.logger.debug(f'> result_py_type: {result_py_type}')
+				if debug:
+					self.logger.debug(f'> read {result_type} with values: {values})')
+					self.logger.debug(f'> enum value type: {enum_value_type}')
+					self.logger.debug(f'> result_py_type: {result_py_type}')
 				
-				assert type(enum_first_value) is result_py_type, f'expected to read a \'{type(enum_first_value)}\' for enum \'{value_type}\' at {pointer}, got a \'{result_py_type}\' instead (via Tag \'{result_type}\''
+				assert enum_value_type is result_py_type, f'expected to read a \'{enum_value_type}\' for enum \'{value_type}\' at {hex(pointer)}, got a \'{result_py_type}\' instead (via Tag \'{result_type}\''
 
 				# should i just be saving the raw value in the result tree instead? or is it fine to just resolve the name of the enum as a str?
 				# TODO may need to import as raw values, depending on whether enums are used as bitflags
-				enumeration_name = self._lookup_enum(enum, values[0])
-				self.logger.debug(f'> resolved enum name \'{enumeration_name}\')')
-				assert enumeration_name is not None, f'could not find associated enum in {value_type} for value {values[0]} at {pointer}. If it is supposed to be a flag of different enum values, I unfortunately haven\'t implemented that yet.'
+				enumeration_name = self._enum_names[value_type].get(values[0])
+				if debug:
+					self.logger.debug(f'> resolved enum name \'{enumeration_name}\')')
+				assert enumeration_name is not None, f'could not find associated enum in {value_type} for value {values[0]} at {hex(pointer)}. If it is supposed to be a flag of different enum values, I unfortunately haven\'t implemented that yet.'
 				if is_key:
 					self._cached_key = enumeration_name 
 				elif container_child_key is None:
@@ -308,27 +456,28 @@ class MPS:
 					container.append(child)
 				else:
 					container[container_child_key] = child
-				self.logger.debug(f'> enqueuing struct {value_type}')
+				if self._stats is not None:
+					self._stats.count('struct:' + value_type)
 				self._enqueue_struct(child, struct)
 	
 	def _unpack_array(self, container, container_child_key, property_type):
-		pointer = hex(self._file_like.tell())
 		reader = self._reader
+		pointer = reader.tell()
 		queue = self._queue
 
 		value_type = property_type.type
 		is_flat = property_type.is_flat
-		self.logger.debug(f'_unpack_array with type {property_type} -> {container_child_key}')
-		self.logger.debug(f'ptr: {pointer}')
-		self.logger.debug(f'> is_flat={is_flat}')
+		if self._debug:
+			self.logger.debug(f'_unpack_array with type {property_type} -> {container_child_key}')
+			self.logger.debug(f'ptr: {hex(pointer)}')
+			self.logger.debug(f'> is_flat={is_flat}')
 		if is_flat:
 			self._unpack_flat_array(container, container_child_key, property_type)
 			return
 		
 		# read size first
 		array_tag_type, array_tag_values = reader.read_next()
-		self.logger.debug(f'> array header Tag type {array_tag_type} with values {array_tag_values}')
-		assert TAG_PY_TYPES[array_tag_type] == list, f'expected to read a list at {pointer}, but got \'{TAG_PY_TYPES[array_tag_type]}\' instead (via Tag \'{array_tag_type}\')'
+		assert TAG_PY_TYPES[array_tag_type] == list, f'expected to read a list at {hex(pointer)}, but got \'{TAG_PY_TYPES[array_tag_type]}\' instead (via Tag \'{array_tag_type}\')'
 		array_count = array_tag_values[0]
 
 		child = []
@@ -339,58 +488,50 @@ class MPS:
 		
 		# value reading is already implemented, so just add those as tags to read next
 		array_item_type = Value(value_type)
-		self.logger.debug(f'> enqueuing {array_count} list items')
-		for i in range(array_count):
-			queue.insert(i, (child, None, array_item_type, False, False))
+		if self._debug:
+			self.logger.debug(f'> enqueuing {array_count} list items')
+		queue.extend([(child, None, array_item_type, False, False)] * array_count)
 
 	def _unpack_flat_array(self, container, container_child_key, property_type: Array):
-		pointer = hex(self._file_like.tell())
 		reader = self._reader
+		pointer = reader.tell()
 		
 		item_type = property_type.type
-		
-		self.logger.debug(f'_unpack_flat_array with type {item_type}')
-		self.logger.debug(f'ptr: {pointer}')
 		fmt = self._get_flat_fmt(item_type)
-		self.logger.debug(f'> fmt string: \'{fmt}\'')
 
 		bin_type, bin_values = reader.read_next()
-		self.logger.debug(f'> flat array header Tag type {bin_type} with values {bin_values}')
-		assert TAG_PY_TYPES[bin_type] == bytes, f'expected to read bytes at {pointer}, but got \'{TAG_PY_TYPES[bin_type]}\' instead (via Tag \'{bin_type}\')'
+		if self._debug:
+			self.logger.debug(f'_unpack_flat_array with type {item_type}')
+			self.logger.debug(f'ptr: {hex(pointer)}')
+			self.logger.debug(f'> fmt string: \'{fmt}\'')
+			self.logger.debug(f'> flat array header Tag type {bin_type} with values {bin_values}')
+		assert TAG_PY_TYPES[bin_type] == bytes, f'expected to read bytes at {hex(pointer)}, but got \'{TAG_PY_TYPES[bin_type]}\' instead (via Tag \'{bin_type}\')'
 
 		bin_size = bin_values[0]
 		
 		stride = calcsize(fmt)
-		self.logger.debug(f'> bin_size: {bin_size}')
-		self.logger.debug(f'> stride:   {stride}')
-		assert bin_size % stride == 0, f'byte array at {pointer} has size of {bin_size} bytes and underlying type \'{item_type}\' with stride of {stride}, but size is not evenly divided by stride to get an integer number of elements (got {bin_size/stride} instead)'
+		assert bin_size % stride == 0, f'byte array at {hex(pointer)} has size of {bin_size} bytes and underlying type \'{item_type}\' with stride of {stride}, but size is not evenly divided by stride to get an integer number of elements (got {bin_size/stride} instead)'
 
 		count = bin_size // stride
-		self.logger.debug(f'> reading {count} flat array items')
-
-		the_array = []
-		for _ in range(count):
-			raw = self._file_like.read(stride)
-			assert raw is not None and len(raw) == stride, f'unexpected EOF while reading flat array element {_}'
-			data = unpack(fmt, raw)
-			self.logger.debug(f'> > {_}: data is {data}')
-			match self._get_domain_of_type(item_type):
-				case 'builtin':
-					self.logger.debug(f'> > {_}: builtin; appending {data[0]}')
-					the_array.append(data[0])
-
-				case 'enum':
-					self.logger.debug(f'> > {_}: enum; appending {data[0]}')
-					the_array.append(data[0])
-
-				case 'struct':
-					self.logger.debug(f'> > {_}: struct; getting list of keys')
-					struct = self._structs[item_type]
-					struct_keys = list(struct.keys())
-					keys_values = zip(struct_keys, data, strict=True)
-					child = {key: value for key, value in keys_values}
-
-					the_array.append(child)
+		if self._debug:
+			self.logger.debug(f'> reading {count} flat array items ({bin_size} bytes, stride {stride})')
+		domain = self._get_domain_of_type(item_type)
+		if self._stats is not None and domain == 'struct':
+			self._stats.count('struct:' + item_type, count)
+
+		raw = reader.read(bin_size)
+		assert len(raw) == bin_size, f'unexpected EOF while reading a flat array of {count} items'
+		if self._raw_flat:
+			the_array = raw
+		elif domain == 'struct':
+			the_array = []
+			for data in iter_unpack(fmt, raw):
+				child, used = self._flat_struct_from_values(item_type, data, 0)
+				assert used == len(data), f'flat struct \'{item_type}\' used {used} of {len(data)} values'
+				the_array.append(child)
+		else:
+			# builtins and enums (as raw values) are one value per item
+			the_array = [data[0] for data in iter_unpack(fmt, raw)]
 		if container_child_key is None:
 			container.append(the_array)
 		else:
@@ -398,18 +539,19 @@ class MPS:
 		
 	
 	def _unpack_map(self, container, container_child_key, property_type):
-		pointer = hex(self._file_like.tell())
 		reader = self._reader
+		pointer = reader.tell()
 		queue = self._queue
 
 		key_type = property_type.key_type
 		value_type = property_type.value_type
-		self.logger.debug(f'_unpack_map with key: {key_type} and value: {value_type} -> {container_child_key}')
-		self.logger.debug(f'ptr: {pointer}')
 
 		map_tag_type, map_tag_values = reader.read_next()
-		self.logger.debug(f'> map header Tag type {map_tag_type} with values {map_tag_values}')
-		assert TAG_PY_TYPES[map_tag_type] == dict, f'expected to read a dict at {pointer}, but got \'{TAG_PY_TYPES[map_tag_type]}\' instead (via Tag \'{map_tag_type}\')'
+		if self._debug:
+			self.logger.debug(f'_unpack_map with key: {key_type} and value: {value_type} -> {container_child_key}')
+			self.logger.debug(f'ptr: {hex(pointer)}')
+			self.logger.debug(f'> map header Tag type {map_tag_type} with values {map_tag_values}')
+		assert TAG_PY_TYPES[map_tag_type] == dict, f'expected to read a dict at {hex(pointer)}, but got \'{TAG_PY_TYPES[map_tag_type]}\' instead (via Tag \'{map_tag_type}\')'
 
 		dict_count = map_tag_values[0]
 
@@ -421,10 +563,11 @@ class MPS:
 
 		dict_key_type = Value(key_type)
 		dict_value_type = Value(value_type)
-		self.logger.debug(f'> enqueuing {dict_count} dict items')
-		for i in range(dict_count):
-			queue.insert(i*2, (None, None, dict_key_type, True, False)) # treat the Value as a dict key, save for later
-			queue.insert(i*2 + 1, (child, None, dict_value_type, False, True)) # treav Value as a dict value, use saved key
+		# the stack is read from the end, so each value goes in before its key
+		queue.extend([
+			(child, None, dict_value_type, False, True), # treat Value as a dict value, use saved key
+			(None, None, dict_key_type, True, False), # treat the Value as a dict key, save for later
+		] * dict_count)
 
 	# ----------
 	# Schema operations
@@ -453,14 +596,21 @@ class MPS:
 				raise TypeError(f'enum \'{name}\' is established to have values of type \'{established_type}\' but tried to register value {repr(value)} of type \'{value_type}\'')
 
 		self._enums[name] = values
+		self._enum_names[name] = {value: value_key for value_key, value in values.items()}
+		self._enum_value_types[name] = established_type
 	
-	def _lookup_enum(self, enum: dict, value: any) -> any:
-		"""Looks up a value inside the enum dict and returns the key for the enum"""
-		for key in enum:
-			if enum[key] == value:
-				return key
-		return None
-	
+	def _get_root_struct_name(self, root_struct_name: str = None) -> str:
+		"""Returns `root_struct_name` if it's registered, or the most recently registered Struct name ending in 'SoA' if it's None"""
+		if root_struct_name is not None:
+			assert root_struct_name in self._structs, f'root struct \'{root_struct_name}\' not registered'
+			return root_struct_name
+		keys = list(self._structs.keys())
+		keys.reverse()
+		for struct_name in keys:
+			if struct_name.endswith('SoA'):
+				return struct_name
+		raise AssertionError(f'could not find a root struct registered with a name ending in \'SoA\'')
+
 	def _check_type(self, typename: str):
 		return typename in self._enums or \
 			typename in self._structs or \
@@ -520,19 +670,42 @@ class MPS:
 				return 'Q' if _shallow else '<Q' # u64
 
 			case 'struct':
-				assert not _shallow, f'reading a nested struct inside flat array is not allowed'
+				# structs inside flat structs are laid out inline, like a C struct (e.g. BRSavedEntityColors holds 8 BRSavedBrickColors)
 				struct = self._structs[typename]
-				fmt = '<'
+				fmt = ''
 				for property_key in struct:
 					property_value = struct[property_key]
-					assert type(property_value) is Value, f'can only get flat array format for flat structs; found nested {property_value}'
+					assert type(property_value) is Value, f'can only get flat array format for flat structs; found {property_value} in {typename}.{property_key}'
 					fmt += self._get_flat_fmt(property_value.type, True)
-				return fmt
+				return fmt if _shallow else '<' + fmt
 			case _:
 				raise ValueError(f'unknown domain {domain} for {typename}')
 					
 
 
+	def _flat_struct_from_values(self, struct_name: str, values: tuple, position: int) -> tuple[dict, int]:
+		"""Rebuilds a (possibly nested) struct from the values unpacked with its flat format, starting at `position`.
+		Returns the struct and the position after it."""
+		child = {}
+		for property_name, property_type in self._structs[struct_name].items():
+			if property_type.type in self._structs:
+				child[property_name], position = self._flat_struct_from_values(property_type.type, values, position)
+			else:
+				child[property_name] = values[position]
+				position += 1
+		return child, position
+
+	def _flat_values_from_struct(self, struct_name: str, value: dict) -> list:
+		"""Opposite of `_flat_struct_from_values`: lists a struct's values in the order of its flat format"""
+		result = []
+		for property_name, property_type in self._structs[struct_name].items():
+			assert property_name in value, f'struct {struct_name}.{property_name} is missing from the tree'
+			if property_type.type in self._structs:
+				result.extend(self._flat_values_from_struct(property_type.type, value[property_name]))
+			else:
+				result.append(value[property_name])
+		return result
+
 	def _register_struct(self, name: str, contents: dict):
 		if name in self._structs:
 			raise DuplicateError(f'struct \'{name}\' has already been registered')
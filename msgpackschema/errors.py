@@ -4,3 +4,10 @@ class RegistrationError(Exception):
 class DuplicateError(RegistrationError):
 	pass
 
+
+class MigrationError(Exception):
+	pass
+
+
+class MsgpackSchemaError(Exception):
+	pass
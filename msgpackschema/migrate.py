@@ -0,0 +1,185 @@
+"""Moving decoded trees from one version of a schema to another.
+
+Game updates add, remove and retype struct properties, and every archive carries the schema it was saved with.
+Instead of comparing schemas by name, every type gets a layout fingerprint: a hash of what it looks like on disk
+(property names, kinds and types, with nested structs replaced by their own fingerprints, and enums by their values).
+Two structs with the same fingerprint decode to the same tree, so data can be used as-is.
+
+Conversions between two layouts are compiled once into plain functions and cached by fingerprint pair,
+so migrating thousands of archives saved by the same two game versions only compares the schemas once.
+Rules, per target property:
+* missing from the source: filled with a default (0, 0.0, False, '', the enum's first name, empty array/map, or a struct of defaults)
+* same name: converted (ints that fit, ints to floats, enums by name, structs recursively); anything else is a `MigrationError`
+* source properties the target doesn't have are dropped
+"""
+
+from . import MPS, Value, Array, Map, INT_RANGES
+from .errors import MigrationError
+from hashlib import blake2b
+
+_converters = {} # (source fingerprint, target fingerprint, source flat, target flat) -> function, or None for "use as-is"
+
+def fingerprint(mps: MPS, type_name: str) -> bytes:
+	"""Layout fingerprint of a builtin, enum or struct type registered in `mps`. The type's own name isn't part of it."""
+	cached = mps._fingerprints.get(type_name)
+	if cached is not None:
+		return cached
+	match mps._get_domain_of_type(type_name):
+		case 'builtin':
+			layout = repr(('builtin', type_name))
+		case 'enum':
+			layout = repr(('enum', sorted(mps._enums[type_name].items())))
+		case 'struct':
+			properties = []
+			for property_name, property_type in mps._structs[type_name].items():
+				match property_type:
+					case Value():
+						properties.append((property_name, 'value', fingerprint(mps, property_type.type)))
+					case Array():
+						properties.append((property_name, 'flat' if property_type.is_flat else 'array', fingerprint(mps, property_type.type)))
+					case Map():
+						properties.append((property_name, 'map', fingerprint(mps, property_type.key_type), fingerprint(mps, property_type.value_type)))
+			layout = repr(('struct', properties))
+		case _:
+			raise MigrationError(f'unknown type \'{type_name}\'')
+	result = mps._fingerprints[type_name] = blake2b(layout.encode('utf-8'), digest_size=16).digest()
+	return result
+
+def migrate(source: MPS, target: MPS, tree: dict, root_struct_name: str = None, target_root_struct_name: str = None) -> dict:
+	"""Projects `tree`, decoded with `source`, onto the layout of `target`. Parts that didn't change are shared with `tree`, not copied.
+	Root struct names default like in `MPS.unpack`; `target_root_struct_name` defaults to the source's root struct name if `target` has it."""
+	root_struct_name = source._get_root_struct_name(root_struct_name)
+	if target_root_struct_name is None and root_struct_name in target._structs:
+		target_root_struct_name = root_struct_name
+	target_root_struct_name = target._get_root_struct_name(target_root_struct_name)
+	convert = converter(source, target, root_struct_name, target_root_struct_name)
+	return tree if convert is None else convert(tree)
+
+def converter(source: MPS, target: MPS, source_type: str, target_type: str, source_flat: bool = False, target_flat: bool = False):
+	"""Returns a function converting a value of `source_type` (in `source`) to `target_type` (in `target`), or None if values can be used as they are.
+	`source_flat`/`target_flat` say whether values come from flat arrays, where enums are raw values instead of names."""
+	key = (fingerprint(source, source_type), fingerprint(target, target_type), source_flat, target_flat)
+	if key in _converters:
+		return _converters[key]
+
+	source_domain = source._get_domain_of_type(source_type)
+	target_domain = target._get_domain_of_type(target_type)
+	if source_domain != target_domain:
+		raise MigrationError(f'can\'t migrate {source_domain} \'{source_type}\' to {target_domain} \'{target_type}\'')
+	match source_domain:
+		case 'builtin':
+			result = _builtin_converter(source_type, target_type)
+		case 'enum':
+			result = _enum_converter(source._enums[source_type], target._enums[target_type], target_type, source_flat, target_flat)
+		case 'struct':
+			result = _struct_converter(source, target, source_type, target_type, source_flat, target_flat)
+	_converters[key] = result
+	return result
+
+def default_value(mps: MPS, property_type, flat: bool = False):
+	"""The value a property missing from older data gets"""
+	match property_type:
+		case Array():
+			return []
+		case Map():
+			return {}
+	type_name = property_type.type
+	match mps._get_domain_of_type(type_name):
+		case 'builtin':
+			if type_name == 'bool':
+				return False
+			if type_name in ('f32', 'f64'):
+				return 0.0
+			if type_name == 'str':
+				return ''
+			return 0
+		case 'enum':
+			enum = mps._enums[type_name]
+			first = next(iter(enum))
+			return enum[first] if flat else first
+		case 'struct':
+			return {name: default_value(mps, child, flat) for name, child in mps._structs[type_name].items()}
+
+def _builtin_converter(source_type, target_type):
+	if source_type == target_type:
+		return None
+	if source_type in INT_RANGES and target_type in INT_RANGES:
+		source_low, source_high = INT_RANGES[source_type]
+		low, high = INT_RANGES[target_type]
+		if low <= source_low and source_high <= high:
+			return None # every value fits
+		def convert_int(value):
+			if not low <= value <= high:
+				raise MigrationError(f'{value} does not fit in \'{target_type}\'')
+			return value
+		return convert_int
+	if source_type in INT_RANGES and target_type in ('f32', 'f64'):
+		return float
+	if source_type == 'f32' and target_type == 'f64':
+		return None
+	raise MigrationError(f'can\'t migrate \'{source_type}\' to \'{target_type}\'')
+
+def _enum_converter(source_enum, target_enum, target_type, source_flat, target_flat):
+	if source_enum == target_enum and source_flat == target_flat:
+		return None
+	source_names = {value: name for name, value in source_enum.items()}
+	def convert_enum(value):
+		name = source_names.get(value) if source_flat else value
+		if name not in target_enum:
+			raise MigrationError(f'\'{name}\' is not a name of enum \'{target_type}\' in the target schema')
+		return target_enum[name] if target_flat else name
+	return convert_enum
+
+def _property_converter(source, target, source_property, target_property, source_flat, target_flat, where):
+	match source_property, target_property:
+		case Value(), Value():
+			return converter(source, target, source_property.type, target_property.type, source_flat, target_flat)
+		case Array(), Array():
+			convert_item = converter(source, target, source_property.type, target_property.type, source_property.is_flat, target_property.is_flat)
+			if convert_item is None:
+				return None
+			return lambda values: [convert_item(item) for item in values]
+		case Map(), Map():
+			convert_key = converter(source, target, source_property.key_type, target_property.key_type)
+			convert_value = converter(source, target, source_property.value_type, target_property.value_type)
+			if convert_key is None and convert_value is None:
+				return None
+			convert_key = convert_key or (lambda key: key)
+			convert_value = convert_value or (lambda value: value)
+			return lambda values: {convert_key(key): convert_value(value) for key, value in values.items()}
+	raise MigrationError(f'{where} changed from {source_property} to {target_property}')
+
+def _struct_converter(source, target, source_type, target_type, source_flat, target_flat):
+	source_struct = source._structs[source_type]
+	target_struct = target._structs[target_type]
+	steps = [] # (name, convert or None, default or None)
+	unchanged = set(source_struct) == set(target_struct)
+	for name, target_property in target_struct.items():
+		if name not in source_struct:
+			steps.append((name, None, default_value(target, target_property, target_flat)))
+			continue
+		convert = _property_converter(source, target, source_struct[name], target_property, source_flat, target_flat, f'{target_type}.{name}')
+		unchanged = unchanged and convert is None
+		steps.append((name, convert, None))
+	if unchanged:
+		return None
+
+	def convert_struct(value):
+		result = {}
+		for name, convert, default in steps:
+			if default is not None:
+				result[name] = _fresh(default)
+			elif convert is None:
+				result[name] = value[name]
+			else:
+				result[name] = convert(value[name])
+		return result
+	return convert_struct
+
+def _fresh(default):
+	# defaults are shared between calls, so containers are copied
+	if type(default) is dict:
+		return {key: _fresh(value) for key, value in default.items()}
+	if type(default) is list:
+		return []
+	return default
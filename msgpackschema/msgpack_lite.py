@@ -2,8 +2,7 @@
 Only has functionality to read and write the standard control tags (like fixint, fixarray, etc.)
 """
 
-from struct import pack, unpack, calcsize
-from enum import Enum
+from struct import pack, unpack, calcsize, Struct
 
 TAGS = {}
 TAG_PY_TYPES = {}
@@ -14,8 +13,9 @@ But i didn't want to get stunlocked just while trying to figure out "the correct
 """
 
 class Tag:
-	def __init__(self, name: str, underlying_type: type, tag: int, tag_mask: int = 0xFF, fmt: str = ''):
+	def __init__(self, name: str, underlying_type: type, tag: int, tag_mask: int = 0xFF, fmt: str = '', signed: bool = False):
 		self.name = name
+		self.signed = signed # embedded value is the whole byte as an int8 (-fixint)
 		self.underlying_type = underlying_type
 		self.tag = tag
 		self.tag_mask = tag_mask
@@ -31,6 +31,8 @@ class Tag:
 	def get_value(self, byte: int) -> int:
 		"""Extracts the value of a byte, separating it from the tag.
 		Example: for fixstr, the tag mask is the 3 highest bits (of a byte), and the value for the size up to 31 bytes"""
+		if self.signed:
+			return byte - 0x100 if byte & 0x80 else byte
 		value_mask = (~self.tag_mask) & 0xFF
 		if value_mask == 0:
 			return 0
@@ -38,7 +40,7 @@ class Tag:
 		return byte & value_mask
 
 Tag('+fixint', int, 0, 0b10000000)
-Tag('-fixint', int, 0b11100000, 0b11100000)
+Tag('-fixint', int, 0b11100000, 0b11100000, signed=True)
 Tag('fixmap', dict, 0b10000000, 0b11110000)
 Tag('fixarray', list, 0b10010000, 0b11110000)
 Tag('fixstr', str, 0b10100000, 0b11100000)
@@ -101,8 +103,20 @@ class IntegerFamily(FamilyBase):
 	
 
 class MPLReader:
+	"""Reads Tags straight from a stream, one .read() per Tag. Works on anything with .read(n); see `MPLBufferReader` for the fast one."""
 	def __init__(self, file_like):
 		self.file = file_like
+
+	def read(self, size: int) -> bytes:
+		"""Reads raw bytes that come after a Tag (str contents, bin data)"""
+		return self.file.read(size)
+
+	def tell(self) -> int:
+		return self.file.tell()
+
+	def finish(self):
+		"""Called once MPS is done reading. The stream is already where the last Tag ended."""
+		pass
 	
 	def read_next(self):
 		"""Reads the next Tag"""
@@ -134,4 +148,199 @@ class MPLReader:
 	Reading any subsequent data such as array elements or byte buffers is left up to the tag interpreter (i.e. MPS)
 	"""
 
+TAG_TABLE = None # built by tag_table() the first time an MPLBufferReader is made, so importing stays cheap
+
+def tag_table() -> list:
+	"""For every possible first byte: (Tag name, data size, unpacker for the data after it, embedded values).
+	Picks the first matching Tag in TAGS order, same as MPLReader.read_next"""
+	global TAG_TABLE
+	if TAG_TABLE is not None:
+		return TAG_TABLE
+	table = []
+	for byte in range(256):
+		for tag in TAGS.values():
+			if tag.match(byte):
+				unpacker = Struct(tag.fmt).unpack_from if tag.data_size > 0 else None
+				table.append((tag.name, tag.data_size, unpacker, (tag.get_value(byte),)))
+				break
+	TAG_TABLE = table
+	return table
+
+class MPLBufferReader:
+	"""Same Tags as MPLReader, but reads from a buffer and looks Tags up by their first byte instead of trying each one.
+	BytesIO streams (like the ones `BRZ.open` returns) are read in place through `getbuffer()`; other streams are read ahead in chunks that grow as they're used,
+	so unpacking many small things one after another from the same stream doesn't copy the rest of it each time.
+	Since it reads ahead, `finish` seeks the stream back to where the last Tag ended, so data after the .mps (like entity data) can still be read from it.
+	Needs a seekable stream; use `reader_for` to pick a reader."""
+	def __init__(self, file_like):
+		self.file = file_like
+		self.start = file_like.tell()
+		self.position = 0
+		self.table = tag_table()
+		getbuffer = getattr(file_like, 'getbuffer', None)
+		if getbuffer is not None:
+			with getbuffer() as buffer:
+				self.data = buffer[self.start:]
+			self.chunk_size = 0 # nothing more to read
+		else:
+			self.data = bytearray()
+			self.chunk_size = 4096
+
+	def _fill(self, end: int):
+		# reads until the data reaches `end` (relative to the start) or the stream ends
+		data = self.data
+		while self.chunk_size > 0 and len(data) < end:
+			chunk = self.file.read(max(self.chunk_size, end - len(data)))
+			if len(chunk) == 0:
+				self.chunk_size = 0
+				break
+			data += chunk
+			self.chunk_size *= 2
+		return data
+
+	def read(self, size: int) -> bytes:
+		position = self.position
+		data = self._fill(position + size) if self.chunk_size > 0 else self.data
+		self.position = min(position + size, len(data))
+		return bytes(data[position:position + size])
+
+	def tell(self) -> int:
+		return self.start + self.position
+
+	def finish(self):
+		if isinstance(self.data, memoryview):
+			self.data.release() # so the BytesIO can be written to again
+		self.data = b''
+		self.file.seek(self.start + self.position)
+
+	def read_next(self):
+		"""Reads the next Tag"""
+		data = self.data
+		position = self.position
+		if self.chunk_size > 0 and position + 17 > len(data): # 17 is the biggest Tag, fixext16
+			data = self._fill(position + 17)
+		assert position < len(data), 'Unexpected EOF'
+		name, size, unpacker, embedded = self.table[data[position]]
+		if size == 0:
+			self.position = position + 1
+			return name, embedded
+		assert position + 1 + size <= len(data), 'Unexpected EOF'
+		self.position = position + 1 + size
+		return name, unpacker(data, position + 1)
+
+ACCELERATED = True # set to False to always use MPLReader, e.g. to rule the fast reader out while debugging
+
+def reader_for(file_like):
+	"""Returns an MPLBufferReader if the stream can seek back afterwards, or an MPLReader otherwise"""
+	seekable = getattr(file_like, 'seekable', None)
+	if ACCELERATED and seekable is not None and seekable():
+		return MPLBufferReader(file_like)
+	return MPLReader(file_like)
+
+
 
+
+class MPLWriter:
+	"""Writes msgpack Tags, always picking the smallest Tag that fits the value.
+	Like MPLReader, it doesn't know about schemas; MPS decides what to write."""
+	def __init__(self, file_like):
+		self.file = file_like
+
+	def write_nil(self):
+		self.file.write(bytes([TAGS['nil'].tag]))
+
+	def write_bool(self, value: bool):
+		self.file.write(bytes([TAGS['true' if value else 'false'].tag]))
+
+	def write_int(self, value: int):
+		"""Writes an int using the smallest Tag that can hold it"""
+		write = self.file.write
+		if 0 <= value <= 0x7f:
+			write(bytes([value]))
+		elif -32 <= value < 0:
+			write(pack('>b', value))
+		elif value > 0:
+			if value <= 0xff:
+				write(pack('>BB', TAGS['uint8'].tag, value))
+			elif value <= 0xffff:
+				write(pack('>BH', TAGS['uint16'].tag, value))
+			elif value <= 0xffffffff:
+				write(pack('>BI', TAGS['uint32'].tag, value))
+			elif value <= 0xffffffffffffffff:
+				write(pack('>BQ', TAGS['uint64'].tag, value))
+			else:
+				raise OverflowError(f'{value} is too big for msgpack')
+		else:
+			if value >= -0x80:
+				write(pack('>Bb', TAGS['int8'].tag, value))
+			elif value >= -0x8000:
+				write(pack('>Bh', TAGS['int16'].tag, value))
+			elif value >= -0x80000000:
+				write(pack('>Bi', TAGS['int32'].tag, value))
+			elif value >= -0x8000000000000000:
+				write(pack('>Bq', TAGS['int64'].tag, value))
+			else:
+				raise OverflowError(f'{value} is too small for msgpack')
+
+	def write_ints(self, values: list[int]):
+		"""write_int for every item, in as few writes as possible. Index columns are mostly small positive ints, so those skip the Tag search"""
+		out = bytearray()
+		append = out.append
+		uint8 = TAGS['uint8'].tag
+		uint16 = TAGS['uint16'].tag
+		write = self.file.write
+		for value in values:
+			if 0 <= value <= 0x7f:
+				append(value)
+			elif 0 < value <= 0xff:
+				out += pack('>BB', uint8, value)
+			elif 0 < value <= 0xffff:
+				out += pack('>BH', uint16, value)
+			else:
+				write(out)
+				out.clear()
+				self.write_int(value)
+		write(out)
+
+	def write_float32(self, value: float):
+		self.file.write(pack('>Bf', TAGS['float32'].tag, value))
+
+	def write_float64(self, value: float):
+		self.file.write(pack('>Bd', TAGS['float64'].tag, value))
+
+	def write_str(self, value: str):
+		"""Writes the str header and the utf-8 bytes after it"""
+		data = value.encode('utf-8')
+		size = len(data)
+		if size <= 31:
+			self.file.write(bytes([TAGS['fixstr'].tag | size]))
+		else:
+			self._write_sized(size, 'str8', 'str16', 'str32')
+		self.file.write(data)
+
+	def write_bin(self, data: bytes):
+		"""Writes the bin header and the bytes after it"""
+		self._write_sized(len(data), 'bin8', 'bin16', 'bin32')
+		self.file.write(data)
+
+	def write_array_header(self, count: int):
+		if count <= 15:
+			self.file.write(bytes([TAGS['fixarray'].tag | count]))
+		else:
+			self._write_sized(count, None, 'array16', 'array32')
+
+	def write_map_header(self, count: int):
+		if count <= 15:
+			self.file.write(bytes([TAGS['fixmap'].tag | count]))
+		else:
+			self._write_sized(count, None, 'map16', 'map32')
+
+	def _write_sized(self, size, tag8, tag16, tag32):
+		if tag8 is not None and size <= 0xff:
+			self.file.write(pack('>BB', TAGS[tag8].tag, size))
+		elif size <= 0xffff:
+			self.file.write(pack('>BH', TAGS[tag16].tag, size))
+		elif size <= 0xffffffff:
+			self.file.write(pack('>BI', TAGS[tag32].tag, size))
+		else:
+			raise OverflowError(f'size {size} is too big for msgpack')
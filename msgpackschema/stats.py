@@ -0,0 +1,62 @@
+"""Opt-in instrumentation for finding out where time goes when loading/decoding.
+Make a `Stats` and pass it in (`BRZ(path, stats=...)`, `MPS.unpack(..., stats=...)`); when nothing is passed, the code only pays for an `is None` check.
+"""
+
+from contextlib import contextmanager
+import time
+
+class Stats:
+	"""Collects wall time, bytes in/out and call counts per stage, plus free-form counters.
+	Stages used by brz: 'io', 'zstd', 'blake3', 'index', 'tree'. msgpackschema uses 'mps_unpack'.
+	Counters include 'blobs', 'files', and 'struct:<name>' for every struct decoded.
+
+	`hooks` are called as hook(stage, seconds, bytes_in, bytes_out) every time a stage is recorded, e.g. to feed a metrics system."""
+	def __init__(self, hooks: list = None):
+		self.times: dict[str, float] = {}
+		self.calls: dict[str, int] = {}
+		self.bytes_in: dict[str, int] = {}
+		self.bytes_out: dict[str, int] = {}
+		self.counters: dict[str, int] = {}
+		self.hooks: list = list(hooks) if hooks is not None else []
+
+	def record(self, stage: str, seconds: float, bytes_in: int = 0, bytes_out: int = 0):
+		"""Adds one run of `stage` that took `seconds`"""
+		self.times[stage] = self.times.get(stage, 0.0) + seconds
+		self.calls[stage] = self.calls.get(stage, 0) + 1
+		if bytes_in:
+			self.bytes_in[stage] = self.bytes_in.get(stage, 0) + bytes_in
+		if bytes_out:
+			self.bytes_out[stage] = self.bytes_out.get(stage, 0) + bytes_out
+		for hook in self.hooks:
+			hook(stage, seconds, bytes_in, bytes_out)
+
+	def count(self, name: str, amount: int = 1):
+		self.counters[name] = self.counters.get(name, 0) + amount
+
+	@contextmanager
+	def timer(self, stage: str, bytes_in: int = 0, bytes_out: int = 0):
+		"""`with stats.timer('stage'):` records how long the block took"""
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.record(stage, time.perf_counter() - start, bytes_in, bytes_out)
+
+	def merge(self, other):
+		"""Adds everything `other` collected into this one (hooks are not called again)"""
+		for mine, theirs in ((self.times, other.times), (self.calls, other.calls), (self.bytes_in, other.bytes_in), (self.bytes_out, other.bytes_out), (self.counters, other.counters)):
+			for key, value in theirs.items():
+				mine[key] = mine.get(key, 0) + value
+
+	def as_dict(self) -> dict:
+		return {
+			'times': dict(self.times),
+			'calls': dict(self.calls),
+			'bytes_in': dict(self.bytes_in),
+			'bytes_out': dict(self.bytes_out),
+			'counters': dict(self.counters),
+		}
+
+	def __repr__(self):
+		stages = ', '.join(f'{stage}={seconds * 1000:.2f}ms' for stage, seconds in self.times.items())
+		return f'Stats({stages})'
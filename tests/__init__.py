@@ -0,0 +1,36 @@
+"""Tests run over the prefabs in assets/. Run from the repo root with `python -m unittest` (or pytest)."""
+
+from brz import BRZ
+import os
+import os.path
+import tempfile
+import unittest
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+HELLO_WORLD = os.path.join(ASSETS, 'Hello world.brz')
+ELEVATOR = os.path.join(ASSETS, 'Impulse Elevator (no slider).brz')
+SINGLE_BRICK = os.path.join(ASSETS, 'single brick.brz')
+ARCHIVES = (HELLO_WORLD, ELEVATOR, SINGLE_BRICK)
+
+def read_all(brz: BRZ) -> dict[str, bytes]:
+	"""Contents of every file in `brz` by path"""
+	return {path: brz.open(path, 'r').read() for path in brz.index.file_paths()}
+
+def totals(path: str) -> tuple:
+	"""(bricks, components, entities) of the archive at `path`"""
+	brz = BRZ(path)
+	owners = brz.unpack_mps('/World/0/Owners.mps')
+	entities = brz.unpack_mps('/World/0/Entities/ChunkIndex.mps')['NumEntities'] if brz.exists('/World/0/Entities/ChunkIndex.mps') else []
+	return sum(owners['BrickCounts']), sum(owners['ComponentCounts']), sum(entities)
+
+class ArchiveTestCase(unittest.TestCase):
+	"""Gives every test a temp directory to write archives to"""
+	def setUp(self):
+		self._temp = tempfile.TemporaryDirectory()
+		self.temp = self._temp.name
+
+	def tearDown(self):
+		self._temp.cleanup()
+
+	def path(self, name: str) -> str:
+		return os.path.join(self.temp, name)
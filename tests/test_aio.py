@@ -0,0 +1,70 @@
+from brz import BRZ, BRZReader
+from tests import ARCHIVES, ELEVATOR, ArchiveTestCase, read_all
+from unittest import mock
+import asyncio
+import os
+import os.path
+import threading
+import unittest
+
+def dumped(directory: str) -> dict[str, bytes]:
+	files = {}
+	for root, _, names in os.walk(directory):
+		for name in names:
+			with open(os.path.join(root, name), 'rb') as f:
+				files[os.path.relpath(os.path.join(root, name), directory)] = f.read()
+	return files
+
+def open_fds() -> int:
+	return len(os.listdir('/proc/self/fd'))
+
+class TestAio(ArchiveTestCase):
+	def test_aopen(self):
+		for path in ARCHIVES:
+			with self.subTest(archive = os.path.basename(path)):
+				brz = asyncio.run(BRZ.aopen(path))
+				self.assertEqual(read_all(brz), read_all(BRZ(path)))
+
+	def test_aread(self):
+		brz = BRZ(ELEVATOR)
+		async def read_every_file():
+			return {path: await brz.aread(path) for path in brz.index.file_paths()}
+		self.assertEqual(asyncio.run(read_every_file()), read_all(brz))
+
+	def test_adump(self):
+		brz = BRZ(ELEVATOR)
+		brz.dump(self.path('sync'))
+		asyncio.run(brz.adump(self.path('async')))
+		self.assertEqual(dumped(self.path('async')), dumped(self.path('sync')))
+		with self.assertRaises(FileExistsError):
+			asyncio.run(brz.adump(self.path('async')))
+
+	@unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'counts open files through /proc')
+	def test_cancel(self):
+		read_blob = BRZReader.read_blob
+		reading = threading.Event()
+		resume = threading.Event()
+		blobs = []
+		def blocking_read_blob(reader, i):
+			# holds up the first blob until the task has been cancelled
+			blobs.append(i)
+			reading.set()
+			resume.wait(5)
+			return read_blob(reader, i)
+
+		async def cancel_while_reading():
+			task = asyncio.create_task(BRZ.aopen(ELEVATOR))
+			await asyncio.to_thread(reading.wait, 5)
+			task.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await task # doesn't wait for the worker thread
+			resume.set()
+
+		before = open_fds()
+		with mock.patch.object(BRZReader, 'read_blob', blocking_read_blob):
+			asyncio.run(cancel_while_reading()) # waits for the worker thread to finish
+		self.assertEqual(blobs, [0]) # stopped at the next blob
+		self.assertEqual(open_fds(), before)
+
+if __name__ == '__main__':
+	unittest.main()
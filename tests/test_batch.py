@@ -0,0 +1,66 @@
+from brz import BRZ
+from brz.batch import parse_size, load_function, find_archives, summary, run_batch
+from io import StringIO
+from tests import ASSETS, ARCHIVES, ArchiveTestCase
+import json
+import os.path
+import shutil
+import unittest
+
+class TestBatch(ArchiveTestCase):
+	def test_parse_size(self):
+		self.assertEqual(parse_size('1048576'), 1048576)
+		self.assertEqual(parse_size('512M'), 512 * 1024 ** 2)
+		self.assertEqual(parse_size('1.5kb'), 1536)
+		self.assertEqual(parse_size(' 2G '), 2 * 1024 ** 3)
+
+	def test_load_function(self):
+		self.assertIs(load_function('brz.batch:summary'), summary)
+		self.assertIs(load_function('os:path.basename'), os.path.basename)
+		with self.assertRaises(ValueError):
+			load_function('brz.batch')
+		with self.assertRaises(TypeError):
+			load_function('brz.batch:SIZE_SUFFIXES')
+
+	def test_find_archives(self):
+		os.mkdir(self.path('nested'))
+		shutil.copy(ARCHIVES[0], self.path('nested/a.brz'))
+		shutil.copy(ARCHIVES[2], self.path('b.BRZ'))
+		with open(self.path('c.txt'), 'w') as f:
+			f.write('not an archive')
+		self.assertEqual(find_archives(self.temp), [self.path('b.BRZ'), self.path('nested/a.brz')])
+		self.assertEqual(find_archives(self.temp, recursive = False), [self.path('b.BRZ')])
+		self.assertEqual(find_archives(ASSETS, recursive = False), sorted(ARCHIVES))
+
+	def test_summary(self):
+		for path in ARCHIVES:
+			with self.subTest(archive = os.path.basename(path)):
+				brz = BRZ(path)
+				self.assertEqual(summary(path), {
+					'files': brz.index.file_count,
+					'blobs': brz.index.blob_count,
+					'compressed_bytes': sum(brz.index.compressed_lengths),
+					'decompressed_bytes': sum(brz.index.decompressed_lengths),
+				})
+
+	def test_run_batch(self):
+		with open(self.path('broken.brz'), 'wb') as f:
+			f.write(b'not an archive')
+		paths = list(ARCHIVES) + [self.path('broken.brz')]
+		output = StringIO()
+		self.assertEqual(run_batch(paths, 'brz.batch:summary', output, workers = 1, progress = None), (3, 1))
+		records = {record['path']: record for record in map(json.loads, output.getvalue().splitlines())}
+		self.assertEqual(set(records), set(paths))
+		for path in ARCHIVES:
+			self.assertTrue(records[path]['ok'])
+			self.assertEqual(records[path]['result'], summary(path))
+		self.assertFalse(records[self.path('broken.brz')]['ok'])
+		self.assertIn('error', records[self.path('broken.brz')])
+
+	def test_run_batch_bad_function(self):
+		# checked once in the parent rather than failing every archive
+		with self.assertRaises(AttributeError):
+			run_batch(list(ARCHIVES), 'brz.batch:no_such_function', StringIO(), workers = 1, progress = None)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,35 @@
+from benchmarks.__main__ import main
+from benchmarks.synth import synth_archive, random_value
+from msgpackschema import MPS, MsgpackSchemaError
+from tests import HELLO_WORLD, ArchiveTestCase
+import json
+import random
+import unittest
+
+class TestBenchmarks(ArchiveTestCase):
+	def test_synth_archive(self):
+		brz = synth_archive(bricks = 100, chunks = 3, wires = 10, template_path = HELLO_WORLD)
+		grid = '/World/0/Bricks/Grids/1'
+		self.assertEqual(brz.ls(grid + '/Chunks'), ['0_0_0.mps', '1_0_0.mps', '2_0_0.mps'])
+		bricks = sum(len(brz.unpack_mps(f'{grid}/Chunks/{name}')['BrickTypeIndices']) for name in brz.ls(grid + '/Chunks'))
+		wires = sum(len(tree['RemoteWireSources']) + len(tree['LocalWireSources']) for tree in (brz.unpack_mps(f'{grid}/Wires/{name}') for name in brz.ls(grid + '/Wires')))
+		self.assertEqual((bricks, wires), (100, 10))
+		self.assertEqual(brz.unpack_mps(grid + '/ChunkIndex.mps')['NumBricks'], [34, 33, 33])
+
+	def test_main(self):
+		main(['--bricks', '200', '--chunks', '2', '--wires', '20', '--repeat', '1', '--no-memory', '--out', self.path('report.json')])
+		with open(self.path('report.json')) as f:
+			stages = json.load(f)['stages']
+		self.assertEqual(set(stages), {'synthesize', 'save', 'open', 'read_meta', 'decode'})
+		for kind, result in stages['decode'].items():
+			self.assertNotIn('error', result, kind)
+		self.assertEqual(stages['decode']['Chunks']['bricks'], 200)
+
+	def test_wire_graph_variants(self):
+		mps = MPS()
+		mps.import_schema_raw({}, {'ThingSoA': {'Value': 'wire_graph_variant'}})
+		with self.assertRaises(MsgpackSchemaError):
+			random_value(mps, 'ThingSoA', random.Random(0))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,92 @@
+from brz import BRZ
+from brz.cache import ChunkCache
+from tests import ELEVATOR, ArchiveTestCase
+import os
+import unittest
+
+def entry(i: int) -> dict:
+	return {'Index': i, 'Data': bytes([i]) * 2000}
+
+def keys(count: int) -> list[bytes]:
+	return [ChunkCache.make_key(bytes([i]) * 32, b'\0' * 32) for i in range(count)]
+
+def disk_files(directory: str) -> list[str]:
+	return [name for _, _, names in os.walk(directory) for name in names if name.endswith('.bin')]
+
+class TestChunkCache(ArchiveTestCase):
+	def test_make_key(self):
+		self.assertNotEqual(ChunkCache.make_key(b'a' * 32, b'b' * 32), ChunkCache.make_key(b'a' * 32, b'b' * 32, 'BRSavedBrickChunkSoA'))
+		self.assertEqual(ChunkCache.make_key(b'a' * 32, b'b' * 32, None), ChunkCache.make_key(b'a' * 32, b'b' * 32, ''))
+
+	def test_memory_eviction(self):
+		cache = ChunkCache(max_memory_bytes = 5000)
+		for i, key in enumerate(keys(4)):
+			cache.put(key, entry(i))
+		first, second, third, fourth = keys(4)
+		# about 2kB each, so only the last two fit
+		self.assertIsNone(cache.get(first))
+		self.assertIsNone(cache.get(second))
+		self.assertEqual(cache.get(third), entry(2))
+		self.assertEqual(cache.get(fourth), entry(3))
+
+		# using third makes fourth the least recently used
+		cache.get(third)
+		cache.put(first, entry(0))
+		self.assertIsNone(cache.get(fourth))
+		self.assertEqual(cache.get(third), entry(2))
+		self.assertEqual((cache.hits, cache.misses), (4, 3))
+
+	def test_too_big_for_memory(self):
+		cache = ChunkCache(max_memory_bytes = 100)
+		cache.put(keys(1)[0], entry(0))
+		self.assertIsNone(cache.get(keys(1)[0]))
+
+	def test_copies(self):
+		cache = ChunkCache()
+		cache.put(keys(1)[0], entry(0))
+		cache.get(keys(1)[0])['Index'] = 1
+		self.assertEqual(cache.get(keys(1)[0]), entry(0))
+
+	def test_disk(self):
+		cache = ChunkCache(self.temp, max_memory_bytes = 0)
+		for i, key in enumerate(keys(3)):
+			cache.put(key, entry(i))
+		self.assertEqual(len(cache), 3)
+		self.assertEqual(cache.get(keys(3)[1]), entry(1))
+
+		# another instance (like another process) finds them
+		other = ChunkCache(self.temp)
+		self.assertEqual(len(other), 3)
+		for i, key in enumerate(keys(3)):
+			self.assertEqual(other.get(key), entry(i))
+
+		other.clear()
+		self.assertEqual(len(other), 0)
+		self.assertEqual(disk_files(self.temp), [])
+
+	def test_disk_eviction(self):
+		cache = ChunkCache(self.temp, max_disk_bytes = 5000, max_memory_bytes = 0)
+		for i, key in enumerate(keys(4)):
+			cache.put(key, entry(i))
+		self.assertEqual(len(cache), 2)
+		self.assertEqual(len(disk_files(self.temp)), 2)
+		self.assertIsNone(cache.get(keys(4)[0]))
+		self.assertEqual(cache.get(keys(4)[3]), entry(3))
+
+		# a smaller limit evicts as soon as the directory is opened
+		self.assertEqual(len(ChunkCache(self.temp, max_disk_bytes = 3000)), 1)
+		self.assertEqual(len(disk_files(self.temp)), 1)
+
+	def test_unpack_mps(self):
+		brz = BRZ(ELEVATOR)
+		cache = ChunkCache(self.temp)
+		path = '/World/0/Bricks/Grids/1/Chunks/0_0_0.mps'
+		tree = brz.unpack_mps(path)
+		self.assertEqual(brz.unpack_mps(path, cache = cache), tree)
+		self.assertEqual((cache.hits, cache.misses), (0, 1))
+		self.assertEqual(brz.unpack_mps(path, cache = cache), tree)
+		self.assertEqual(BRZ(ELEVATOR).unpack_mps(path, cache = ChunkCache(self.temp)), tree)
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,65 @@
+from brz import codec
+from brz.cache import ChunkCache
+from tests import ArchiveTestCase
+import random
+import unittest
+
+def samples(count: int) -> list[bytes]:
+	rng = random.Random(0)
+	return [f'{{"Index": {i}, "Position": [{rng.randint(-500, 500)}, {rng.randint(-500, 500)}, 0], "Color": "{rng.choice(("red", "green", "blue"))}"}}'.encode() * 4 for i in range(count)]
+
+class TestCodec(unittest.TestCase):
+	def test_round_trip(self):
+		data = b'brick' * 1000
+		for level in (1, 3, 19):
+			with self.subTest(level = level):
+				compressed = codec.compress(data, level)
+				self.assertLess(len(compressed), len(data))
+				self.assertEqual(codec.decompress(compressed), data)
+				self.assertEqual(codec.decompress(compressed, len(data)), data)
+
+	@unittest.skipUnless(codec.HAS_CONTEXTS, 'needs zstandard')
+	def test_contexts_reused(self):
+		codec.compress(b'a', 7)
+		codec.decompress(codec.compress(b'a', 7))
+		contexts = dict(codec._contexts())
+		codec.decompress(codec.compress(b'b', 7))
+		self.assertEqual(codec._contexts(), contexts)
+		self.assertIs(codec._contexts()[('c', 7, 0)], contexts[('c', 7, 0)])
+
+	@unittest.skipUnless(codec.HAS_CONTEXTS, 'needs zstandard')
+	def test_dictionary(self):
+		dictionary = codec.train_dictionary(samples(500), 4096)
+		self.assertLessEqual(len(dictionary.data), 4096)
+		self.assertEqual(codec.ZstdDictionary(dictionary.data).dict_id, dictionary.dict_id)
+
+		sample = samples(501)[-1]
+		compressed = codec.compress(sample, 3, dictionary)
+		self.assertLess(len(compressed), len(codec.compress(sample, 3)))
+		self.assertEqual(codec.decompress(compressed, dictionary = dictionary), sample)
+		self.assertEqual(codec.decompress(compressed, len(sample), dictionary), sample)
+
+class TestCompressedCache(ArchiveTestCase):
+	entry = {'Index': 1, 'Data': b'\0' * 10000}
+
+	def test_compressed(self):
+		cache = ChunkCache(self.temp, max_memory_bytes = 0, compression_level = 3)
+		key = ChunkCache.make_key(b'a' * 32, b'b' * 32)
+		cache.put(key, self.entry)
+		self.assertLess(cache._disk_bytes, 1000)
+		self.assertEqual(ChunkCache(self.temp).get(key), self.entry) # the header says how it was stored
+
+	@unittest.skipUnless(codec.HAS_CONTEXTS, 'needs zstandard')
+	def test_dictionary(self):
+		dictionary = codec.train_dictionary(samples(500), 4096)
+		key = ChunkCache.make_key(b'a' * 32, b'b' * 32)
+		ChunkCache(self.temp, max_memory_bytes = 0, compression_level = 3, dictionary = dictionary).put(key, self.entry)
+		self.assertEqual(ChunkCache(self.temp, dictionary = dictionary).get(key), self.entry)
+
+		# without the dictionary it was written with, the entry is a miss and gets removed
+		other = ChunkCache(self.temp)
+		self.assertIsNone(other.get(key))
+		self.assertEqual(len(other), 0)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,44 @@
+from brz import BRZ
+from brz.decode import decode_grid
+from struct import iter_unpack
+from tests import ELEVATOR
+import os
+import unittest
+
+def shared_memory_blocks() -> set[str]:
+	return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+class TestDecodeGrid(unittest.TestCase):
+	def test_workers(self):
+		brz = BRZ(ELEVATOR)
+		blocks = shared_memory_blocks()
+		single = decode_grid(brz, 1, workers = 1)
+		pooled = decode_grid(brz, 1, workers = 2)
+		self.assertEqual(pooled, single)
+		self.assertEqual(shared_memory_blocks(), blocks) # every block was unlinked
+
+	def test_columns(self):
+		brz = BRZ(ELEVATOR)
+		result = decode_grid(brz, 1, workers = 2)
+		self.assertEqual(set(result), {'Chunks', 'Components', 'Wires'})
+		chunks = result['Chunks']
+		offsets = chunks['offsets']['RelativePositions']
+		positions = list(iter_unpack(chunks['formats']['RelativePositions'], chunks['columns']['RelativePositions']))
+		types = [value for value, in iter_unpack(chunks['formats']['BrickTypeIndices'], chunks['columns']['BrickTypeIndices'])]
+		for i, name in enumerate(chunks['names']):
+			with self.subTest(chunk = name):
+				tree = brz.unpack_mps(f'/World/0/Bricks/Grids/1/Chunks/{name}.mps')
+				self.assertEqual(positions[offsets[i]:offsets[i + 1]], [(position['X'], position['Y'], position['Z']) for position in tree['RelativePositions']])
+				self.assertEqual(types[offsets[i]:offsets[i + 1]], tree['BrickTypeIndices'])
+				self.assertEqual(chunks['trees'][i]['BrickSizes'], tree['BrickSizes'])
+				self.assertNotIn('RelativePositions', chunks['trees'][i])
+		self.assertEqual(len(result['Components']['trailing']), len(result['Components']['names']))
+
+	def test_kinds(self):
+		brz = BRZ(ELEVATOR)
+		self.assertEqual(set(decode_grid(brz, 1, workers = 1, kinds = ('Wires',))), {'Wires'})
+		with self.assertRaises(FileNotFoundError):
+			decode_grid(brz, 1000)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,60 @@
+from brz import BRZ
+from brz.diff import diff_archives, diff_trees, format_diff
+from brz.transform import transform
+from msgpackschema import MPS
+from io import BytesIO
+from tests import ELEVATOR, SINGLE_BRICK, ArchiveTestCase
+import unittest
+
+CHUNK = '/World/0/Bricks/Grids/1/Chunks/0_0_0.mps'
+
+def recolor(data: bytes) -> bytes:
+	"""Paints the first and third bricks of a chunk white"""
+	brz = BRZ(ELEVATOR)
+	mps = MPS()
+	mps.import_schema(brz.open(brz.schema_path_for(CHUNK), 'r').read())
+	tree = mps.unpack(BytesIO(data))
+	for i in (0, 2):
+		tree['ColorsAndAlphas'][i] = {'R': 255, 'G': 255, 'B': 255, 'A': 4}
+	stream = BytesIO()
+	mps.pack(stream, tree)
+	return stream.getvalue()
+
+class TestDiff(ArchiveTestCase):
+	def test_identical(self):
+		result = diff_archives(ELEVATOR, ELEVATOR)
+		self.assertTrue(result['identical'])
+		self.assertEqual(format_diff(result), [])
+
+	def test_changed(self):
+		transform(ELEVATOR, self.path('changed.brz'), {CHUNK: recolor, '/Meta/Thumbnail.png': lambda data: None})
+		result = diff_archives(ELEVATOR, self.path('changed.brz'))
+		self.assertFalse(result['identical'])
+		self.assertEqual((result['only_in_a'], result['only_in_b']), (['/Meta/Thumbnail.png'], []))
+		self.assertEqual([change['path'] for change in result['changed']], [CHUNK])
+		self.assertEqual(result['changed'][0]['fields'], [{'field': 'ColorsAndAlphas', 'length_a': 632, 'length_b': 632, 'differing': 2, 'indices': [0, 2]}])
+		self.assertEqual(format_diff(result), [
+			'only in a: /Meta/Thumbnail.png',
+			f'changed: {CHUNK} ({result["changed"][0]["size_a"]} -> {result["changed"][0]["size_b"]} bytes)',
+			'\tColorsAndAlphas: 632 items, 2 differ (at 0, 2)',
+		])
+
+	def test_different_archives(self):
+		result = diff_archives(ELEVATOR, SINGLE_BRICK)
+		self.assertFalse(result['identical'])
+		for change in result['changed']:
+			self.assertNotIn('error', change, change['path'])
+
+class TestDiffTrees(unittest.TestCase):
+	def test_values(self):
+		self.assertEqual(diff_trees({'A': 1, 'B': 'x'}, {'A': 1, 'B': 'y'}), [{'field': 'B', 'a': 'x', 'b': 'y'}])
+		self.assertEqual(diff_trees({'A': 1}, {'B': 1}), [{'field': 'A', 'only_in': 'a'}, {'field': 'B', 'only_in': 'b'}])
+		self.assertEqual(diff_trees({'A': {'B': 1}}, {'A': {'B': 2}}), [{'field': 'A.B', 'a': 1, 'b': 2}])
+
+	def test_arrays(self):
+		self.assertEqual(diff_trees({'A': [1, 2, 3]}, {'A': [1, 2, 3]}), [])
+		self.assertEqual(diff_trees({'A': [1, 2, 3]}, {'A': [1, 5]}), [{'field': 'A', 'length_a': 3, 'length_b': 2, 'differing': 1, 'indices': [1]}])
+		self.assertEqual(diff_trees({'A': list(range(20))}, {'A': [-1] * 20}, max_indices = 3)[0]['indices'], [0, 1, 2])
+
+if __name__ == '__main__':
+	unittest.main()
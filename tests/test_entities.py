@@ -0,0 +1,61 @@
+from brz import BRZ
+from brz.entities import read_entities, flag_bits, weld_parent_indices
+from brz.errors import BRZFormatError
+from tests import ARCHIVES, ELEVATOR, totals
+import os.path
+import unittest
+
+class TestEntities(unittest.TestCase):
+	def test_count(self):
+		for source in ARCHIVES:
+			with self.subTest(archive = os.path.basename(source)):
+				table = read_entities(BRZ(source))
+				self.assertEqual(len(table), totals(source)[2])
+				for name, column in table.columns.items():
+					self.assertEqual(len(column), len(table) * table.widths[name], name)
+				for name, bits in table.flags.items():
+					self.assertEqual(len(bits), len(table), name)
+				self.assertEqual(len(table.weld_parents), len(table))
+
+	def test_lookup(self):
+		brz = BRZ(ELEVATOR)
+		table = read_entities(brz)
+		grids = [int(name) for name in brz.ls('/World/0/Bricks/Grids')]
+		self.assertIsNone(table.grid(1))
+		for grid_id in grids:
+			if grid_id != 1:
+				row = table.grid(grid_id)
+				self.assertEqual(table.ids[row], grid_id)
+				self.assertIn(grid_id, table)
+				self.assertEqual(table.types[row], 'Entity_DynamicBrickGrid')
+
+		entity = table.row(table.ids[0])
+		self.assertEqual(entity['id'], table.ids[0])
+		self.assertEqual(len(entity['Locations']), 3)
+		self.assertEqual(entity['Locations'], tuple(table.columns['Locations'][0:3]))
+		for parent in table.weld_parents:
+			self.assertTrue(parent is None or parent in table)
+		with self.assertRaises(KeyError):
+			table.row(table.next_persistent_index)
+
+class TestWelds(unittest.TestCase):
+	def test_flag_bits(self):
+		self.assertEqual(flag_bits({'Flags': [0b101]}, 4), [True, False, True, False])
+		# trailing all-zero bytes can be left out
+		self.assertEqual(flag_bits({'Flags': []}, 10), [False] * 10)
+		self.assertEqual(flag_bits({'Flags': [0, 0b10]}, 10), [False] * 9 + [True])
+
+	def test_sparse(self):
+		flags = {'WeldParentFlags': [False, True, True]}
+		self.assertEqual(weld_parent_indices({'WeldParentIndices': [7, 8]}, flags, 3), [None, 7, 8])
+		with self.assertRaises(BRZFormatError):
+			weld_parent_indices({'WeldParentIndices': [7, 8, 9]}, flags, 3)
+
+	def test_dense(self):
+		self.assertEqual(weld_parent_indices({'WeldParentIndices': [7, 8]}, {}, 2), [7, 8])
+		self.assertEqual(weld_parent_indices({}, {}, 2), [None, None])
+		with self.assertRaises(BRZFormatError):
+			weld_parent_indices({'WeldParentIndices': [7]}, {}, 2)
+
+if __name__ == '__main__':
+	unittest.main()
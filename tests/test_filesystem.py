@@ -0,0 +1,47 @@
+from brz import BRZ
+from tests import ELEVATOR
+import unittest
+
+class TestFilesystem(unittest.TestCase):
+	def test_write_file(self):
+		brz = BRZ()
+		brz.makedirs('/World/0/Bricks')
+		brz.makedirs('/World/0', exist_ok = True)
+		brz.mkdir('/Meta')
+		brz.write_file('/Meta/Bundle.json', b'{}')
+		brz.write_file('/World/0/a.bin', bytearray(b'a'))
+		self.assertEqual(brz.ls('/'), ['World', 'Meta'])
+		self.assertEqual(brz.ls('/World/0'), ['Bricks', 'a.bin'])
+		self.assertTrue(brz.isdir('/World/0/Bricks'))
+		self.assertEqual(brz.open('/World/0/a.bin', 'r').read(), b'a')
+		brz.write_file('/World/0/a.bin', b'replaced')
+		self.assertEqual(brz.open('/World/0/a.bin', 'r').read(), b'replaced')
+
+	def test_existing_archive(self):
+		brz = BRZ(ELEVATOR)
+		brz.write_file('/Meta/Bundle.json', b'{}')
+		brz.makedirs('/Meta/Extra/Nested')
+		self.assertEqual(brz.open('/Meta/Bundle.json', 'r').read(), b'{}')
+		self.assertIn('Extra', brz.ls('/Meta'))
+
+	def test_errors(self):
+		brz = BRZ()
+		brz.makedirs('/Meta')
+		brz.write_file('/Meta/Bundle.json', b'{}')
+		with self.assertRaises(FileExistsError):
+			brz.mkdir('/Meta')
+		with self.assertRaises(FileExistsError):
+			brz.makedirs('/Meta')
+		with self.assertRaises(FileNotFoundError):
+			brz.mkdir('/World/0')
+		with self.assertRaises(FileNotFoundError):
+			brz.write_file('/World/0/a.bin', b'')
+		with self.assertRaises(NotADirectoryError):
+			brz.makedirs('/Meta/Bundle.json/x')
+		with self.assertRaises(NotADirectoryError):
+			brz.write_file('/Meta/Bundle.json/x', b'')
+		with self.assertRaises(IsADirectoryError):
+			brz.write_file('/Meta', b'')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,39 @@
+from brz import BRZ
+from brz.generate import generate, CHUNK_SIZE, OPAQUE_ALPHA, STATIC_GRID
+from importlib.util import find_spec
+from tests import ArchiveTestCase, read_all, totals
+import unittest
+
+@unittest.skipUnless(find_spec('numpy') is not None, 'needs numpy')
+class TestGenerate(ArchiveTestCase):
+	def test_generate(self):
+		# two bricks in chunk 0_0_0, one in 1_0_-1
+		positions = [(0, 0, 6), (10, 0, 6), (CHUNK_SIZE + 5, 0, -CHUNK_SIZE)]
+		for workers in (1, 2):
+			with self.subTest(workers = workers):
+				summary = generate(self.path('generated.brz'), positions, (5, 5, 6), colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)], name = 'Test', workers = workers)
+				self.assertEqual(summary, {'bricks': 3, 'chunks': 2})
+				brz = BRZ(self.path('generated.brz'))
+				self.assertEqual(totals(self.path('generated.brz')), (3, 0, 0))
+				self.assertEqual(brz.ls(f'{STATIC_GRID}/Chunks'), ['0_0_0.mps', '1_0_-1.mps'])
+				self.assertEqual(brz.unpack_mps(f'{STATIC_GRID}/ChunkIndex.mps')['NumBricks'], [2, 1])
+
+				chunk = brz.unpack_mps(f'{STATIC_GRID}/Chunks/0_0_0.mps')
+				self.assertEqual(chunk['RelativePositions'], [{'X': 0, 'Y': 0, 'Z': 6}, {'X': 10, 'Y': 0, 'Z': 6}])
+				self.assertEqual(chunk['ColorsAndAlphas'], [{'R': 255, 'G': 0, 'B': 0, 'A': OPAQUE_ALPHA}, {'R': 0, 'G': 255, 'B': 0, 'A': OPAQUE_ALPHA}])
+				self.assertEqual(brz.unpack_mps(f'{STATIC_GRID}/Chunks/1_0_-1.mps')['RelativePositions'], [{'X': 5, 'Y': 0, 'Z': 0}])
+				self.assertEqual(brz.unpack_mps('/World/0/GlobalData.mps')['ProceduralBrickAssetNames'], ['PB_DefaultBrick'])
+				self.assertIn(b'"name": "Test"', read_all(brz)['/Meta/Bundle.json'])
+
+	def test_errors(self):
+		with self.assertRaises(ValueError):
+			generate(self.path('generated.brz'), [], (5, 5, 6))
+		with self.assertRaises(ValueError):
+			generate(self.path('generated.brz'), [(0, 0)], (5, 5, 6))
+		with self.assertRaises(ValueError):
+			generate(self.path('generated.brz'), [(0, 0, 0)], (5, 5, 6), assets = [1])
+		with self.assertRaises(ValueError):
+			generate(self.path('generated.brz'), [(0, 0, 0)], (5, 5, -1))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,75 @@
+"""Import time budget for the packages the CLI tools load on every run.
+
+Each target is imported in fresh interpreters with `-X importtime`, and the time spent in modules a bare interpreter doesn't load is compared against a budget.
+Timings depend on the machine, so heavy modules that must stay lazy are also checked by name, which doesn't.
+Set IMPORTTIME_SCALE to multiply every budget, e.g. IMPORTTIME_SCALE=3 on slow CI machines.
+Bytecode caching matters a lot here (compiling is slower than importing), so the .pyc files are written first.
+"""
+
+import compileall
+import os
+import subprocess
+import sys
+import unittest
+
+# milliseconds spent importing, on top of what a bare interpreter imports. roughly 2x what they took when the budget was set
+BUDGETS = {
+	'msgpackschema': 10,
+	'brz': 15,
+	'brz.__main__': 25,
+}
+
+# must only be imported when they're used. dataclasses and logging pull in inspect, ast, re and friends
+LAZY_MODULES = ('dataclasses', 'inspect', 'logging', 'pprint', 'msgpack', 'blake3', 'zstd', 'zstandard', 'multiprocessing', 'asyncio')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_times(statement: str) -> dict[str, int]:
+	"""Runs `statement` in a fresh interpreter and returns how long each module took to import on its own, in microseconds"""
+	env = dict(os.environ, PYTHONPATH=ROOT)
+	env.pop('PYTHONDONTWRITEBYTECODE', None)
+	result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+	times = {}
+	for line in result.stderr.splitlines():
+		if not line.startswith('import time:') or 'self [us]' in line:
+			continue
+		self_time, _, name = line.removeprefix('import time:').split('|')
+		times[name.strip()] = int(self_time)
+	return times
+
+def measure(module: str, repeat: int = 7) -> dict:
+	"""Best of `repeat` runs of importing `module`, not counting modules that `python -c pass` imports too"""
+	baseline = set(import_times('pass'))
+	best = None
+	for _ in range(repeat):
+		times = import_times(f'import {module}')
+		extra = sum(time for name, time in times.items() if name not in baseline)
+		if best is None or extra < best:
+			best = extra
+			modules = sorted(name for name in times if name not in baseline)
+	return {'ms': best / 1000, 'modules': modules}
+
+class TestImportTime(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		compileall.compile_dir(os.path.join(ROOT, 'brz'), quiet=1)
+		compileall.compile_dir(os.path.join(ROOT, 'msgpackschema'), quiet=1)
+		cls.results = {module: measure(module) for module in BUDGETS}
+
+	def test_budget(self):
+		scale = float(os.environ.get('IMPORTTIME_SCALE', 1))
+		for module, budget in BUDGETS.items():
+			with self.subTest(module = module):
+				self.assertLessEqual(self.results[module]['ms'], budget * scale)
+
+	def test_lazy_modules(self):
+		for module in BUDGETS:
+			with self.subTest(module = module):
+				self.assertEqual([name for name in self.results[module]['modules'] if name.split('.')[0] in LAZY_MODULES], [])
+
+	def test_brz_without_msgpackschema(self):
+		# the .mps decoding (and Stats) is only needed once something is unpacked
+		self.assertNotIn('msgpackschema', self.results['brz']['modules'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,51 @@
+from brz import BRZ, BRZWriter
+from brz.inspect import inspect_archive, format_report
+from tests import ARCHIVES, ArchiveTestCase
+import os.path
+import unittest
+
+class TestInspect(ArchiveTestCase):
+	def test_totals(self):
+		for source in ARCHIVES:
+			with self.subTest(archive = os.path.basename(source)):
+				index = BRZ(source).index
+				report = inspect_archive(source, depth = 1)
+				self.assertEqual((report['files'], report['blobs']), (index.file_count, index.blob_count))
+				self.assertEqual(report['compressed'], sum(index.compressed_lengths))
+				self.assertEqual(sum(totals['compressed'] for totals in report['folders'].values()), report['compressed'])
+				self.assertEqual(sum(totals['files'] for totals in report['folders'].values()), index.file_count)
+				self.assertEqual(sum(totals['blobs'] for totals in report['methods'].values()), index.blob_count)
+				self.assertEqual(set(report['folders']), {'/Meta', '/World'})
+				self.assertEqual(report['largest'], sorted(report['largest'], key = lambda file: file['compressed'], reverse = True))
+
+	def test_shared_and_duplicates(self):
+		# BRZ.save shares one blob between identical files
+		brz = BRZ()
+		brz.mkdir('/Meta')
+		brz.write_file('/Meta/a.txt', b'same' * 100)
+		brz.write_file('/Meta/b.txt', b'same' * 100)
+		brz.save(self.path('shared.brz'))
+		report = inspect_archive(self.path('shared.brz'))
+		self.assertEqual((report['shared_files'], report['duplicates']), (1, []))
+		self.assertEqual(report['folders']['/Meta']['files'], 2)
+
+		# something that doesn't deduplicate stores it twice
+		with open(self.path('duplicates.brz'), 'wb') as f:
+			writer = BRZWriter(f)
+			entry = writer.make_blob(b'same' * 100)
+			writer.write_entries([('Meta', -1)], [('a.txt', 0, 0), ('b.txt', 0, 1)], [entry, writer.make_blob(b'same' * 100)])
+		report = inspect_archive(self.path('duplicates.brz'))
+		self.assertEqual(report['shared_files'], 0)
+		self.assertEqual(len(report['duplicates']), 1)
+		self.assertEqual(report['duplicates'][0]['paths'], ['/Meta/a.txt', '/Meta/b.txt'])
+		self.assertEqual(report['duplicates'][0]['wasted'], entry.compressed_length)
+		self.assertIn(f'duplicate blobs ({entry.compressed_length} bytes wasted):', format_report(report))
+
+	def test_format_report(self):
+		report = inspect_archive(ARCHIVES[0])
+		lines = format_report(report)
+		self.assertTrue(lines[0].startswith(f'{ARCHIVES[0]}: {os.path.getsize(ARCHIVES[0])} bytes'))
+		self.assertEqual(len(lines), 3 + len(report['folders']) + 1 + len(report['methods']) + 1 + len(report['largest']))
+
+if __name__ == '__main__':
+	unittest.main()
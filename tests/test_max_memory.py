@@ -0,0 +1,45 @@
+from brz import BRZ, ECompressionMethod
+from tests import ARCHIVES, ELEVATOR, SINGLE_BRICK, ArchiveTestCase, read_all
+import asyncio
+import os.path
+import unittest
+
+class TestMaxMemory(ArchiveTestCase):
+	def test_read(self):
+		for source in ARCHIVES:
+			with self.subTest(archive = os.path.basename(source)), BRZ(source, max_memory = 4096) as lazy:
+				self.assertEqual(read_all(lazy), read_all(BRZ(source)))
+				self.assertLessEqual(lazy._blobs.size, max(4096, max(lazy.index.decompressed_lengths)))
+
+	def test_replaced_files(self):
+		with BRZ(ELEVATOR, max_memory = 4096) as lazy:
+			lazy.write_file('/Meta/Bundle.json', b'{}')
+			lazy.close()
+			self.assertEqual(lazy.open('/Meta/Bundle.json', 'r').read(), b'{}') # not read from the closed file
+
+	def test_save(self):
+		for source in ARCHIVES:
+			original = read_all(BRZ(source))
+			for method in (None, ECompressionMethod.NONE, ECompressionMethod.ZSTD):
+				with self.subTest(archive = os.path.basename(source), method = method):
+					with BRZ(source, max_memory = 4096) as lazy:
+						lazy.save(self.path('saved.brz'), method = method)
+					saved = BRZ(self.path('saved.brz'))
+					self.assertEqual(read_all(saved), original)
+					if method is not None:
+						self.assertEqual(set(saved.index.compression_methods), {method})
+
+	def test_save_over_source(self):
+		original = read_all(BRZ(SINGLE_BRICK))
+		with BRZ(SINGLE_BRICK, max_memory = 4096) as lazy:
+			with self.assertRaises(ValueError):
+				lazy.save(SINGLE_BRICK)
+		self.assertEqual(read_all(BRZ(SINGLE_BRICK)), original)
+
+	def test_aopen(self):
+		with asyncio.run(BRZ.aopen(ELEVATOR, max_memory = 4096)) as lazy:
+			self.assertIsNotNone(lazy._blobs)
+			self.assertEqual(read_all(lazy), read_all(BRZ(ELEVATOR)))
+
+if __name__ == '__main__':
+	unittest.main()
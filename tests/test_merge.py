@@ -0,0 +1,61 @@
+from brz import BRZ
+from brz.errors import BRZMergeError
+from brz.merge import merge, extract, split_by_grid, split_by_region
+from tests import ARCHIVES, ELEVATOR, HELLO_WORLD, SINGLE_BRICK, ArchiveTestCase, read_all, totals
+import os
+import os.path
+import unittest
+
+class TestMerge(ArchiveTestCase):
+	def test_merge_one(self):
+		for source in ARCHIVES:
+			with self.subTest(archive = os.path.basename(source)):
+				merge([source], self.path('merged.brz'))
+				self.assertEqual(read_all(BRZ(self.path('merged.brz'))), read_all(BRZ(source)))
+
+	def test_merge(self):
+		summary = merge([ELEVATOR, SINGLE_BRICK, SINGLE_BRICK], self.path('merged.brz'))
+		self.assertEqual(summary['archives'], 3)
+		expected = [sum(counts) for counts in zip(totals(ELEVATOR), totals(SINGLE_BRICK), totals(SINGLE_BRICK))]
+		self.assertEqual(list(totals(self.path('merged.brz'))), expected)
+
+	def test_merge_renumbered_asset_references(self):
+		# both have components and different ExternalAssetReferences, which merging would have to renumber in component data
+		with self.assertRaises(BRZMergeError):
+			merge([HELLO_WORLD, ELEVATOR], self.path('merged.brz'))
+		self.assertFalse(os.path.exists(self.path('merged.brz')))
+
+	def test_merge_split_component_type(self):
+		# the same chunk twice would put each component type in two groups, which component data can't be reordered into
+		with self.assertRaises(BRZMergeError):
+			merge([HELLO_WORLD, HELLO_WORLD], self.path('merged.brz'))
+		self.assertEqual(os.listdir(self.temp), [])
+
+	def test_nothing(self):
+		with self.assertRaises(ValueError):
+			merge([], self.path('merged.brz'))
+
+class TestSplit(ArchiveTestCase):
+	def test_split_and_merge_back(self):
+		for name, split in (('grid', lambda directory: split_by_grid(ELEVATOR, directory)), ('region', lambda directory: split_by_region(ELEVATOR, directory, 1000))):
+			with self.subTest(split = name):
+				pieces = split(self.path(name))
+				self.assertGreater(len(pieces), 1)
+				self.assertEqual([sum(counts) for counts in zip(*(totals(piece) for piece in pieces))], list(totals(ELEVATOR)))
+				merge(pieces, self.path(f'{name}.brz'))
+				self.assertEqual(totals(self.path(f'{name}.brz')), totals(ELEVATOR))
+
+	def test_extract(self):
+		everything = extract(ELEVATOR, self.path('all.brz'))
+		self.assertEqual(totals(self.path('all.brz')), totals(ELEVATOR))
+		static = extract(ELEVATOR, self.path('static.brz'), grids = {1})
+		self.assertEqual(static['static_chunks'], everything['static_chunks'])
+		self.assertLess(totals(self.path('static.brz'))[0], totals(ELEVATOR)[0])
+
+	def test_extract_nothing(self):
+		# a region with nothing in it still makes a valid (empty) prefab
+		extract(ELEVATOR, self.path('empty.brz'), region = ((1e6, 1e6, 1e6), (1e6 + 1, 1e6 + 1, 1e6 + 1)))
+		self.assertEqual(totals(self.path('empty.brz')), (0, 0, 0))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,34 @@
+from brz import BRZ
+from tests import ARCHIVES, read_all
+import os.path
+import unittest
+
+def walk(brz: BRZ, folder: str = '/') -> list[str]:
+	paths = []
+	for name in brz.ls(folder):
+		path = folder.rstrip('/') + '/' + name
+		paths.extend(walk(brz, path) if brz.isdir(path) else [path])
+	return paths
+
+class TestMeta(unittest.TestCase):
+	def test_file_paths(self):
+		for path in ARCHIVES:
+			with self.subTest(archive = os.path.basename(path)):
+				brz = BRZ(path)
+				self.assertEqual(sorted(brz.index.file_paths()), sorted(walk(brz)))
+
+	def test_read_meta(self):
+		for path in ARCHIVES:
+			with self.subTest(archive = os.path.basename(path)):
+				meta = {name.removeprefix('/Meta/'): data for name, data in read_all(BRZ(path)).items() if name.startswith('/Meta/')}
+				self.assertIn('Bundle.json', meta)
+				self.assertEqual(BRZ.read_meta(path), meta)
+
+	def test_read_files(self):
+		for path in ARCHIVES:
+			with self.subTest(archive = os.path.basename(path)):
+				expected = {name: data for name, data in read_all(BRZ(path)).items() if name.endswith('.schema')}
+				self.assertEqual(BRZ.read_files(path, lambda name: name.endswith('.schema')), expected)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,66 @@
+from brz import BRZ
+from msgpackschema import MPS
+from msgpackschema.errors import MigrationError
+from msgpackschema.migrate import fingerprint, migrate
+from tests import ELEVATOR, HELLO_WORLD
+import unittest
+
+def schema(enums: dict, structs: dict) -> MPS:
+	mps = MPS()
+	mps.import_schema_raw(enums, structs)
+	return mps
+
+OLD = schema({'EKind': {'Small': 0, 'Big': 1}}, {
+	'Position': {'X': 'i16', 'Y': 'i16'},
+	'ThingSoA': {'Count': 'u8', 'Kind': 'EKind', 'Positions': ['Position'], 'Removed': 'str'},
+})
+NEW = schema({'EKind': {'Tiny': 0, 'Small': 1, 'Big': 2}}, {
+	'Vector': {'X': 'i32', 'Y': 'i32', 'Z': 'f32'},
+	'ThingSoA': {'Count': 'u32', 'Kind': 'EKind', 'Positions': ['Vector'], 'Name': 'str', 'Tags': ['str']},
+})
+
+class TestFingerprint(unittest.TestCase):
+	def test_names_dont_matter(self):
+		a = schema({}, {'Position': {'X': 'i16'}, 'ThingSoA': {'Positions': ['Position']}})
+		b = schema({}, {'Vector': {'X': 'i16'}, 'ThingSoA': {'Positions': ['Vector']}})
+		self.assertEqual(fingerprint(a, 'ThingSoA'), fingerprint(b, 'ThingSoA'))
+		self.assertEqual(fingerprint(a, 'Position'), fingerprint(b, 'Vector'))
+		self.assertNotEqual(fingerprint(OLD, 'ThingSoA'), fingerprint(NEW, 'ThingSoA'))
+		self.assertNotEqual(fingerprint(OLD, 'EKind'), fingerprint(NEW, 'EKind'))
+
+	def test_same_schema_in_different_archives(self):
+		a = BRZ(ELEVATOR)
+		b = BRZ(HELLO_WORLD)
+		for path in ('/World/0/Owners.schema', '/World/0/Bricks/ChunksShared.schema'):
+			mps_a = MPS()
+			mps_a.import_schema(a.open(path, 'r').read())
+			mps_b = MPS()
+			mps_b.import_schema(b.open(path, 'r').read())
+			for struct_name in mps_a._structs:
+				self.assertEqual(fingerprint(mps_a, struct_name), fingerprint(mps_b, struct_name), struct_name)
+
+class TestMigrate(unittest.TestCase):
+	def test_unchanged(self):
+		tree = {'Count': 1, 'Kind': 'Big', 'Positions': [{'X': 1, 'Y': 2}], 'Removed': 'x'}
+		self.assertIs(migrate(OLD, OLD, tree), tree)
+
+	def test_migrate(self):
+		tree = {'Count': 1, 'Kind': 'Big', 'Positions': [{'X': 1, 'Y': -2}], 'Removed': 'x'}
+		migrated = migrate(OLD, NEW, tree)
+		self.assertEqual(migrated, {'Count': 1, 'Kind': 'Big', 'Positions': [{'X': 1, 'Y': -2, 'Z': 0.0}], 'Name': '', 'Tags': []})
+		# defaults aren't shared between results
+		migrated['Tags'].append('a')
+		self.assertEqual(migrate(OLD, NEW, tree)['Tags'], [])
+
+	def test_errors(self):
+		# narrowing is only an error for values that don't fit
+		self.assertEqual(migrate(NEW, OLD, {'Count': 3, 'Kind': 'Small', 'Positions': [], 'Name': '', 'Tags': []})['Count'], 3)
+		with self.assertRaises(MigrationError):
+			migrate(NEW, OLD, {'Count': 300, 'Kind': 'Small', 'Positions': [], 'Name': '', 'Tags': []})
+		with self.assertRaises(MigrationError):
+			migrate(NEW, OLD, {'Count': 3, 'Kind': 'Tiny', 'Positions': [], 'Name': '', 'Tags': []})
+		with self.assertRaises(MigrationError):
+			migrate(schema({}, {'ThingSoA': {'Count': 'str'}}), schema({}, {'ThingSoA': {'Count': 'u8'}}), {'Count': 'x'})
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,123 @@
+from brz import BRZ
+from msgpackschema import msgpack_lite
+from msgpackschema.msgpack_lite import MPLReader, MPLBufferReader, MPLWriter, reader_for
+from io import BufferedReader, BytesIO
+from tests import ARCHIVES
+import msgpack
+import os.path
+import unittest
+
+INTS = [0, 1, 0x7f, 0x80, 0xff, 0x100, 0xffff, 0x10000, 0xffffffff, 0x100000000, 0xffffffffffffffff,
+	-1, -32, -33, -0x80, -0x81, -0x8000, -0x8001, -0x80000000, -0x80000001, -0x8000000000000000]
+
+def read_ints(data: bytes) -> list[int]:
+	reader = MPLReader(BytesIO(data))
+	return [reader.read_next()[1][0] for _ in INTS]
+
+class TestMPLReader(unittest.TestCase):
+	def test_fixints(self):
+		for byte in list(range(0, 0x80)) + list(range(0xe0, 0x100)):
+			with self.subTest(byte = hex(byte)):
+				name, values = MPLReader(BytesIO(bytes([byte]))).read_next()
+				self.assertEqual(name, '+fixint' if byte < 0x80 else '-fixint')
+				self.assertEqual(values, (msgpack.unpackb(bytes([byte])),))
+
+	def test_ints(self):
+		self.assertEqual(read_ints(b''.join(msgpack.packb(value) for value in INTS)), INTS)
+
+def walk(reader) -> tuple[list, int]:
+	"""Every Tag (with its payload, for str/bin/ext) until the stream ends, and where the reader stopped"""
+	tags = []
+	while True:
+		try:
+			name, values = reader.read_next()
+		except AssertionError:
+			break
+		payload = None
+		if name == 'fixstr' or name[0:3] in ('str', 'bin', 'ext'):
+			payload = reader.read(values[0])
+		tags.append((name, values, payload))
+	reader.finish()
+	return tags, reader.tell()
+
+class TestMPLBufferReader(unittest.TestCase):
+	def inputs(self):
+		yield 'every type', msgpack.packb([INTS, 'x' * 40, b'y' * 300, 1.5, None, True, {'a': [1, 2]}, msgpack.ExtType(1, b'z' * 20), msgpack.ExtType(2, b'zz')])
+		for source in ARCHIVES:
+			brz = BRZ(source)
+			for path in brz.index.file_paths():
+				if path.endswith('.mps'):
+					yield f'{os.path.basename(source)}:{path}', brz.open(path, 'r').read()
+
+	def test_same_tags(self):
+		for name, data in self.inputs():
+			with self.subTest(input = name):
+				expected = walk(MPLReader(BytesIO(data)))
+				self.assertEqual(walk(MPLBufferReader(BytesIO(data))), expected)
+				# not a BytesIO, so read ahead in chunks
+				self.assertEqual(walk(MPLBufferReader(BufferedReader(BytesIO(data)))), expected)
+
+	def test_finish(self):
+		# after part of a stream, the stream is left right after the last Tag read
+		data = b'prefix' + msgpack.packb([1, 'two']) + b'trailer' * 1000
+		for stream in (BytesIO(data), BufferedReader(BytesIO(data))):
+			with self.subTest(stream = type(stream).__name__):
+				stream.seek(6)
+				reader = MPLBufferReader(stream)
+				self.assertEqual(reader.read_next(), ('fixarray', (2,)))
+				self.assertEqual(reader.read_next(), ('+fixint', (1,)))
+				self.assertEqual(reader.read_next(), ('fixstr', (3,)))
+				self.assertEqual(reader.read(3), b'two')
+				reader.finish()
+				self.assertEqual(stream.read(), b'trailer' * 1000)
+
+	def test_reader_for(self):
+		class Unseekable:
+			def read(self, size):
+				return b''
+		self.assertIsInstance(reader_for(BytesIO()), MPLBufferReader)
+		self.assertIsInstance(reader_for(Unseekable()), MPLReader)
+		msgpack_lite.ACCELERATED = False
+		try:
+			self.assertIsInstance(reader_for(BytesIO()), MPLReader)
+		finally:
+			msgpack_lite.ACCELERATED = True
+
+class TestMPLWriter(unittest.TestCase):
+	def written(self, method: str, *args) -> bytes:
+		stream = BytesIO()
+		getattr(MPLWriter(stream), method)(*args)
+		return stream.getvalue()
+
+	def test_smallest_tag(self):
+		# msgpack picks the smallest Tag too
+		for value in INTS:
+			with self.subTest(value = value):
+				self.assertEqual(self.written('write_int', value), msgpack.packb(value))
+		for value in (True, False):
+			self.assertEqual(self.written('write_bool', value), msgpack.packb(value))
+		self.assertEqual(self.written('write_nil'), msgpack.packb(None))
+		for size in (0, 31, 32, 0xff, 0x100, 0x10000):
+			with self.subTest(size = size):
+				self.assertEqual(self.written('write_str', 'x' * size), msgpack.packb('x' * size))
+				self.assertEqual(self.written('write_bin', b'x' * size), msgpack.packb(b'x' * size))
+				self.assertEqual(self.written('write_array_header', size) + b'\0' * size, msgpack.packb([0] * size))
+				self.assertEqual(self.written('write_map_header', size) + b''.join(msgpack.packb(i) + b'\0' for i in range(size)), msgpack.packb({i: 0 for i in range(size)}))
+
+	def test_floats(self):
+		for value in (0.0, -1.5, 3.25, 1e300):
+			self.assertEqual(self.written('write_float64', value), msgpack.packb(value))
+		self.assertEqual(self.written('write_float32', 0.5), msgpack.packb(0.5, use_single_float = True))
+
+	def test_write_ints(self):
+		self.assertEqual(self.written('write_ints', INTS), b''.join(msgpack.packb(value) for value in INTS))
+		self.assertEqual(read_ints(self.written('write_ints', INTS)), INTS)
+
+	def test_too_big(self):
+		with self.assertRaises(OverflowError):
+			self.written('write_int', 0x10000000000000000)
+		with self.assertRaises(OverflowError):
+			self.written('write_int', -0x8000000000000001)
+
+if __name__ == '__main__':
+	unittest.main()
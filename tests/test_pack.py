@@ -0,0 +1,60 @@
+from brz import BRZ
+from msgpackschema import MPS, MsgpackSchemaError
+from io import BytesIO
+from tests import ARCHIVES
+import os.path
+import unittest
+
+def load_schema(brz: BRZ, schema_path: str) -> MPS:
+	mps = MPS()
+	with brz.open(schema_path, 'r') as f:
+		mps.import_schema(f.read())
+	return mps
+
+def pack(mps: MPS, tree: dict, root_struct_name: str = None) -> bytes:
+	stream = BytesIO()
+	mps.pack(stream, tree, root_struct_name)
+	return stream.getvalue()
+
+class TestPack(unittest.TestCase):
+	def test_every_mps(self):
+		for source in ARCHIVES:
+			brz = BRZ(source)
+			for path in brz.index.file_paths():
+				if not path.endswith('.mps'):
+					continue
+				with self.subTest(archive = os.path.basename(source), path = path):
+					mps = load_schema(brz, brz.schema_path_for(path))
+					with brz.open(path, 'r') as stream:
+						data = stream.read()
+					stream = BytesIO(data)
+					tree = mps.unpack(stream)
+					# component data after the root struct isn't decoded, so only the root struct is packed again
+					packed = pack(mps, tree)
+					self.assertEqual(packed, data[0:stream.tell()])
+					self.assertEqual(mps.unpack(BytesIO(packed)), tree)
+
+	def test_validation(self):
+		mps = MPS()
+		mps.import_schema_raw({}, {'ThingSoA': {'Count': 'u8', 'Names': ['str']}})
+		self.assertEqual(pack(mps, {'Count': 3, 'Names': ['a']}), b'\x03\x91\xa1a')
+		with self.assertRaises(AssertionError):
+			pack(mps, {'Count': 3})
+		with self.assertRaises(AssertionError):
+			pack(mps, {'Count': 256, 'Names': []})
+
+	def test_wire_graph_variants(self):
+		mps = MPS()
+		mps.import_schema_raw({}, {
+			'Input': {'Value': 'wire_graph_variant'},
+			'ThingSoA': {'Count': 'u8', 'Inputs': ['Input']},
+		})
+		stream = BytesIO()
+		with self.assertRaises(MsgpackSchemaError):
+			mps.pack(stream, {'Count': 0, 'Inputs': []})
+		self.assertEqual(stream.getvalue(), b'') # rejected before anything was written
+		with self.assertRaises(MsgpackSchemaError):
+			mps.unpack(BytesIO(b'\x00\x91\x00'))
+
+if __name__ == '__main__':
+	unittest.main()
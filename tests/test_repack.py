@@ -0,0 +1,45 @@
+from brz import BRZ, BRZWriter, ECompressionMethod
+from brz.repack import repack, format_report
+from tests import ARCHIVES, SINGLE_BRICK, ArchiveTestCase, read_all
+import os
+import os.path
+import shutil
+import unittest
+
+class TestRepack(ArchiveTestCase):
+	def test_repack(self):
+		for source in ARCHIVES:
+			original = read_all(BRZ(source))
+			for workers in (1, 2):
+				with self.subTest(archive = os.path.basename(source), workers = workers):
+					report = repack(source, self.path('repacked.brz'), compression_level = 19, workers = workers)
+					self.assertEqual(read_all(BRZ(self.path('repacked.brz'))), original)
+					self.assertEqual(report['after'], os.path.getsize(self.path('repacked.brz')))
+					self.assertEqual((report['blobs_before'], report['blobs_after']), (BRZ(source).index.blob_count, BRZ(source).index.blob_count))
+					self.assertEqual(sum(report['methods'].values()), report['blobs_after'])
+					self.assertLessEqual(sum(BRZ(self.path('repacked.brz')).index.compressed_lengths), sum(BRZ(source).index.compressed_lengths))
+					self.assertTrue(format_report(report).startswith(f'{source} -> {self.path("repacked.brz")}: '))
+
+	def test_method(self):
+		report = repack(SINGLE_BRICK, self.path('repacked.brz'), method = ECompressionMethod.NONE, workers = 1)
+		self.assertEqual(set(BRZ(self.path('repacked.brz')).index.compression_methods), {ECompressionMethod.NONE})
+		self.assertEqual(list(report['methods']), ['NONE'])
+
+	def test_duplicates(self):
+		with open(self.path('duplicates.brz'), 'wb') as f:
+			writer = BRZWriter(f, method = ECompressionMethod.NONE)
+			writer.write_entries([('Meta', -1)], [('a.txt', 0, 0), ('b.txt', 0, 1)], [writer.make_blob(b'same' * 100), writer.make_blob(b'same' * 100)])
+		report = repack(self.path('duplicates.brz'), self.path('repacked.brz'), workers = 1)
+		self.assertEqual((report['blobs_after'], report['duplicates_removed']), (1, 1))
+		repacked = BRZ(self.path('repacked.brz'))
+		self.assertEqual(repacked.index.blob_count, 1)
+		self.assertEqual(read_all(repacked), {'/Meta/a.txt': b'same' * 100, '/Meta/b.txt': b'same' * 100})
+
+	def test_in_place(self):
+		shutil.copy(SINGLE_BRICK, self.path('prefab.brz'))
+		repack(self.path('prefab.brz'), self.path('prefab.brz'), workers = 1)
+		self.assertEqual(read_all(BRZ(self.path('prefab.brz'))), read_all(BRZ(SINGLE_BRICK)))
+		self.assertEqual(os.listdir(self.temp), ['prefab.brz'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,46 @@
+from brz import BRZ, ECompressionMethod
+from tests import ARCHIVES, ArchiveTestCase, read_all
+import os.path
+import unittest
+
+class TestSave(ArchiveTestCase):
+	def test_save(self):
+		for source in ARCHIVES:
+			original = read_all(BRZ(source))
+			for method in (None, ECompressionMethod.NONE, ECompressionMethod.ZSTD):
+				with self.subTest(archive = os.path.basename(source), method = method):
+					BRZ(source).save(self.path('saved.brz'), method = method)
+					saved = BRZ(self.path('saved.brz'))
+					self.assertEqual(read_all(saved), original)
+					if method is not None:
+						self.assertEqual(set(saved.index.compression_methods), {method})
+
+	def test_new_archive(self):
+		brz = BRZ()
+		brz.makedirs('/Meta')
+		brz.makedirs('/World/0/Bricks', exist_ok = True)
+		brz.write_file('/Meta/Bundle.json', b'{}')
+		brz.write_file('/World/0/a.bin', b'same' * 100)
+		brz.write_file('/World/0/b.bin', b'same' * 100)
+		brz.write_file('/World/0/a.bin', b'replaced' * 100)
+		brz.save(self.path('new.brz'))
+
+		saved = BRZ(self.path('new.brz'))
+		self.assertEqual(read_all(saved), {'/Meta/Bundle.json': b'{}', '/World/0/a.bin': b'replaced' * 100, '/World/0/b.bin': b'same' * 100})
+		self.assertEqual(saved.ls('/World/0'), ['Bricks', 'a.bin', 'b.bin'])
+		self.assertEqual(saved.index.blob_count, 3)
+		# zstd only where it's smaller
+		self.assertEqual(saved.index.compression_methods, [ECompressionMethod.NONE, ECompressionMethod.ZSTD, ECompressionMethod.ZSTD])
+
+	def test_dedup(self):
+		brz = BRZ()
+		brz.mkdir('/Meta')
+		brz.write_file('/Meta/a.txt', b'same')
+		brz.write_file('/Meta/b.txt', b'same')
+		brz.save(self.path('new.brz'))
+		saved = BRZ(self.path('new.brz'))
+		self.assertEqual(saved.index.blob_count, 1)
+		self.assertEqual(read_all(saved), {'/Meta/a.txt': b'same', '/Meta/b.txt': b'same'})
+
+if __name__ == '__main__':
+	unittest.main()
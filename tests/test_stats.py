@@ -0,0 +1,64 @@
+from brz import BRZ
+from brz.cache import ChunkCache
+from msgpackschema.stats import Stats
+from tests import ELEVATOR
+import os.path
+import unittest
+
+class TestStats(unittest.TestCase):
+	def test_record(self):
+		recorded = []
+		stats = Stats([lambda *args: recorded.append(args)])
+		stats.record('io', 0.5, 10, 20)
+		stats.record('io', 0.25, 5)
+		stats.count('blobs')
+		stats.count('blobs', 2)
+		with stats.timer('zstd', 1, 2):
+			pass
+		self.assertEqual(stats.times['io'], 0.75)
+		self.assertEqual(stats.calls, {'io': 2, 'zstd': 1})
+		self.assertEqual(stats.bytes_in, {'io': 15, 'zstd': 1})
+		self.assertEqual(stats.bytes_out, {'io': 20, 'zstd': 2})
+		self.assertEqual(stats.counters, {'blobs': 3})
+		self.assertEqual([args[0] for args in recorded], ['io', 'io', 'zstd'])
+		self.assertEqual(recorded[0], ('io', 0.5, 10, 20))
+
+	def test_merge(self):
+		a = Stats()
+		a.record('io', 1.0, 10)
+		a.count('files')
+		b = Stats()
+		b.record('io', 2.0, 5)
+		b.record('tree', 1.0)
+		b.count('files', 4)
+		a.merge(b)
+		self.assertEqual(a.as_dict(), {
+			'times': {'io': 3.0, 'tree': 1.0},
+			'calls': {'io': 2, 'tree': 1},
+			'bytes_in': {'io': 15},
+			'bytes_out': {},
+			'counters': {'files': 5},
+		})
+
+	def test_brz(self):
+		stats = Stats()
+		brz = BRZ(ELEVATOR, stats = stats)
+		self.assertLessEqual({'io', 'zstd', 'blake3', 'index', 'tree'}, set(stats.times))
+		self.assertEqual(stats.bytes_in['io'], os.path.getsize(ELEVATOR) - 3 - 1 - 1 - 4 - 4 - 32) # everything after the header
+		self.assertEqual(stats.counters['files'], brz.index.file_count)
+		self.assertEqual(stats.counters['blobs'], brz.index.blob_count)
+
+	def test_unpack_mps(self):
+		brz = BRZ(ELEVATOR)
+		path = '/World/0/Bricks/Grids/1/Chunks/0_0_0.mps'
+		stats = Stats()
+		cache = ChunkCache()
+		brz.unpack_mps(path, cache = cache, stats = stats)
+		brz.unpack_mps(path, cache = cache, stats = stats)
+		self.assertEqual(stats.calls['mps_unpack'], 1)
+		self.assertEqual(stats.bytes_in['mps_unpack'], len(brz.open(path, 'r').read()))
+		self.assertEqual(stats.counters['struct:BRSavedBrickChunkSoA'], 1)
+		self.assertEqual((stats.counters['cache_misses'], stats.counters['cache_hits']), (1, 1))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,71 @@
+from brz import BRZ
+from brz.errors import BRZUnexpectedEOF
+from io import BytesIO
+from tests import ARCHIVES, read_all
+import os
+import os.path
+import threading
+import unittest
+
+class Pipe:
+	"""Read end of an OS pipe, fed `data` a few bytes at a time from a thread, so reads come back short and nothing can be seeked"""
+	def __init__(self, data: bytes, piece: int = 1000):
+		read_fd, write_fd = os.pipe()
+		self.stream = open(read_fd, 'rb', buffering = 0)
+		self.thread = threading.Thread(target = self._feed, args = (write_fd, data, piece))
+		self.thread.start()
+
+	def _feed(self, write_fd, data, piece):
+		with open(write_fd, 'wb', buffering = 0) as f:
+			for i in range(0, len(data), piece):
+				try:
+					f.write(data[i:i + piece])
+				except BrokenPipeError:
+					return # the reader gave up early
+
+	def __enter__(self):
+		return self.stream
+
+	def __exit__(self, *_):
+		self.stream.close()
+		self.thread.join()
+
+def archive_bytes(path: str) -> bytes:
+	with open(path, 'rb') as f:
+		return f.read()
+
+class TestStream(unittest.TestCase):
+	def test_from_stream(self):
+		for path in ARCHIVES:
+			with self.subTest(archive = os.path.basename(path)):
+				with Pipe(archive_bytes(path)) as stream:
+					self.assertFalse(stream.seekable())
+					brz = BRZ.from_stream(stream)
+				self.assertEqual(read_all(brz), read_all(BRZ(path)))
+
+	def test_iter_stream(self):
+		for path in ARCHIVES:
+			with self.subTest(archive = os.path.basename(path)):
+				with Pipe(archive_bytes(path)) as stream:
+					files = list(BRZ.iter_stream(stream))
+				self.assertEqual(len(files), len({path for path, _ in files}))
+				self.assertEqual(dict(files), read_all(BRZ(path)))
+
+	def test_current_position(self):
+		data = archive_bytes(ARCHIVES[0])
+		stream = BytesIO(b'header of something else' + data + b'trailer')
+		stream.read(len(b'header of something else'))
+		self.assertEqual(read_all(BRZ.from_stream(stream)), read_all(BRZ(ARCHIVES[0])))
+		self.assertEqual(stream.read(), b'trailer')
+
+	def test_truncated(self):
+		data = archive_bytes(ARCHIVES[0])
+		with Pipe(data[0:len(data) // 2]) as stream:
+			with self.assertRaises(BRZUnexpectedEOF):
+				BRZ.from_stream(stream)
+		with Pipe(data[0:len(data) // 2]) as stream:
+			with self.assertRaises(BRZUnexpectedEOF):
+				list(BRZ.iter_stream(stream))
+
+if __name__ == '__main__':
+	unittest.main()
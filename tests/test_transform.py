@@ -0,0 +1,96 @@
+from brz import BRZ, BRZReader, ECompressionMethod
+from brz.transform import transform, replacing
+from tests import ELEVATOR, HELLO_WORLD, ArchiveTestCase, read_all
+import json
+import os
+import shutil
+import stat
+import unittest
+
+def raw_blobs(path: str) -> dict:
+	"""Compressed bytes and index entry of every file, as stored"""
+	with open(path, 'rb') as f:
+		brz = BRZ()
+		reader = BRZReader(f, brz)
+		reader.read_header()
+		reader.read_index()
+		index = brz.index
+		blobs = {}
+		for file_path, (_, _, blob_id) in zip(index.file_paths(), index.files):
+			f.seek(index.blob_offsets[blob_id])
+			blobs[file_path] = (index.compression_methods[blob_id], index.decompressed_lengths[blob_id], index.blob_hashes[blob_id], f.read(index.compressed_lengths[blob_id]))
+		return blobs
+
+def rename(data: bytes) -> bytes:
+	bundle = json.loads(data)
+	bundle['name'] = 'Renamed'
+	return json.dumps(bundle).encode('utf-8')
+
+class TestTransform(ArchiveTestCase):
+	def test_pass_through(self):
+		summary = transform(ELEVATOR, self.path('out.brz'), {})
+		self.assertEqual(raw_blobs(self.path('out.brz')), raw_blobs(ELEVATOR))
+		self.assertEqual((summary['rewritten_files'], summary['removed_files']), (0, 0))
+		self.assertEqual(summary['copied_bytes'], sum(BRZ(ELEVATOR).index.compressed_lengths))
+
+	def test_rewrite_and_remove(self):
+		summary = transform(ELEVATOR, self.path('out.brz'), {'Meta/Bundle.json': rename, '/Meta/Thumbnail.png': lambda data: None}, method = ECompressionMethod.NONE)
+		self.assertEqual((summary['rewritten_files'], summary['removed_files']), (1, 1))
+
+		before = raw_blobs(ELEVATOR)
+		after = raw_blobs(self.path('out.brz'))
+		self.assertEqual(set(before) - set(after), {'/Meta/Thumbnail.png'})
+		self.assertEqual(after['/Meta/Bundle.json'][0], ECompressionMethod.NONE)
+		for path in set(after) - {'/Meta/Bundle.json'}:
+			self.assertEqual(after[path], before[path], path) # untouched files keep their compressed bytes
+		self.assertEqual(json.loads(BRZ(self.path('out.brz')).open('/Meta/Bundle.json', 'r').read())['name'], 'Renamed')
+
+	def test_unknown_path(self):
+		with self.assertRaises(FileNotFoundError):
+			transform(ELEVATOR, self.path('out.brz'), {'/Meta/Typo.json': rename})
+		self.assertEqual(os.listdir(self.temp), []) # no output or leftover temp file
+
+	def test_in_place(self):
+		shutil.copy(HELLO_WORLD, self.path('prefab.brz'))
+		original = read_all(BRZ(HELLO_WORLD))
+		transform(self.path('prefab.brz'), self.path('prefab.brz'), {'/Meta/Bundle.json': rename})
+		transformed = read_all(BRZ(self.path('prefab.brz')))
+		self.assertEqual(json.loads(transformed.pop('/Meta/Bundle.json'))['name'], 'Renamed')
+		original.pop('/Meta/Bundle.json')
+		self.assertEqual(transformed, original)
+		self.assertEqual(os.listdir(self.temp), ['prefab.brz'])
+
+class TestReplacing(ArchiveTestCase):
+	def mode(self, path: str) -> int:
+		return stat.S_IMODE(os.stat(path).st_mode)
+
+	@unittest.skipUnless(os.name == 'posix', 'needs POSIX permissions')
+	def test_mode(self):
+		umask = os.umask(0o022)
+		try:
+			with replacing(self.path('new.bin')) as f:
+				f.write(b'new')
+			self.assertEqual(self.mode(self.path('new.bin')), 0o644)
+
+			os.chmod(self.path('new.bin'), 0o600)
+			with replacing(self.path('new.bin')) as f:
+				f.write(b'replaced')
+			self.assertEqual(self.mode(self.path('new.bin')), 0o600) # kept from the file it replaced
+		finally:
+			os.umask(umask)
+		with open(self.path('new.bin'), 'rb') as f:
+			self.assertEqual(f.read(), b'replaced')
+
+	def test_error(self):
+		with open(self.path('file.bin'), 'wb') as f:
+			f.write(b'original')
+		with self.assertRaises(ValueError):
+			with replacing(self.path('file.bin')) as f:
+				f.write(b'partial')
+				raise ValueError()
+		with open(self.path('file.bin'), 'rb') as f:
+			self.assertEqual(f.read(), b'original')
+		self.assertEqual(os.listdir(self.temp), ['file.bin'])
+
+if __name__ == '__main__':
+	unittest.main()